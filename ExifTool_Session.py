@@ -0,0 +1,177 @@
+"""
+Long-lived ExifTool processes for Txt_to_Metadata.py.
+
+Starting exiftool costs far more than writing a few tags, so instead of one
+process per image, ExifToolSession keeps one process running in argfile mode
+(-stay_open True -@ -). Each command is written to its stdin followed by
+-execute<N>; the command is finished when "{ready<N>}" appears on stdout.
+An -echo4 marker with the same number ends the command's stderr output;
+stderr is read on a helper thread alongside stdout so a long run of
+warnings cannot fill its pipe and stall both sides.
+
+ExifToolPool runs a few sessions side by side for threads that share it.
+"""
+import os
+import re
+import queue
+import threading
+import subprocess
+
+# ExifTool binary: the EXIFTOOL_PATH environment variable, else the usual install location
+DEFAULT_EXIFTOOL_PATH = os.environ.get("EXIFTOOL_PATH") or (r"C:\exiftool\exiftool.exe" if os.name == "nt" else "exiftool")
+# Options sent with every command: UTF-8 file names and values
+COMMON_ARGS = ("-charset", "filename=utf8", "-charset", "utf8")
+# Seconds to wait for exiftool to exit after -stay_open False
+CLOSE_TIMEOUT = 5
+
+
+class ExifToolError(Exception):
+    """ExifTool could not be started or stopped responding."""
+
+
+def argfile_line(argument):
+    """
+    One argument as an argfile line. Values with line breaks, tabs or
+    surrounding spaces use ExifTool's #[CSTR] prefix with C escapes.
+    """
+    if "\n" in argument or "\r" in argument or "\t" in argument or argument != argument.strip():
+        escaped = (argument.replace("\\", "\\\\").replace('"', '\\"')
+                   .replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t"))
+        return f"#[CSTR]{escaped}"
+    return argument
+
+
+class ExifToolSession:
+    """One exiftool process in -stay_open mode. Safe to share between threads."""
+
+    def __init__(self, executable=None):
+        self.executable = executable or DEFAULT_EXIFTOOL_PATH
+        self.process = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        creationflags = subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0
+        try:
+            self.process = subprocess.Popen(
+                [self.executable, "-stay_open", "True", "-@", "-", "-common_args", *COMMON_ARGS],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                creationflags=creationflags)
+        except OSError as e:
+            raise ExifToolError(f"Could not start ExifTool at '{self.executable}': {e}") from e
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _read_until(self, stream, marker):
+        # Read raw chunks until the marker line shows up; returns the text before it
+        data = b""
+        while marker not in data:
+            chunk = os.read(stream.fileno(), 65536)
+            if not chunk:
+                raise ExifToolError("ExifTool exited unexpectedly.")
+            data += chunk
+        return data[:data.index(marker)].decode("utf-8", errors="replace")
+
+    def _read_stderr(self, stream, marker, result):
+        # Runs on a helper thread while execute() reads stdout
+        try:
+            result["stderr"] = self._read_until(stream, marker)
+        except (OSError, ExifToolError) as e:
+            result["error"] = e
+
+    def execute(self, *args):
+        """
+        Run one command (a list of exiftool arguments) and return its
+        (stdout, stderr). Starts or restarts the process when needed.
+        """
+        with self._lock:
+            if not self.running:
+                self.start()
+            self._sequence += 1
+            marker = f"{{ready{self._sequence}}}"
+            lines = [argfile_line(str(arg)) for arg in args]
+            lines += ["-echo4", marker, f"-execute{self._sequence}"]
+            # stderr is drained at the same time as stdout: warnings filling
+            # the stderr pipe would otherwise block exiftool and this read
+            stderr_result = {}
+            stderr_reader = threading.Thread(target=self._read_stderr, daemon=True,
+                                             args=(self.process.stderr, marker.encode(), stderr_result))
+            try:
+                stderr_reader.start()
+                self.process.stdin.write(("\n".join(lines) + "\n").encode("utf-8"))
+                self.process.stdin.flush()
+                stdout = self._read_until(self.process.stdout, marker.encode())
+                stderr_reader.join()
+                if "error" in stderr_result:
+                    raise stderr_result["error"]
+            except (OSError, ExifToolError) as e:
+                self._kill()
+                stderr_reader.join()
+                raise ExifToolError(f"ExifTool stopped responding: {e}") from e
+            return stdout.strip(), stderr_result["stderr"].strip()
+
+    def close(self):
+        with self._lock:
+            if not self.running:
+                self.process = None
+                return
+            try:
+                self.process.stdin.write(b"-stay_open\nFalse\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=CLOSE_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired):
+                self._kill()
+            self.process = None
+
+    def _kill(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_succeeded(stdout, stderr):
+    """Whether a write command's output reports the file as updated or already up to date."""
+    if "Error:" in stderr:
+        return False
+    counts = re.findall(r"(\d+) image files (?:updated|unchanged)", stdout)
+    return any(int(count) for count in counts)
+
+
+class ExifToolPool:
+    """
+    A fixed number of ExifToolSessions. execute() borrows an idle session,
+    so up to size commands run at once when called from several threads.
+    Sessions start lazily on their first command.
+    """
+
+    def __init__(self, size=2, executable=None):
+        self.sessions = [ExifToolSession(executable) for _ in range(max(1, size))]
+        self._idle = queue.Queue()
+        for session in self.sessions:
+            self._idle.put(session)
+
+    def execute(self, *args):
+        session = self._idle.get()
+        try:
+            return session.execute(*args)
+        finally:
+            self._idle.put(session)
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,96 @@
+"""
+Shared folder scanner for the image tools (QUICK_RESIZE, Txt_to_Metadata,
+Batch_Detect_Hands_and_Save_Square).
+
+scan_files() walks a folder with os.scandir and yields matching paths as it
+finds them, so processing can start before the whole tree has been listed.
+Files can be filtered by extension or by their magic bytes, and by
+include/exclude glob patterns.
+"""
+import os
+import fnmatch
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp", ".psd")
+
+# Leading bytes of the image formats the tools can read
+MAGIC_NUMBERS = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"BM", "bmp"),
+    (b"8BPS", "psd"),
+)
+
+
+def sniff_image_type(path):
+    """Return the image type named by the file's magic bytes, or None."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(16)
+    except OSError:
+        return None
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    for magic, image_type in MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return image_type
+    return None
+
+
+def _matches(relative_path, name, patterns):
+    # Patterns containing '/' match the path relative to the scan root,
+    # anything else matches the file or folder name
+    for pattern in patterns:
+        if fnmatch.fnmatch(relative_path if "/" in pattern else name, pattern):
+            return True
+    return False
+
+
+def scan_files(folder, extensions=None, recursive=True, include=None, exclude=None, sniff=False):
+    """
+    Lazily yield the paths of the files under folder.
+
+    extensions: tuple of lower-case suffixes such as (".png", ".jpg"); None accepts any file.
+    recursive: descend into subfolders.
+    include: glob patterns a file must match (any of them), e.g. ["*_final.*"].
+    exclude: glob patterns for files and folders to skip, e.g. ["Resized_*", "tmp/*"].
+    sniff: accept files by their magic bytes (see MAGIC_NUMBERS) instead of their extension.
+    """
+    include = list(include or [])
+    exclude = list(exclude or [])
+    pending = [(folder, "")]
+    while pending:
+        dir_path, relative_dir = pending.pop()
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            continue
+        subfolders = []
+        with entries:
+            for entry in entries:
+                relative_path = f"{relative_dir}{entry.name}"
+                if exclude and _matches(relative_path, entry.name, exclude):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            subfolders.append((entry.path, relative_path + "/"))
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                if include and not _matches(relative_path, entry.name, include):
+                    continue
+                if sniff:
+                    if sniff_image_type(entry.path) is None:
+                        continue
+                elif extensions is not None and not entry.name.lower().endswith(extensions):
+                    continue
+                yield entry.path
+        # Visit subfolders in name order, depth first
+        pending.extend(sorted(subfolders, reverse=True))
@@ -0,0 +1,813 @@
+"""
+Hand detection and square cropping engine used by Batch_Detect_Hands_and_Save_Square.
+
+Images go through a three-stage pipeline so the disk, the detector and the
+encoder work at the same time:
+
+  decode   a thread pool reads each file (and hashes it for the landmark
+           cache), prefetching up to decode_depth images, and decodes the
+           proxy when detection runs on one (--proxy);
+  detect   a ProcessPoolExecutor; each worker process creates its own
+           MediaPipe Hands model once, in the pool initializer, and reuses
+           it for every image it is handed. For full-resolution detection
+           the worker gets the file's bytes, decodes them and cuts the
+           crop itself, so full frames never cross the process boundary;
+  encode   a thread pool that writes the crops (cutting them from the
+           full-resolution image first on the proxy path), with up to
+           encode_depth crops waiting.
+
+Each hand-off is bounded, so a slow stage holds back the ones before it
+instead of piling up frames in memory. The summary reports the busy time
+and utilisation of every stage (busy time / (elapsed * threads)): the stage
+near 1.0 is the bottleneck on that machine. Progress is reported through a queue that the GUI polls with root.after;
+the engine itself never touches tkinter and can run headless:
+
+    python Hand_Crop_Engine.py <folder> [--margin 200] [--crop-size 1024] [--workers N]
+        [--decode-workers N] [--encode-workers N] [--decode-depth N] [--encode-depth N]
+
+Progress and the final summary are printed as JSON lines. Crops are written
+to <folder>/processed/, mirroring the source subfolders.
+
+Detection sits behind a small interface (DETECTORS): an object whose
+detect(bgr_image) returns a (hands, 21, 2) array of normalised landmarks or
+None. Besides MediaPipe there is SyntheticDetector, a deterministic stand-in
+(--detector synthetic) for timing the decode, crop and write stages without
+the model. The crop maths (crop_box) is NumPy over the landmark arrays and
+is covered by test_hand_crop.py.
+
+With a proxy long edge (--proxy 1280) detection runs on a downscaled copy
+instead of the full photo: JPEGs are decoded at a reduced DCT scale
+(cv2.IMREAD_REDUCED_COLOR_*) and the rest of the reduction uses INTER_AREA.
+MediaPipe's landmarks are normalised, so they map straight back to source
+pixels, and the crop is cut from the full-resolution image, which is only
+decoded when hands were found. --accuracy N compares the proxy's hand boxes
+with full-resolution detection on N images and prints the IoU and timings:
+
+    python Hand_Crop_Engine.py <folder> --proxy 1280 --accuracy 50
+
+Detection results are cached in <folder>/.hand_landmarks.sqlite (see
+LandmarkCache), keyed by the SHA-256 of the file and the detection settings
+(detector, proxy long edge, max hands). Images without hands are recorded
+too. A rerun with another --margin or --crop-size only decodes and crops:
+cached images are never handed to the detector, and cached negatives are
+skipped without being opened. --no-cache turns this off.
+"""
+import io
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import mediapipe as mp
+except ImportError:
+    mp = None
+
+from Folder_Scanner import scan_files
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+OUTPUT_FOLDER_NAME = "processed"
+DEFAULT_MARGIN = 200
+DEFAULT_CROP_SIZE = 1024
+MAX_NUM_HANDS = 2
+# Images handed to the pool ahead of time per worker; keeps cancel responsive
+JOBS_PER_WORKER = 2
+# Threads reading and decoding ahead of the detector, and writing crops behind it
+DEFAULT_DECODE_WORKERS = 2
+DEFAULT_ENCODE_WORKERS = 2
+# Decoded frames (and crops to write) allowed to wait per thread of the next stage
+QUEUE_DEPTH_PER_WORKER = 2
+PIPELINE_STAGES = ("decode", "detect", "encode")
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+# Reduced-size JPEG decodes, largest reduction first
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                        (2, cv2.IMREAD_REDUCED_COLOR_2))
+# Landmark cache file in the source folder, and how many new entries go into one transaction
+CACHE_NAME = ".hand_landmarks.sqlite"
+CACHE_COMMIT_EVERY = 100
+
+# Per-process state, set by _init_worker
+_detector = None
+_cancel_event = None
+
+
+class MediaPipeDetector:
+    """MediaPipe Hands in static image mode."""
+    name = "mediapipe"
+
+    def __init__(self, max_num_hands=MAX_NUM_HANDS):
+        if mp is None:
+            raise ImportError("mediapipe is required for hand detection (pip install mediapipe)")
+        self.hands = mp.solutions.hands.Hands(static_image_mode=True, max_num_hands=max_num_hands)
+
+    def detect(self, image):
+        """
+        Hand landmarks in a BGR image as a (hands, 21, 2) array of normalised
+        x, y coordinates, or None when no hand is found.
+        """
+        # Convert the BGR image to RGB for MediaPipe
+        results = self.hands.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if not results.multi_hand_landmarks:
+            return None
+        return np.array([[(lm.x, lm.y) for lm in hand_landmarks.landmark]
+                         for hand_landmarks in results.multi_hand_landmarks], dtype=np.float64)
+
+
+class SyntheticDetector:
+    """
+    Deterministic stand-in for MediaPipe, for timing and checking the decode,
+    crop and write stages without the model. The result depends only on the
+    image's aspect ratio and coarse average color, so a downscaled copy of
+    an image gets the same hands as the original. About empty_rate of the
+    images get no hands; the rest get 1 to max_num_hands clusters of 21
+    landmarks.
+    """
+    name = "synthetic"
+    LANDMARKS = 21
+
+    def __init__(self, max_num_hands=MAX_NUM_HANDS, empty_rate=0.25):
+        self.max_num_hands = max_num_hands
+        self.empty_rate = empty_rate
+
+    def detect(self, image):
+        h, w = image.shape[:2]
+        mean = np.asarray(cv2.resize(image, (1, 1), interpolation=cv2.INTER_AREA), dtype=np.int64).ravel()
+        rng = np.random.default_rng([round(w / h * 100), *(mean // 32)])
+        if rng.random() < self.empty_rate:
+            return None
+        hands = rng.integers(1, self.max_num_hands + 1)
+        centers = rng.uniform(0.1, 0.9, (hands, 1, 2))
+        spread = rng.uniform(0.02, 0.12, (hands, 1, 2))
+        return np.clip(centers + rng.uniform(-1, 1, (hands, self.LANDMARKS, 2)) * spread, 0.0, 1.0)
+
+
+DETECTORS = {detector.name: detector for detector in (MediaPipeDetector, SyntheticDetector)}
+
+
+def create_detector(name="mediapipe", max_num_hands=MAX_NUM_HANDS):
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector '{name}'; choose from {', '.join(DETECTORS)}")
+    return DETECTORS[name](max_num_hands)
+
+
+def _init_worker(cancel_event, detector_name="mediapipe", max_num_hands=MAX_NUM_HANDS):
+    global _detector, _cancel_event
+    _cancel_event = cancel_event
+    _detector = create_detector(detector_name, max_num_hands)
+
+
+def plan_tasks(folder_path, output_folder=None):
+    """
+    (image_path, output_path) for every image below folder_path, skipping
+    earlier output. Outputs mirror the source subfolders.
+    """
+    output_folder = output_folder or os.path.join(folder_path, OUTPUT_FOLDER_NAME)
+    tasks = []
+    for path in scan_files(folder_path, IMAGE_EXTENSIONS, exclude=[OUTPUT_FOLDER_NAME]):
+        tasks.append((path, os.path.join(output_folder, os.path.relpath(path, folder_path))))
+    return tasks
+
+
+def detection_config(detector="mediapipe", proxy_long_edge=None, max_num_hands=MAX_NUM_HANDS):
+    """Key for the settings that change detection results; margin and crop size are not part of it."""
+    return f"{detector}:proxy={proxy_long_edge or 0}:hands={max_num_hands}"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def cached_landmarks(connection, digest, config):
+    """
+    Look up one detection. Returns (found, landmarks), where landmarks is a
+    (hands, 21, 2) float32 array or None for an image without hands.
+    """
+    row = connection.execute("SELECT hands, landmarks FROM detections WHERE hash = ? AND config = ?",
+                             (digest, config)).fetchone()
+    if row is None:
+        return False, None
+    hands, blob = row
+    if not hands:
+        return True, None
+    return True, np.frombuffer(blob, dtype=np.float32).reshape(hands, -1, 2)
+
+
+class LandmarkCache:
+    """
+    SQLite store of detection results. detections holds the landmarks per
+    (content hash, detection config), with hands = 0 for images where no
+    hand was found; files maps a path with its size and mtime to the content
+    hash, so unchanged files are looked up without being read. Used from
+    the engine's thread only.
+    """
+
+    def __init__(self, path, config):
+        self.path = path
+        self.config = config
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT);"
+            "CREATE TABLE IF NOT EXISTS detections ("
+            " hash TEXT, config TEXT, hands INTEGER, landmarks BLOB, PRIMARY KEY (hash, config));")
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def lookup(self, image_path):
+        """(found, landmarks) for a file whose size and mtime match the recorded ones."""
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return False, None
+        row = self.connection.execute("SELECT size, mtime_ns, hash FROM files WHERE path = ?",
+                                      (os.path.normcase(os.path.abspath(image_path)),)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return False, None
+        return cached_landmarks(self.connection, row[2], self.config)
+
+    def lookup_hash(self, digest):
+        """(found, landmarks) by content alone, e.g. for a renamed or copied file."""
+        return cached_landmarks(self.connection, digest, self.config)
+
+    def store(self, image_path, digest, landmarks):
+        """Record a file's hash and its detection result (landmarks, or None when no hand was found)."""
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return
+        self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                                (os.path.normcase(os.path.abspath(image_path)), stat.st_size, stat.st_mtime_ns, digest))
+        if landmarks is None:
+            self.connection.execute("INSERT OR REPLACE INTO detections VALUES (?, ?, 0, NULL)", (digest, self.config))
+        else:
+            landmarks = np.asarray(landmarks, dtype=np.float32)
+            self.connection.execute("INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?)",
+                                    (digest, self.config, len(landmarks), landmarks.tobytes()))
+        self._uncommitted += 1
+        if self._uncommitted >= CACHE_COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+def crop_box(x_coords, y_coords, width, height, margin=DEFAULT_MARGIN, crop_size=DEFAULT_CROP_SIZE):
+    """
+    The square crop (x_min, y_min, x_max, y_max) around the landmark pixel
+    coordinates: the landmarks' bounding box plus margin, centred in a
+    crop_size square (larger if the box is), shifted to stay inside the
+    image. Both axes are worked out together as (x, y) pairs.
+    """
+    points = np.stack([np.asarray(x_coords), np.asarray(y_coords)]).astype(np.int64)
+    size = np.array([width, height], dtype=np.int64)
+
+    # The landmark box plus margin, clamped to the image
+    low = np.maximum(points.min(axis=1) - margin, 0)
+    high = np.minimum(points.max(axis=1) + margin, size)
+    center = (low + high) // 2
+
+    # Half the crop side, widened for boxes bigger than crop_size
+    extent = high - low
+    half = np.max(np.where(extent > crop_size, extent // 2, crop_size // 2))
+
+    # Clamp to the image, then push a short side back to crop_size from the edge it hit
+    crop_low = np.maximum(center - half, 0)
+    crop_high = np.minimum(center + half, size)
+    short = crop_high - crop_low < crop_size
+    at_start = crop_low == 0
+    crop_high, crop_low = (np.where(short & at_start, np.minimum(crop_low + crop_size, size), crop_high),
+                           np.where(short & ~at_start, np.maximum(crop_high - crop_size, 0), crop_low))
+    return int(crop_low[0]), int(crop_low[1]), int(crop_high[0]), int(crop_high[1])
+
+
+def crop_image(image, box, crop_size=DEFAULT_CROP_SIZE):
+    """Cut box out of image and scale it up to crop_size x crop_size if it is smaller."""
+    x_min, y_min, x_max, y_max = box
+    cropped_image = image[y_min:y_max, x_min:x_max]
+    # Resize the image to crop_size x crop_size if needed
+    if cropped_image.shape[0] < crop_size or cropped_image.shape[1] < crop_size:
+        cropped_image = cv2.resize(cropped_image, (crop_size, crop_size), interpolation=cv2.INTER_LINEAR)
+    return cropped_image
+
+
+def read_image_data(image_path):
+    """The file's bytes as a uint8 array, for hashing and cv2.imdecode. None when it cannot be read."""
+    try:
+        return np.fromfile(image_path, dtype=np.uint8)
+    except OSError:
+        return None
+
+
+def decode_image(data, flags=cv2.IMREAD_COLOR):
+    if data is None or not data.size:
+        return None
+    return cv2.imdecode(data, flags)
+
+
+def load_for_detection(image_path, proxy_long_edge=None, data=None):
+    """
+    Decode an image for detection. Returns (proxy, image): proxy is the BGR
+    frame to detect on, with a long edge of at most proxy_long_edge (None
+    means full resolution), and image is the full-resolution frame, or None
+    when only a reduced JPEG decode was made. Returns (None, None) when the
+    file cannot be read. data is the file's bytes when already read.
+    """
+    if data is None:
+        data = read_image_data(image_path)
+    image = None
+    proxy = None
+    if proxy_long_edge and image_path.lower().endswith(JPEG_EXTENSIONS):
+        try:
+            with Image.open(io.BytesIO(data)) as header:
+                long_edge = max(header.size)
+        except Exception:
+            long_edge = 0
+        # The largest DCT reduction that still leaves at least proxy_long_edge pixels
+        for factor, flag in REDUCED_DECODE_FLAGS:
+            if long_edge // factor >= proxy_long_edge:
+                proxy = decode_image(data, flag)
+                break
+    if proxy is None:
+        image = decode_image(data)
+        if image is None:
+            return None, None
+        proxy = image
+    if proxy_long_edge and max(proxy.shape[:2]) > proxy_long_edge:
+        h, w = proxy.shape[:2]
+        scale = proxy_long_edge / max(h, w)
+        proxy = cv2.resize(proxy, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    return proxy, image
+
+
+def detect_landmarks(image):
+    """Landmarks from the worker's detector: a (hands, 21, 2) normalised array, or None."""
+    return _detector.detect(image)
+
+
+def landmark_pixels(landmarks, width, height):
+    """Normalised landmarks as integer pixel coordinates (x_coords, y_coords) of a width x height image."""
+    points = np.asarray(landmarks).reshape(-1, 2)
+    return (points[:, 0] * width).astype(int), (points[:, 1] * height).astype(int)
+
+
+def decode_stage(image_path, proxy_long_edge=None, landmarks=None, hash_data=False):
+    """
+    Decode stage: read one image, hash it when hash_data is set (for the
+    cache) and, with proxy_long_edge, decode the proxy to detect on.
+    Full-resolution detection leaves the decode to the detect stage, so full
+    frames never cross the process boundary, and with landmarks already
+    known (from the cache) the encode stage decodes it. Returns a frame dict
+    (data, hash, proxy, crop, seconds); hash is None without hash_data, and
+    data is None when the file cannot be read or decoded.
+    """
+    start = time.perf_counter()
+    frame = {"data": read_image_data(image_path), "hash": None, "proxy": None, "crop": None}
+    if frame["data"] is not None and landmarks is None:
+        if hash_data:
+            frame["hash"] = content_hash(frame["data"])
+        if proxy_long_edge:
+            # A full decode made on the way to the proxy is not kept: queued
+            # frames stay proxy-sized and the encode stage decodes again
+            # only when hands were found
+            frame["proxy"] = load_for_detection(image_path, proxy_long_edge, frame["data"])[0]
+            if frame["proxy"] is None:
+                frame["data"] = None
+    frame["seconds"] = time.perf_counter() - start
+    return frame
+
+
+def detect_stage(proxy, data=None, margin=DEFAULT_MARGIN, crop_size=DEFAULT_CROP_SIZE):
+    """
+    Detect stage, run in a worker process, on a proxy frame or, for
+    full-resolution detection, on the file's bytes (data). In that case
+    the worker decodes the image and cuts the crop too, so only the bytes
+    go in and the crop comes back. Returns a dict with status ("detected",
+    "no_hands" or "unreadable"), landmarks (a float32 (hands, 21, 2) array
+    or None), crop (or None) and seconds; None once the run is cancelled.
+    """
+    if _cancel_event is not None and _cancel_event.is_set():
+        return None
+    start = time.perf_counter()
+    result = {"status": "no_hands", "landmarks": None, "crop": None}
+    image = decode_image(data) if proxy is None else proxy
+    if image is None:
+        result["status"] = "unreadable"
+    else:
+        landmarks = detect_landmarks(image)
+        if landmarks is not None:
+            # Cached landmarks are float32; crop from the same values either way
+            result.update(status="detected", landmarks=np.asarray(landmarks, dtype=np.float32))
+            if proxy is None:
+                result["crop"] = cut_crop(image, result["landmarks"], margin, crop_size)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def cut_crop(image, landmarks, margin=DEFAULT_MARGIN, crop_size=DEFAULT_CROP_SIZE):
+    """The square crop around normalised landmarks, cut from the full-resolution image."""
+    h, w = image.shape[:2]
+    x_coords, y_coords = landmark_pixels(landmarks, w, h)
+    return crop_image(image, crop_box(x_coords, y_coords, w, h, margin, crop_size), crop_size)
+
+
+def encode_stage(frame, landmarks, output_path, margin=DEFAULT_MARGIN, crop_size=DEFAULT_CROP_SIZE):
+    """
+    Encode stage: write the crop, first decoding the full image and cutting
+    the crop from it unless the detect stage already did. Returns (status,
+    seconds), status being "saved" or "unreadable".
+    """
+    start = time.perf_counter()
+    crop = frame["crop"]
+    if crop is None:
+        image = decode_image(frame["data"])
+        if image is None:
+            return "unreadable", time.perf_counter() - start
+        crop = cut_crop(image, landmarks, margin, crop_size)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if not cv2.imwrite(output_path, crop):
+        raise OSError(f"Could not write {output_path}")
+    return "saved", time.perf_counter() - start
+
+
+def process_image(image_path, output_path, margin=DEFAULT_MARGIN, crop_size=DEFAULT_CROP_SIZE, proxy_long_edge=None,
+                  landmarks=None):
+    """
+    Run the three stages for one image in the calling process, with the
+    detector set up by _init_worker. With landmarks (from the cache)
+    detection is skipped and only the crop is made. Returns "saved",
+    "no_hands", "unreadable" or "cancelled".
+    """
+    frame = decode_stage(image_path, proxy_long_edge, landmarks)
+    if frame["data"] is None:
+        return "unreadable"
+    if landmarks is None:
+        detected = detect_stage(frame["proxy"], frame["data"], margin, crop_size)
+        if detected is None:
+            return "cancelled"
+        if detected["status"] != "detected":
+            return detected["status"]
+        landmarks = detected["landmarks"]
+        frame["crop"] = detected["crop"]
+    return encode_stage(frame, landmarks, output_path, margin, crop_size)[0]
+
+
+def _landmark_box(landmarks, width, height):
+    x_coords, y_coords = landmark_pixels(landmarks, width, height)
+    return x_coords.min(), y_coords.min(), x_coords.max(), y_coords.max()
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x_min, y_min, x_max, y_max) boxes."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    intersection = max(width, 0) * max(height, 0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 1.0
+
+
+def proxy_accuracy(image_paths, proxy_long_edge, max_num_hands=MAX_NUM_HANDS, detector="mediapipe"):
+    """
+    Run detection on every image at full resolution and on the proxy, and
+    compare the hand bounding boxes (in source pixels). Returns a report with
+    how often the two agree on finding hands, the IoU of the boxes where
+    both do, and the time each path took (decode + detection).
+    """
+    _init_worker(None, detector, max_num_hands)
+    per_image = []
+    full_seconds = proxy_seconds = 0.0
+    for image_path in image_paths:
+        start = time.perf_counter()
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        full = detect_landmarks(image)
+        middle = time.perf_counter()
+        proxy = detect_landmarks(load_for_detection(image_path, proxy_long_edge)[0])
+        end = time.perf_counter()
+        full_seconds += middle - start
+        proxy_seconds += end - middle
+
+        h, w = image.shape[:2]
+        record = {"path": image_path, "full": full is not None, "proxy": proxy is not None, "iou": None}
+        if full is not None and proxy is not None:
+            record["iou"] = round(box_iou(_landmark_box(full, w, h), _landmark_box(proxy, w, h)), 4)
+        per_image.append(record)
+
+    ious = [record["iou"] for record in per_image if record["iou"] is not None]
+    return {
+        "proxy_long_edge": proxy_long_edge,
+        "images": len(per_image),
+        "both": len(ious),
+        "full_only": sum(record["full"] and not record["proxy"] for record in per_image),
+        "proxy_only": sum(record["proxy"] and not record["full"] for record in per_image),
+        "neither": sum(not record["full"] and not record["proxy"] for record in per_image),
+        "mean_iou": round(sum(ious) / len(ious), 4) if ious else None,
+        "min_iou": min(ious) if ious else None,
+        "full_seconds": round(full_seconds, 3),
+        "proxy_seconds": round(proxy_seconds, 3),
+        "speedup": round(full_seconds / proxy_seconds, 2) if proxy_seconds else None,
+        "per_image": per_image,
+    }
+
+
+class HandCropEngine:
+    """
+    Runs (image_path, output_path) tasks through the decode / detect / encode
+    pipeline: decode_workers threads, a pool of worker processes each with
+    its own detector (see DETECTORS; MediaPipe Hands by default) and
+    encode_workers threads. decode_depth bounds the frames being decoded or
+    waiting for the detector, encode_depth the crops waiting to be written.
+    Failures are collected in self.failures instead of stopping the batch.
+    With proxy_long_edge, detection runs on a copy downscaled to that long
+    edge. With cache_path, detection results are reused from and added to a
+    LandmarkCache there.
+    """
+
+    def __init__(self, workers=None, margin=DEFAULT_MARGIN, crop_size=DEFAULT_CROP_SIZE, max_num_hands=MAX_NUM_HANDS,
+                 proxy_long_edge=None, detector="mediapipe", cache_path=None, decode_workers=None,
+                 encode_workers=None, decode_depth=None, encode_depth=None):
+        for name, value in (("workers", workers), ("decode_workers", decode_workers),
+                            ("encode_workers", encode_workers), ("decode_depth", decode_depth),
+                            ("encode_depth", encode_depth)):
+            if value is not None and value < 1:
+                raise ValueError(f"{name} must be at least 1, got {value}")
+        self.workers = workers or os.cpu_count() or 1
+        self.margin = margin
+        self.crop_size = crop_size
+        self.proxy_long_edge = proxy_long_edge or None
+        self.max_num_hands = max_num_hands
+        self.detector = detector
+        self.cache_path = cache_path
+        self.decode_workers = decode_workers or DEFAULT_DECODE_WORKERS
+        self.encode_workers = encode_workers or DEFAULT_ENCODE_WORKERS
+        self.decode_depth = decode_depth or self.workers * QUEUE_DEPTH_PER_WORKER
+        self.encode_depth = encode_depth or self.encode_workers * QUEUE_DEPTH_PER_WORKER
+        self.counts = {"saved": 0, "no_hands": 0, "unreadable": 0}
+        self.cached = 0
+        self.done = 0
+        self.stage_seconds = dict.fromkeys(PIPELINE_STAGES, 0.0)
+        self.stage_items = dict.fromkeys(PIPELINE_STAGES, 0)
+        self.failures = []
+        self.summary = None
+        self._cancel_event = multiprocessing.Event()
+
+    def cancel(self):
+        """Stop handing out new images; images already in a stage finish it."""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def _finish(self, image_path, status, total, progress_queue):
+        if status is not None:
+            self.counts[status] += 1
+        self.done += 1
+        if progress_queue is not None:
+            progress_queue.put(("progress", self.done, total, image_path))
+
+    def _fail(self, image_path, error, total, progress_queue):
+        self.failures.append((image_path, str(error)))
+        if progress_queue is not None:
+            progress_queue.put(("error", image_path, str(error)))
+        self._finish(image_path, None, total, progress_queue)
+
+    def _count(self, stage, seconds):
+        self.stage_seconds[stage] += seconds
+        self.stage_items[stage] += 1
+
+    def stage_report(self, elapsed):
+        """
+        Per-stage threads, items, busy seconds and utilisation (busy time /
+        (elapsed * threads)). The stage closest to 1.0 is the bottleneck.
+        """
+        threads = {"decode": self.decode_workers, "detect": self.workers, "encode": self.encode_workers}
+        return {stage: {"threads": threads[stage], "items": self.stage_items[stage],
+                        "busy_seconds": round(self.stage_seconds[stage], 3),
+                        "utilization": round(self.stage_seconds[stage] / (elapsed * threads[stage]), 3)
+                        if elapsed else 0.0}
+                for stage in PIPELINE_STAGES}
+
+    def run(self, tasks, progress_queue=None):
+        """
+        Process every task and return the run summary.
+
+        When progress_queue is given it receives ("progress", done, total, path)
+        and ("error", path, message) tuples while running, and a final
+        ("finished", summary) tuple.
+        """
+        if self.detector == MediaPipeDetector.name and mp is None:
+            raise ImportError("mediapipe is required for hand detection (pip install mediapipe)")
+        start_time = time.perf_counter()
+        tasks = list(tasks)
+        total = len(tasks)
+        pending = iter(tasks)
+        decoding = {}                   # thread future -> (task, cached landmarks)
+        ready = collections.deque()     # (task, frame) waiting for the detector
+        detecting = {}                  # process future -> (task, frame)
+        to_encode = collections.deque() # (task, frame, landmarks) waiting for an encode thread
+        encoding = {}                   # thread future -> task
+        exhausted = False
+
+        config = detection_config(self.detector, self.proxy_long_edge, self.max_num_hands)
+        cache = LandmarkCache(self.cache_path, config) if self.cache_path else None
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                       initargs=(self._cancel_event, self.detector, self.max_num_hands))
+        decoder = ThreadPoolExecutor(max_workers=self.decode_workers)
+        encoder = ThreadPoolExecutor(max_workers=self.encode_workers)
+        try:
+            while True:
+                # Fill from the back of the pipeline, so a full later stage
+                # holds back the earlier ones instead of frames piling up
+                while not self.cancelled and to_encode and len(encoding) < self.encode_workers:
+                    task, frame, landmarks = to_encode.popleft()
+                    encoding[encoder.submit(encode_stage, frame, landmarks, task[1], self.margin,
+                                            self.crop_size)] = task
+                while (not self.cancelled and ready and len(detecting) < self.workers * JOBS_PER_WORKER
+                       and len(to_encode) < self.encode_depth):
+                    task, frame = ready.popleft()
+                    # Full-resolution detection ships the file's bytes, not a decoded frame
+                    data = frame["data"] if frame["proxy"] is None else None
+                    detecting[executor.submit(detect_stage, frame["proxy"], data, self.margin,
+                                              self.crop_size)] = (task, frame)
+                while not self.cancelled and not exhausted and len(decoding) + len(ready) < self.decode_depth:
+                    task = next(pending, None)
+                    if task is None:
+                        exhausted = True
+                        break
+                    found, landmarks = cache.lookup(task[0]) if cache is not None else (False, None)
+                    if found and landmarks is None:
+                        # Known to have no hands with these settings: nothing to decode
+                        self.cached += 1
+                        self._finish(task[0], "no_hands", total, progress_queue)
+                        continue
+                    decoding[decoder.submit(decode_stage, task[0], self.proxy_long_edge, landmarks,
+                                            cache is not None)] = (task, landmarks)
+                if not decoding and not detecting and not encoding:
+                    break
+
+                completed, _ = wait(list(decoding) + list(detecting) + list(encoding), return_when=FIRST_COMPLETED)
+                for future in completed:
+                    if future in decoding:
+                        task, landmarks = decoding.pop(future)
+                        if future.cancelled():
+                            continue
+                        try:
+                            frame = future.result()
+                        except Exception as e:
+                            self._fail(task[0], e, total, progress_queue)
+                            continue
+                        self._count("decode", frame["seconds"])
+                        if frame["data"] is None:
+                            self._finish(task[0], "unreadable", total, progress_queue)
+                            continue
+                        found = landmarks is not None
+                        if not found and cache is not None:
+                            # Same content as an image detected before, e.g. a renamed or copied file
+                            found, landmarks = cache.lookup_hash(frame["hash"])
+                            if found:
+                                cache.store(task[0], frame["hash"], landmarks)
+                        if not found:
+                            ready.append((task, frame))
+                            continue
+                        self.cached += 1
+                        if landmarks is None:
+                            self._finish(task[0], "no_hands", total, progress_queue)
+                        else:
+                            to_encode.append((task, frame, landmarks))
+
+                    elif future in detecting:
+                        task, frame = detecting.pop(future)
+                        if future.cancelled():
+                            continue
+                        try:
+                            detected = future.result()
+                        except Exception as e:
+                            self._fail(task[0], e, total, progress_queue)
+                            continue
+                        if detected is None:
+                            continue  # Cancelled before it started
+                        self._count("detect", detected["seconds"])
+                        if detected["status"] == "unreadable":
+                            self._finish(task[0], "unreadable", total, progress_queue)
+                            continue
+                        if cache is not None:
+                            cache.store(task[0], frame["hash"], detected["landmarks"])
+                        if detected["status"] == "no_hands":
+                            self._finish(task[0], "no_hands", total, progress_queue)
+                            continue
+                        frame["proxy"] = None
+                        if detected["crop"] is not None:
+                            frame.update(crop=detected["crop"], data=None)
+                        to_encode.append((task, frame, detected["landmarks"]))
+
+                    else:
+                        task = encoding.pop(future)
+                        try:
+                            status, seconds = future.result()
+                        except Exception as e:
+                            self._fail(task[0], e, total, progress_queue)
+                            continue
+                        self._count("encode", seconds)
+                        self._finish(task[0], status, total, progress_queue)
+
+                if self.cancelled:
+                    # Drop everything that has not started yet
+                    for future in list(decoding) + list(detecting):
+                        future.cancel()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            decoder.shutdown(wait=True, cancel_futures=True)
+            encoder.shutdown(wait=True)
+            if cache is not None:
+                cache.close()
+
+        elapsed = time.perf_counter() - start_time
+        self.summary = dict(self.counts, cached=self.cached, total=total, done=self.done, failed=len(self.failures),
+                            proxy_long_edge=self.proxy_long_edge, detector=self.detector,
+                            cancelled=self.cancelled, elapsed=elapsed,
+                            images_per_sec=self.done / elapsed if elapsed else 0.0,
+                            stages=self.stage_report(elapsed))
+        if progress_queue is not None:
+            progress_queue.put(("finished", self.summary))
+        return self.summary
+
+
+class _JsonLinesReporter:
+    """Queue stand-in that prints engine messages as JSON lines."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def put(self, message):
+        if message[0] == "progress":
+            record = {"event": "progress", "done": message[1], "total": message[2], "path": message[3]}
+        elif message[0] == "error":
+            record = {"event": "error", "path": message[1], "error": message[2]}
+        else:
+            record = dict({"event": "finished"}, **message[1])
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect hands in a folder of photos and save square crops.")
+    parser.add_argument("folder", help="folder with the source images (searched recursively)")
+    parser.add_argument("--margin", type=int, default=DEFAULT_MARGIN, help=f"pixels around the hands (default: {DEFAULT_MARGIN})")
+    parser.add_argument("--crop-size", type=int, default=DEFAULT_CROP_SIZE,
+                        help=f"side of the square crop (default: {DEFAULT_CROP_SIZE})")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--proxy", type=int, default=None, metavar="PIXELS",
+                        help="detect on a copy downscaled to this long edge (default: full resolution)")
+    parser.add_argument("--accuracy", type=int, default=None, metavar="N",
+                        help="compare --proxy detection with full resolution on N images, print the report and exit")
+    parser.add_argument("--detector", choices=list(DETECTORS), default="mediapipe",
+                        help="hand detector; 'synthetic' is a deterministic stand-in for timing without the model")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"detect every image again instead of reusing {CACHE_NAME} in the folder")
+    parser.add_argument("--decode-workers", type=int, default=None,
+                        help=f"threads reading and decoding images (default: {DEFAULT_DECODE_WORKERS})")
+    parser.add_argument("--encode-workers", type=int, default=None,
+                        help=f"threads cropping and writing images (default: {DEFAULT_ENCODE_WORKERS})")
+    parser.add_argument("--decode-depth", type=int, default=None,
+                        help=f"images decoded ahead of the detector (default: {QUEUE_DEPTH_PER_WORKER} per worker)")
+    parser.add_argument("--encode-depth", type=int, default=None,
+                        help=f"crops waiting to be written (default: {QUEUE_DEPTH_PER_WORKER} per encode thread)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.accuracy:
+            if not args.proxy:
+                parser.error("--accuracy needs --proxy")
+            image_paths = [task[0] for task in plan_tasks(args.folder)][:args.accuracy]
+            print(json.dumps(proxy_accuracy(image_paths, args.proxy, detector=args.detector), indent=2))
+            return 0
+
+        cache_path = None if args.no_cache else os.path.join(args.folder, CACHE_NAME)
+        engine = HandCropEngine(args.workers, args.margin, args.crop_size, proxy_long_edge=args.proxy,
+                                detector=args.detector, cache_path=cache_path, decode_workers=args.decode_workers,
+                                encode_workers=args.encode_workers, decode_depth=args.decode_depth,
+                                encode_depth=args.encode_depth)
+        engine.run(plan_tasks(args.folder), _JsonLinesReporter(sys.stdout))
+    except (ImportError, ValueError) as e:
+        parser.error(str(e))
+    return 1 if engine.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
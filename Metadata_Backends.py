@@ -0,0 +1,524 @@
+"""
+Metadata writers for Txt_to_Metadata.py.
+
+Both backends take the same tag dictionary (see TAG_KEYS) and expose
+write(image_file, tags) -> (success, message), read(image_files) ->
+{image_file: tags} for a batch of files, and close(). They are safe to call
+from several threads at once.
+
+ExifToolBackend  sends the tags to a pool of long-lived ExifTool processes
+                 (ExifTool_Session.py). Handles every format ExifTool knows.
+XmpBackend       pure Python: builds the XMP packet itself and splices it into
+                 the JPEG APP1 segment or the PNG iTXt chunk. Pixel data is
+                 never decoded; the file is streamed once into a temporary
+                 file next to it, which then replaces the original.
+"""
+import os
+import json
+import shutil
+import struct
+import tempfile
+import zlib
+import xml.etree.ElementTree as ET
+
+from ExifTool_Session import ExifToolPool, ExifToolError, DEFAULT_EXIFTOOL_PATH, write_succeeded
+
+# Keys of the tag dictionary shared by the backends; missing keys are left untouched in the file
+TAG_KEYS = ("title", "description", "keywords", "creator", "authors_position",
+            "copyright_notice", "rights", "web_statement", "rating")
+
+NAMESPACES = {
+    "x": "adobe:ns:meta/",
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "photoshop": "http://ns.adobe.com/photoshop/1.0/",
+    "xmp": "http://ns.adobe.com/xap/1.0/",
+    "xmpRights": "http://ns.adobe.com/xap/1.0/rights/",
+    "xmpNote": "http://ns.adobe.com/xmp/note/",
+}
+# Other namespaces common in existing packets, so merged packets keep their
+# usual prefixes; any other namespace is written with a generated ns<N> prefix
+OTHER_NAMESPACES = {
+    "aux": "http://ns.adobe.com/exif/1.0/aux/",
+    "crs": "http://ns.adobe.com/camera-raw-settings/1.0/",
+    "exif": "http://ns.adobe.com/exif/1.0/",
+    "exifEX": "http://cipa.jp/exif/1.0/",
+    "Iptc4xmpCore": "http://iptc.org/std/Iptc4xmpCore/1.0/xmlns/",
+    "Iptc4xmpExt": "http://iptc.org/std/Iptc4xmpExt/2008-02-29/",
+    "lr": "http://ns.adobe.com/lightroom/1.0/",
+    "mwg-rs": "http://www.metadataworkinggroup.com/schemas/regions/",
+    "pdf": "http://ns.adobe.com/pdf/1.3/",
+    "plus": "http://ns.useplus.org/ldf/xmp/1.0/",
+    "stArea": "http://ns.adobe.com/xmp/sType/Area#",
+    "stDim": "http://ns.adobe.com/xap/1.0/sType/Dimensions#",
+    "stEvt": "http://ns.adobe.com/xap/1.0/sType/ResourceEvent#",
+    "stRef": "http://ns.adobe.com/xap/1.0/sType/ResourceRef#",
+    "tiff": "http://ns.adobe.com/tiff/1.0/",
+    "xmpDM": "http://ns.adobe.com/xmp/1.0/DynamicMedia/",
+    "xmpMM": "http://ns.adobe.com/xap/1.0/mm/",
+}
+# Registered once here: the registry is global to ElementTree, and packets are
+# parsed and written from several threads at once
+for _prefix, _uri in {**OTHER_NAMESPACES, **NAMESPACES}.items():
+    ET.register_namespace(_prefix, _uri)
+
+XMP_PACKET_HEADER = '<?xpacket begin="﻿" id="W5M0MpCehiHzreSzNTczkc9d"?>\n'
+XMP_PACKET_TRAILER = '<?xpacket end="w"?>'
+# Whitespace left in the packet so other tools can edit it in place
+XMP_PADDING = 2048
+
+JPEG_XMP_SIGNATURE = b"http://ns.adobe.com/xap/1.0/\x00"
+JPEG_EXTENDED_XMP_SIGNATURE = b"http://ns.adobe.com/xmp/extension/\x00"
+# Largest XMP packet that fits in one APP1 segment
+JPEG_MAX_XMP = 65535 - 2 - len(JPEG_XMP_SIGNATURE)
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_XMP_KEYWORD = b"XML:com.adobe.xmp"
+
+
+# ExifTool tags read back for the skip-unchanged check, and their names in -json output
+EXIFTOOL_READ_TAGS = ("-XMP-dc:Title", "-XMP-dc:Description", "-XMP-dc:Subject", "-XMP-dc:Creator",
+                      "-XMP-photoshop:AuthorsPosition", "-IPTC:CopyrightNotice", "-XMP-dc:Rights",
+                      "-XMP-xmpRights:WebStatement", "-XMP-xmp:Rating")
+EXIFTOOL_TAG_NAMES = {"title": "Title", "description": "Description", "keywords": "Subject", "creator": "Creator",
+                      "authors_position": "AuthorsPosition", "copyright_notice": "CopyrightNotice",
+                      "rights": "Rights", "web_statement": "WebStatement", "rating": "Rating"}
+
+
+def exiftool_args(tags):
+    """ExifTool arguments for a tag dictionary."""
+    args = []
+    if tags.get("title"):
+        args.extend([
+            f"-XMP-dc:Title={tags['title']}",  # Title in XMP namespace
+            f"-photoshop:Headline={tags['title']}"  # Headline for Photoshop metadata
+        ])
+    if tags.get("description"):
+        args.append(f"-XMP-dc:Description={tags['description']}")
+    for keyword in tags.get("keywords", []):
+        args.append(f"-XMP-dc:Subject={keyword}")
+    if tags.get("creator"):
+        args.append(f"-XMP-dc:Creator={tags['creator']}")
+    if tags.get("authors_position"):
+        args.append(f"-XMP-photoshop:AuthorsPosition={tags['authors_position']}")
+    if tags.get("copyright_notice"):
+        args.append(f"-IPTC:CopyrightNotice={tags['copyright_notice']}")
+    if tags.get("rights"):
+        args.append(f"-XMP-dc:Rights={tags['rights']}")
+    if tags.get("web_statement"):
+        args.append(f"-XMP-xmpRights:WebStatement={tags['web_statement']}")
+    if tags.get("rating"):
+        args.append(f"-XMP-xmp:Rating={tags['rating']}")  # Rating (1–5)
+    return args
+
+
+class ExifToolBackend:
+    """Writes tags through a pool of -stay_open ExifTool sessions."""
+    name = "ExifTool"
+
+    def __init__(self, sessions=2, executable=None):
+        self.executable = executable or DEFAULT_EXIFTOOL_PATH
+        self.pool = ExifToolPool(sessions, self.executable)
+
+    @staticmethod
+    def available(executable=None):
+        executable = executable or DEFAULT_EXIFTOOL_PATH
+        return os.path.isfile(executable) or shutil.which(executable) is not None
+
+    def write(self, image_file, tags):
+        try:
+            stdout, stderr = self.pool.execute(*exiftool_args(tags), "-overwrite_original", image_file)
+        except ExifToolError as e:
+            return False, f"Error processing '{image_file}': {e}"
+        if write_succeeded(stdout, stderr):
+            return True, f"✔️ Metadata successfully applied to '{os.path.basename(image_file)}'"
+        return False, f"Error: {stderr or stdout}"
+
+    def read(self, image_files):
+        """
+        Current tags of the images as {image_file: tags}, read with a single
+        ExifTool command. Files ExifTool could not read are left out.
+        """
+        if not image_files:
+            return {}
+        try:
+            stdout, _ = self.pool.execute("-json", *EXIFTOOL_READ_TAGS, *image_files)
+            entries = json.loads(stdout) if stdout else []
+        except (ExifToolError, ValueError):
+            return {}
+        # SourceFile comes back with forward slashes on Windows
+        by_path = {os.path.normcase(os.path.abspath(path)): path for path in image_files}
+        current = {}
+        for entry in entries:
+            path = by_path.get(os.path.normcase(os.path.abspath(entry.get("SourceFile", ""))))
+            if path is None or "Error" in entry:
+                continue
+            current[path] = normalize_tags({key: entry[name] for key, name in EXIFTOOL_TAG_NAMES.items() if name in entry})
+        return current
+
+    def close(self):
+        self.pool.close()
+
+
+def _qname(name):
+    prefix, local = name.split(":")
+    return f"{{{NAMESPACES[prefix]}}}{local}"
+
+
+def xmp_properties(tags):
+    """
+    The XMP properties for a tag dictionary as (name, kind, value), where kind
+    is "text", "alt" (language alternative), "seq" or "bag".
+    """
+    properties = []
+    if tags.get("title"):
+        properties += [("dc:title", "alt", tags["title"]), ("photoshop:Headline", "text", tags["title"])]
+    if tags.get("description"):
+        properties.append(("dc:description", "alt", tags["description"]))
+    if tags.get("keywords"):
+        properties.append(("dc:subject", "bag", list(tags["keywords"])))
+    if tags.get("creator"):
+        properties.append(("dc:creator", "seq", [tags["creator"]]))
+    if tags.get("authors_position"):
+        properties.append(("photoshop:AuthorsPosition", "text", tags["authors_position"]))
+    # IPTC Core keeps the copyright notice in dc:rights
+    rights = tags.get("rights") or tags.get("copyright_notice")
+    if rights:
+        properties.append(("dc:rights", "alt", rights))
+    if tags.get("copyright_notice"):
+        properties.append(("xmpRights:Marked", "text", "True"))
+    if tags.get("web_statement"):
+        properties.append(("xmpRights:WebStatement", "text", tags["web_statement"]))
+    if tags.get("rating"):
+        properties.append(("xmp:Rating", "text", str(tags["rating"])))
+    return properties
+
+
+def _property_element(name, kind, value):
+    element = ET.Element(_qname(name))
+    if kind == "text":
+        element.text = value
+        return element
+    container = ET.SubElement(element, _qname({"alt": "rdf:Alt", "seq": "rdf:Seq", "bag": "rdf:Bag"}[kind]))
+    if kind == "alt":
+        item = ET.SubElement(container, _qname("rdf:li"), {"{http://www.w3.org/XML/1998/namespace}lang": "x-default"})
+        item.text = value
+    else:
+        for entry in value:
+            ET.SubElement(container, _qname("rdf:li")).text = entry
+    return element
+
+
+def _empty_xmpmeta():
+    root = ET.Element(_qname("x:xmpmeta"))
+    rdf = ET.SubElement(root, _qname("rdf:RDF"))
+    ET.SubElement(rdf, _qname("rdf:Description"), {_qname("rdf:about"): ""})
+    return root
+
+
+def _parse_xmp(packet):
+    # Parse an existing packet; None when it is not well-formed XML
+    try:
+        return ET.fromstring(packet)
+    except ET.ParseError:
+        return None
+
+
+def build_xmp_packet(tags, existing=None):
+    """
+    Serialised XMP packet (UTF-8 bytes) for the tags. Properties of an
+    existing packet are kept, apart from the ones being written.
+    """
+    root = None
+    if existing:
+        root = _parse_xmp(existing)
+        if root is not None and root.tag == _qname("rdf:RDF"):
+            wrapper = ET.Element(_qname("x:xmpmeta"))
+            wrapper.append(root)
+            root = wrapper
+        if root is None or root.tag != _qname("x:xmpmeta") or root.find(_qname("rdf:RDF")) is None:
+            root = None
+    if root is None:
+        root = _empty_xmpmeta()
+
+    rdf = root.find(_qname("rdf:RDF"))
+    descriptions = rdf.findall(_qname("rdf:Description"))
+    if not descriptions:
+        descriptions = [ET.SubElement(rdf, _qname("rdf:Description"), {_qname("rdf:about"): ""})]
+
+    properties = xmp_properties(tags)
+    # Drop the old values, whether stored as elements or as attributes, and
+    # the pointer to extended XMP segments that are not carried over
+    replaced = {_qname(name) for name, _, _ in properties} | {_qname("xmpNote:HasExtendedXMP")}
+    for description in descriptions:
+        for child in list(description):
+            if child.tag in replaced:
+                description.remove(child)
+        for attribute in list(description.attrib):
+            if attribute in replaced:
+                del description.attrib[attribute]
+    for name, kind, value in properties:
+        descriptions[0].append(_property_element(name, kind, value))
+
+    body = ET.tostring(root, encoding="unicode")
+    padding = (" " * 99 + "\n") * (XMP_PADDING // 100)
+    return (XMP_PACKET_HEADER + body + "\n" + padding + XMP_PACKET_TRAILER).encode("utf-8")
+
+
+def _read_exact(src, size):
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of file.")
+    return data
+
+
+def _copy_bytes(src, dst, size):
+    while size:
+        chunk = src.read(min(size, 1 << 20))
+        if not chunk:
+            raise ValueError("Unexpected end of file.")
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+def _jpeg_header(src):
+    """
+    Read a JPEG up to its scan data. Returns (segments, xmp): the header
+    segments other than XMP as (marker, payload), and the existing XMP
+    packet or None. src is left at the start of the SOS segment's length.
+    """
+    if src.read(2) != b"\xff\xd8":
+        raise ValueError("Not a JPEG file.")
+    segments = []
+    existing = None
+    while True:
+        marker = _read_exact(src, 2)
+        while marker[1] == 0xFF:  # fill bytes
+            marker = marker[1:] + _read_exact(src, 1)
+        if marker[0] != 0xFF:
+            raise ValueError("Corrupt JPEG marker.")
+        if marker[1] == 0xDA:  # SOS: the compressed data starts here
+            return segments, existing
+        length = struct.unpack(">H", _read_exact(src, 2))[0]
+        payload = _read_exact(src, length - 2)
+        if marker[1] == 0xE1 and payload.startswith(JPEG_XMP_SIGNATURE):
+            existing = payload[len(JPEG_XMP_SIGNATURE):]
+            continue
+        if marker[1] == 0xE1 and payload.startswith(JPEG_EXTENDED_XMP_SIGNATURE):
+            continue
+        segments.append((marker, payload))
+
+
+def _splice_jpeg(src, dst, tags):
+    # Header segments up to the scan data are small; buffer them so an existing
+    # XMP packet can be merged before anything is written
+    segments, existing = _jpeg_header(src)
+
+    packet = build_xmp_packet(tags, existing)
+    if len(packet) > JPEG_MAX_XMP:
+        raise ValueError("XMP packet is too large for a single JPEG segment.")
+    xmp_segment = b"\xff\xe1" + struct.pack(">H", len(packet) + len(JPEG_XMP_SIGNATURE) + 2) + JPEG_XMP_SIGNATURE + packet
+
+    dst.write(b"\xff\xd8")
+    inserted = False
+    for marker, payload in segments:
+        # XMP goes after the JFIF (APP0) and Exif (APP1) segments
+        if not inserted and marker[1] not in (0xE0, 0xE1):
+            dst.write(xmp_segment)
+            inserted = True
+        dst.write(marker + struct.pack(">H", len(payload) + 2) + payload)
+    if not inserted:
+        dst.write(xmp_segment)
+    dst.write(b"\xff\xda")
+    shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def _png_itxt_xmp(data):
+    # keyword \0, compression flag, compression method, language \0, translated keyword \0, text
+    if not data.startswith(PNG_XMP_KEYWORD + b"\x00"):
+        return None
+    rest = data[len(PNG_XMP_KEYWORD) + 1:]
+    compressed = rest[0] == 1
+    rest = rest[2:]
+    rest = rest[rest.index(b"\x00") + 1:]  # language tag
+    rest = rest[rest.index(b"\x00") + 1:]  # translated keyword
+    return zlib.decompress(rest) if compressed else rest
+
+
+def _splice_png(src, dst, tags):
+    # The existing packet is found first (before or after the image data) and
+    # merged; every XMP chunk is then dropped and the new one is written just
+    # before the image data
+    existing = _read_png_xmp(src)
+    src.seek(len(PNG_SIGNATURE))
+    dst.write(PNG_SIGNATURE)
+    inserted = False
+    while True:
+        length, chunk_type = struct.unpack(">I4s", _read_exact(src, 8))
+        if chunk_type == b"iTXt":
+            data = _read_exact(src, length)
+            crc = _read_exact(src, 4)
+            if _png_itxt_xmp(data) is None:
+                dst.write(struct.pack(">I", length) + chunk_type + data + crc)
+            continue
+        if not inserted and chunk_type in (b"IDAT", b"IEND"):
+            packet = build_xmp_packet(tags, existing)
+            dst.write(_png_chunk(b"iTXt", PNG_XMP_KEYWORD + b"\x00\x00\x00\x00\x00" + packet))
+            inserted = True
+        dst.write(struct.pack(">I", length) + chunk_type)
+        _copy_bytes(src, dst, length + 4)
+        if chunk_type == b"IEND":
+            break
+
+
+def _read_jpeg_xmp(src):
+    return _jpeg_header(src)[1]
+
+
+def _read_png_xmp(src):
+    # The first XMP packet in the file; the image data is skipped with seeks
+    if src.read(8) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file.")
+    while True:
+        length, chunk_type = struct.unpack(">I4s", _read_exact(src, 8))
+        if chunk_type == b"IEND":
+            return None
+        if chunk_type == b"iTXt":
+            xmp = _png_itxt_xmp(_read_exact(src, length))
+            if xmp is not None:
+                return xmp
+            src.seek(4, os.SEEK_CUR)
+        else:
+            src.seek(length + 4, os.SEEK_CUR)
+
+
+def _property_value(description, name):
+    # A property as text or a list of texts, stored as an element or an attribute
+    qname = _qname(name)
+    if qname in description.attrib:
+        return description.attrib[qname]
+    element = description.find(qname)
+    if element is None:
+        return None
+    items = element.findall(f"*/{_qname('rdf:li')}")
+    if not items:
+        return (element.text or "").strip()
+    if element.find(_qname("rdf:Alt")) is not None:
+        default = [item for item in items if item.get("{http://www.w3.org/XML/1998/namespace}lang") == "x-default"]
+        return (default or items)[0].text or ""
+    return [item.text or "" for item in items]
+
+
+def xmp_tags(packet):
+    """The tag dictionary (TAG_KEYS) stored in an XMP packet; missing tags are left out."""
+    root = _parse_xmp(packet) if packet else None
+    if root is None:
+        return {}
+    values = {}
+    for description in root.iter(_qname("rdf:Description")):
+        for key, name in (("title", "dc:title"), ("description", "dc:description"), ("keywords", "dc:subject"),
+                          ("creator", "dc:creator"), ("authors_position", "photoshop:AuthorsPosition"),
+                          ("rights", "dc:rights"), ("web_statement", "xmpRights:WebStatement"),
+                          ("rating", "xmp:Rating")):
+            value = _property_value(description, name)
+            if value is not None and key not in values:
+                values[key] = value
+    if "rights" in values:
+        # The built-in writer keeps the copyright notice in dc:rights
+        values["copyright_notice"] = values["rights"]
+    return values
+
+
+def normalize_tags(values):
+    """Tag values as read back from a file, in the same shape as the tags that are written."""
+    tags = {}
+    for key, value in values.items():
+        if key == "keywords":
+            tags[key] = [str(item) for item in (value if isinstance(value, list) else [value])]
+        elif isinstance(value, list):
+            tags[key] = ", ".join(str(item) for item in value)
+        else:
+            tags[key] = str(value)
+    return tags
+
+
+def tags_match(desired, current):
+    """True when every tag in desired already has the same value in current."""
+    if current is None:
+        return False
+    for key, value in desired.items():
+        have = current.get(key)
+        if key == "keywords":
+            if [str(item).strip() for item in have or []] != [str(item).strip() for item in value]:
+                return False
+        elif have is None or str(have).strip() != str(value).strip():
+            return False
+    return True
+
+
+class XmpBackend:
+    """Writes the tags as an XMP packet straight into JPEG and PNG files."""
+    name = "Built-in XMP"
+    SPLICERS = {".jpg": _splice_jpeg, ".jpeg": _splice_jpeg, ".png": _splice_png}
+
+    @staticmethod
+    def available(executable=None):
+        return True
+
+    def write(self, image_file, tags):
+        splice = self.SPLICERS.get(os.path.splitext(image_file)[1].lower())
+        if splice is None:
+            return False, f"Error: '{os.path.basename(image_file)}' is not a JPEG or PNG; use the ExifTool writer for this format."
+
+        folder = os.path.dirname(os.path.abspath(image_file))
+        fd, temp_path = tempfile.mkstemp(prefix=".xmp_", suffix=".tmp", dir=folder)
+        try:
+            with open(image_file, "rb") as src, os.fdopen(fd, "wb") as dst:
+                splice(src, dst, tags)
+            shutil.copymode(image_file, temp_path)
+            os.replace(temp_path, image_file)
+        except (OSError, ValueError, IndexError, zlib.error) as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False, f"Error processing '{image_file}': {e}"
+        return True, f"✔️ Metadata successfully applied to '{os.path.basename(image_file)}'"
+
+    def read(self, image_files):
+        """
+        Current tags of the images as {image_file: tags}. Only the header of
+        each file is read; unreadable and unsupported files are left out.
+        """
+        readers = {".jpg": _read_jpeg_xmp, ".jpeg": _read_jpeg_xmp, ".png": _read_png_xmp}
+        current = {}
+        for image_file in image_files:
+            reader = readers.get(os.path.splitext(image_file)[1].lower())
+            if reader is None:
+                continue
+            try:
+                with open(image_file, "rb") as src:
+                    current[image_file] = normalize_tags(xmp_tags(reader(src)))
+            except (OSError, ValueError, IndexError, zlib.error):
+                continue
+        return current
+
+    def close(self):
+        pass
+
+
+BACKENDS = {backend.name: backend for backend in (ExifToolBackend, XmpBackend)}
+
+
+def default_backend_name(executable=None):
+    """ExifTool when it is installed, otherwise the built-in XMP writer."""
+    return ExifToolBackend.name if ExifToolBackend.available(executable) else XmpBackend.name
+
+
+def create_backend(name, sessions=2, executable=None):
+    if name == ExifToolBackend.name:
+        return ExifToolBackend(sessions, executable)
+    if name == XmpBackend.name:
+        return XmpBackend()
+    raise ValueError(f"Unknown metadata writer: {name}")
@@ -1,31 +1,34 @@
 import os
 import sys
+import queue
+import threading
 import subprocess
-from PIL import Image, ImageTk, ImageFont, ImageDraw
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-
-# Check Pillow version for Resampling compatibility
-try:
-    from PIL import Resampling
-    resampling_method = Resampling.LANCZOS
-except ImportError:
-    # For older Pillow versions
-    resampling_method = Image.LANCZOS
+from Resize_Engine import (ResizeEngine, ResizeManifest, ImageIndex, PRESET_SCALE_FACTORS, DEFAULT_MEMORY_BUDGET,
+                           list_images, output_folder_name, plan_tasks, probe_image)
 
 class ImageResizerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Image Resizer by Mehmet Sensoy")
-        self.root.geometry("600x500")
+        self.root.geometry("600x580")
         self.root.resizable(False, False)
         
         self.image_paths = []
+        self.folder_path = None
         self.original_width = None
         self.original_height = None
         self.aspect_ratio = None
         self.is_proportionate_checked = tk.BooleanVar(value=True)
         self.is_updating_size = False  # Flag to prevent recursive calls
+        self.size_edited = "width"  # Side the user typed last; the other follows each image
+        self.image_index = None
+        self.engine = None
+        self.progress_queue = queue.Queue()
+        self.workers_var = tk.StringVar(value=str(os.cpu_count() or 1))
+        self.fast_downscale_var = tk.BooleanVar(value=True)
+        self.include_subfolders_var = tk.BooleanVar(value=False)
 
         # Initialize style and themes
         self.style = ttk.Style()
@@ -63,6 +66,8 @@ class ImageResizerApp:
         # Image Info Label
         self.info_label = tk.Label(root, text="", wraplength=450)
         self.info_label.pack(pady=5)
+        self.estimate_label = tk.Label(root, text="", wraplength=450)
+        self.estimate_label.pack()
 
         # Resize Options Frame
         options_frame = tk.Frame(root)
@@ -71,19 +76,25 @@ class ImageResizerApp:
         options_label = tk.Label(options_frame, text="Select Resize Option:")
         options_label.pack(side=tk.LEFT, padx=5)
 
-        self.resize_options = [
-            "2X Downscale", "2X Upscale",
-            "3X Downscale", "3X Upscale",
-            "4X Downscale", "4X Upscale",
-            "1.5X Downscale", "1.5X Upscale",
-            "5X Downscale", "5X Upscale",
-            "Custom"
-        ]
+        self.resize_options = list(PRESET_SCALE_FACTORS) + ["Custom"]
         self.resize_var = tk.StringVar(value=self.resize_options[0])
         self.resize_dropdown = ttk.Combobox(options_frame, textvariable=self.resize_var, values=self.resize_options, state="readonly", width=20)
         self.resize_dropdown.bind("<<ComboboxSelected>>", self.on_resize_option_change)
         self.resize_dropdown.pack(side=tk.LEFT, padx=5)
 
+        workers_label = tk.Label(options_frame, text="Workers:")
+        workers_label.pack(side=tk.LEFT, padx=5)
+        self.workers_entry = ttk.Entry(options_frame, textvariable=self.workers_var, width=5)
+        self.workers_entry.pack(side=tk.LEFT, padx=5)
+        self.workers_var.trace('w', self.update_estimate)
+
+        checkbox_frame = tk.Frame(root)
+        checkbox_frame.pack()
+        self.fast_downscale_checkbox = tk.Checkbutton(checkbox_frame, text="Fast downscale (reduced JPEG decode)", variable=self.fast_downscale_var)
+        self.fast_downscale_checkbox.pack(side=tk.LEFT, padx=5)
+        self.include_subfolders_checkbox = tk.Checkbutton(checkbox_frame, text="Include subfolders", variable=self.include_subfolders_var, command=self.reload_folder)
+        self.include_subfolders_checkbox.pack(side=tk.LEFT, padx=5)
+
         # Custom Size Frame
         self.custom_size_frame = tk.Frame(root)
         self.custom_size_frame.pack(pady=5)
@@ -104,7 +115,7 @@ class ImageResizerApp:
         self.custom_height_entry = ttk.Entry(self.custom_size_frame, textvariable=self.custom_height_var, width=10)
         self.custom_height_entry.grid(row=0, column=3, padx=5, pady=5)
 
-        self.proportional_checkbox = tk.Checkbutton(self.custom_size_frame, text="Proportional", variable=self.is_proportionate_checked)
+        self.proportional_checkbox = tk.Checkbutton(self.custom_size_frame, text="Proportional (per image)", variable=self.is_proportionate_checked, command=self.update_estimate)
         self.proportional_checkbox.grid(row=0, column=4, padx=5, pady=5)
 
         # Hide the custom size frame initially
@@ -118,41 +129,118 @@ class ImageResizerApp:
         self.button_frame = tk.Frame(root)
         self.ok_button = tk.Button(self.button_frame, text="OK", command=self.process_images, state=tk.DISABLED, width=10)
         self.ok_button.pack(side=tk.LEFT, padx=20)
-        self.cancel_button = tk.Button(self.button_frame, text="CANCEL", command=root.quit, width=10)
+        self.cancel_button = tk.Button(self.button_frame, text="CANCEL", command=self.cancel, width=10)
         self.cancel_button.pack(side=tk.LEFT, padx=20)
         self.button_frame.pack(pady=10)
         
     def select_folder(self):
         folder_path = filedialog.askdirectory()
         if folder_path:
-            self.image_paths = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.lower().endswith(('png', 'jpg', 'jpeg'))]
-            if self.image_paths:
-                self.directory_label.config(text=f"Selected Folder: {folder_path}")
-                self.display_image_info(self.image_paths[0])
-                self.ok_button.config(state=tk.NORMAL)
-            else:
-                messagebox.showerror("Error", "No images found in the selected folder.")
+            self.load_folder(folder_path)
+
+    def reload_folder(self):
+        """ Rescan the selected folder, e.g. after toggling subfolders """
+        if self.folder_path:
+            self.load_folder(self.folder_path)
+
+    def load_folder(self, folder_path):
+        self.image_paths = list(list_images(folder_path, recursive=self.include_subfolders_var.get()))
+        if self.image_index is not None:
+            self.image_index.stop()
+            self.image_index = None
+        if self.image_paths:
+            self.folder_path = folder_path
+            self.directory_label.config(text=f"Selected Folder: {folder_path}")
+            self.display_image_info(self.image_paths[0])
+            self.ok_button.config(state=tk.NORMAL)
+            # Read the other headers in the background; no pixels are decoded
+            self.image_index = ImageIndex(self.image_paths)
+            threading.Thread(target=self.image_index.build, daemon=True).start()
+            self.root.after(200, self.poll_image_index, self.image_index)
+        else:
+            self.ok_button.config(state=tk.DISABLED)
+            messagebox.showerror("Error", "No images found in the selected folder.")
 
     def display_image_info(self, first_image_path):
-        with Image.open(first_image_path) as img:
-            self.original_width, self.original_height = img.size
-        self.aspect_ratio = self.original_width / self.original_height
+        info = probe_image(first_image_path)
+        self.set_reference_size(info["width"], info["height"])
         self.info_label.config(text=f"Total images: {len(self.image_paths)}\nFirst image size: {self.original_width}x{self.original_height}")
 
+    def set_reference_size(self, width, height):
+        """ Size the custom width/height fields start from and follow when proportional """
+        self.original_width, self.original_height = width, height
+        self.aspect_ratio = width / height
+
+    def poll_image_index(self, index):
+        """ Show the header scan so far as a size histogram """
+        if index is not self.image_index:
+            return  # A newer folder scan replaced this one
+        histogram = index.histogram()
+        lines = [f"Total images: {len(self.image_paths)}"
+                 + ("" if index.finished else f" (reading sizes {index.done}/{len(self.image_paths)})")]
+        for (width, height), count in histogram[:4]:
+            lines.append(f"{width}x{height}: {count} image{'s' if count > 1 else ''}")
+        if len(histogram) > 4:
+            lines.append(f"...and {sum(count for _, count in histogram[4:])} more in {len(histogram) - 4} other sizes")
+        if index.failures:
+            lines.append(f"{len(index.failures)} unreadable files")
+        self.info_label.config(text="\n".join(lines))
+
+        if index.finished:
+            if histogram:
+                # Custom sizes start from the most common size in the folder
+                self.set_reference_size(*histogram[0][0])
+            self.update_estimate()
+        else:
+            self.root.after(200, self.poll_image_index, index)
+
+    def custom_size(self):
+        """ Custom (width, height); with Proportional, the side not typed last is None and follows each image """
+        new_width = int(self.custom_width_var.get())
+        new_height = int(self.custom_height_var.get())
+        if new_width <= 0 or new_height <= 0:
+            raise ValueError("Width and Height must be positive integers.")
+        if self.is_proportionate_checked.get():
+            return (new_width, None) if self.size_edited == "width" else (None, new_height)
+        return (new_width, new_height)
+
+    def update_estimate(self, *args):
+        """ Estimate output size and runtime from the header index """
+        index = self.image_index
+        if index is None or not index.finished or not index.entries:
+            self.estimate_label.config(text="")
+            return
+        try:
+            workers = max(1, int(self.workers_var.get()))
+            if self.resize_var.get() == "Custom":
+                output_bytes, seconds = index.estimate(size=self.custom_size(), workers=workers)
+            else:
+                output_bytes, seconds = index.estimate(PRESET_SCALE_FACTORS[self.resize_var.get()], workers=workers)
+        except ValueError:
+            self.estimate_label.config(text="")
+            return
+        self.estimate_label.config(text=f"Estimated output: {output_bytes / (1 << 20):.0f} MB, about {max(1, round(seconds))} s")
+
     def on_resize_option_change(self, event=None):
         """ Show or hide custom size inputs based on the selected option """
         if self.resize_var.get() == "Custom":
             self.custom_size_frame.pack(pady=5)
+            self.is_updating_size = True
             self.custom_width_var.set(str(self.original_width))
             self.custom_height_var.set(str(self.original_height))
+            self.is_updating_size = False
+            self.size_edited = "width"
         else:
             self.custom_size_frame.pack_forget()
+        self.update_estimate()
 
     def on_width_change(self, *args):
-        if not self.is_proportionate_checked.get():
-            return
         if self.is_updating_size:
             return  # Prevent recursive calls
+        self.size_edited = "width"
+        if not self.is_proportionate_checked.get():
+            self.update_estimate()
+            return
         self.is_updating_size = True
         try:
             width_text = self.custom_width_var.get()
@@ -163,12 +251,15 @@ class ImageResizerApp:
         except ValueError:
             pass
         self.is_updating_size = False
+        self.update_estimate()
 
     def on_height_change(self, *args):
-        if not self.is_proportionate_checked.get():
-            return
         if self.is_updating_size:
             return  # Prevent recursive calls
+        self.size_edited = "height"
+        if not self.is_proportionate_checked.get():
+            self.update_estimate()
+            return
         self.is_updating_size = True
         try:
             height_text = self.custom_height_var.get()
@@ -179,65 +270,100 @@ class ImageResizerApp:
         except ValueError:
             pass
         self.is_updating_size = False
+        self.update_estimate()
+
     def process_images(self):
-        scale_factor = 1
         preset_name = self.resize_var.get()
-        
+        new_size = None
+
         if preset_name == "Custom":
             try:
-                new_width = int(self.custom_width_var.get())
-                new_height = int(self.custom_height_var.get())
-                if new_width <= 0 or new_height <= 0:
-                    raise ValueError("Width and Height must be positive integers.")
+                new_size = self.custom_size()
             except ValueError as e:
                 messagebox.showerror("Error", f"Invalid custom size: {e}")
                 return
-            output_folder_name = f"Resized_{new_width}x{new_height}"
-        else:
-            output_folder_name = f"Resized_{preset_name.replace(' ', '_')}"
+            preset_name = None
 
-        output_folder = os.path.join(os.path.dirname(self.image_paths[0]), output_folder_name)
+        output_folder = os.path.join(self.folder_path, output_folder_name(preset_name, new_size))
         os.makedirs(output_folder, exist_ok=True)
 
-        # Map presets to scale factors
-        preset_scale_factors = {
-            "2X Downscale": 0.5,
-            "2X Upscale": 2,
-            "3X Downscale": 1/3,
-            "3X Upscale": 3,
-            "4X Downscale": 0.25,
-            "4X Upscale": 4,
-            "5X Downscale": 0.2,
-            "5X Upscale": 5,
-            "1.5X Downscale": 2/3,
-            "1.5X Upscale": 1.5,
-        }
-
-        if preset_name in preset_scale_factors:
-            scale_factor = preset_scale_factors[preset_name]
-
-        for index, image_path in enumerate(self.image_paths, start=1):
-            with Image.open(image_path) as img:
-                if preset_name == "Custom":
-                    new_size = (new_width, new_height)
-                else:
-                    new_size = (
-                        int(img.width * scale_factor), int(img.height * scale_factor))
-                    
-                resized_img = img.resize(new_size, resampling_method)
-                base_filename = os.path.basename(image_path)
-                resized_img.save(os.path.join(output_folder, base_filename))
-
-            self.update_progress(index / len(self.image_paths) * 100)
-        
-        messagebox.showinfo("Success", f"Images have been resized and saved to {output_folder}")
+        try:
+            workers = int(self.workers_var.get())
+            if workers <= 0:
+                raise ValueError("Workers must be a positive integer.")
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid worker count: {e}")
+            return
+
+        tasks = plan_tasks(self.image_paths, output_folder, preset_name, new_size, src_root=self.folder_path)
+        for output_dir in {os.path.dirname(task[1]) for task in tasks}:
+            os.makedirs(output_dir, exist_ok=True)
+
+        # Resize on worker processes; progress comes back through the queue
+        self.engine = ResizeEngine(workers=workers, fast=self.fast_downscale_var.get(),
+                                   manifests=[ResizeManifest(output_folder)], memory_budget=DEFAULT_MEMORY_BUDGET)
+        self.output_folder = output_folder
+        self.ok_button.config(state=tk.DISABLED)
+        threading.Thread(target=self.run_engine, args=(self.engine, tasks), daemon=True).start()
+        self.root.after(100, self.poll_progress)
+
+    def run_engine(self, engine, tasks):
+        try:
+            engine.run(tasks, self.progress_queue)
+        except Exception as e:
+            self.progress_queue.put(("failed", str(e)))
+
+    def poll_progress(self):
+        """ Drain engine messages and update the progress bar """
+        summary = None
+        while True:
+            try:
+                message = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                _, done, total, _ = message
+                self.progress_bar['value'] = done / total * 100
+            elif message[0] in ("finished", "failed"):
+                summary = message
+
+        if summary is None:
+            self.root.after(100, self.poll_progress)
+            return
+        self.finish_processing(summary)
+
+    def finish_processing(self, message):
+        failures = self.engine.failures
+        self.engine = None
+        self.ok_button.config(state=tk.NORMAL)
         self.progress_bar['value'] = 0  # Reset progress bar
 
+        if message[0] == "failed":
+            messagebox.showerror("Error", f"Resizing stopped: {message[1]}")
+            return
+
+        summary = message[1]
+
+        if summary["cancelled"]:
+            messagebox.showinfo("Cancelled", f"Resizing cancelled after {summary['resized']} images.")
+            return
+
+        if failures:
+            details = "\n".join(f"{os.path.basename(path)}: {error}" for path, error in failures[:10])
+            messagebox.showwarning("Finished with errors", f"{len(failures)} of {summary['total']} images failed:\n{details}")
+        else:
+            skipped = f"\n{summary['skipped']} unchanged images were skipped." if summary["skipped"] else ""
+            messagebox.showinfo("Success", f"Images have been resized and saved to {self.output_folder}{skipped}")
+
         # Open the output folder
-        self.open_output_folder(output_folder)
-    def update_progress(self, value):
-        self.progress_bar['value'] = value
-        self.root.update_idletasks()
+        self.open_output_folder(self.output_folder)
+
+    def cancel(self):
+        """ Stop a running resize, or close the window when idle """
+        if self.engine is not None:
+            self.engine.cancel()
+        else:
+            self.root.quit()
 
     def change_theme(self, event=None):
         selected_theme = self.current_theme.get()
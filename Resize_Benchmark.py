@@ -0,0 +1,268 @@
+"""
+Benchmark for the QUICK_RESIZE engine (Resize_Engine.py).
+
+Generates a reproducible synthetic corpus (PNG and JPEG, a range of
+resolutions, with and without alpha), times every preset in
+PRESET_SCALE_FACTORS and reports images/sec, MB/s of source data, peak RSS
+and the decode/resize/encode split. Results can be saved as a baseline and
+later runs compared against it to catch regressions:
+
+    python Resize_Benchmark.py --save-baseline bench_baseline.json
+    python Resize_Benchmark.py --baseline bench_baseline.json
+
+The exit code is 1 when any preset is slower than the baseline by more than
+--tolerance, or when a preset fails to run.
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import queue
+import tempfile
+import multiprocessing
+from PIL import Image, ImageDraw
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is reported as None there
+    resource = None
+
+from Resize_Engine import ResizeEngine, PRESET_SCALE_FACTORS, find_preset, plan_tasks
+
+CORPUS_VERSION = 2
+# (width, height) of the generated images, cycled through the corpus
+CORPUS_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (3000, 2000), (4000, 3000)]
+DEFAULT_CORPUS_SIZE = 20
+QUICK_CORPUS_SIZE = 6
+# A preset counts as a regression when its images/sec drop by more than this
+DEFAULT_TOLERANCE = 0.10
+# Seconds between checks that a benchmark process is still alive
+RESULT_POLL_SECONDS = 1.0
+
+
+def synthetic_image(rng, size, alpha):
+    """A photo-like test image: gradients, shapes and fine noise."""
+    width, height = size
+    base = Image.linear_gradient("L").resize(size).convert("RGB")
+    tint = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    img = Image.blend(base, tint, 0.5)
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 4 + 1), y0 + rng.randrange(height // 4 + 1)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+
+    # Noise at a quarter resolution, scaled up, stands in for texture
+    noise_size = (max(1, width // 4), max(1, height // 4))
+    noise = Image.frombytes("L", noise_size, rng.randbytes(noise_size[0] * noise_size[1])).resize(size)
+    img = Image.composite(img, Image.merge("RGB", (noise, noise, noise)), Image.new("L", size, 215))
+
+    if alpha:
+        mask = Image.radial_gradient("L").resize(size)
+        img.putalpha(mask)
+    return img
+
+
+def generate_corpus(folder, count=DEFAULT_CORPUS_SIZE, seed=0):
+    """
+    Write count synthetic images to folder, or reuse them when the folder
+    already holds a corpus with the same settings. Returns the image paths.
+
+    Only files listed in an earlier corpus.json are ever replaced; a folder
+    that is not empty and holds no corpus raises ValueError.
+    """
+    spec = {"version": CORPUS_VERSION, "count": count, "seed": seed}
+    spec_path = os.path.join(folder, "corpus.json")
+    previous = None
+    try:
+        with open(spec_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if isinstance(previous, dict) and all(previous.get(key) == value for key, value in spec.items()):
+        return [os.path.join(folder, name) for name in previous["files"]]
+    if not isinstance(previous, dict) and os.path.isdir(folder) and os.listdir(folder):
+        raise ValueError(f"{folder} is not empty and holds no benchmark corpus; choose an empty or new folder")
+
+    # Replace an older corpus, removing only the images it lists
+    for name in (previous or {}).get("files", []):
+        try:
+            os.remove(os.path.join(folder, os.path.basename(name)))
+        except OSError:
+            pass
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    files = []
+    for index in range(count):
+        size = CORPUS_RESOLUTIONS[index % len(CORPUS_RESOLUTIONS)]
+        # Every third image is a PNG with alpha, the rest alternate PNG / JPEG
+        alpha = index % 3 == 2
+        img = synthetic_image(rng, size, alpha)
+        if alpha or index % 2:
+            files.append(f"synthetic_{index:03d}.png")
+            img.save(os.path.join(folder, files[-1]))
+        else:
+            files.append(f"synthetic_{index:03d}.jpg")
+            img.save(os.path.join(folder, files[-1]), quality=90)
+    with open(spec_path, "w", encoding="utf-8") as f:
+        json.dump(dict(spec, files=files), f)
+    return [os.path.join(folder, name) for name in files]
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process and its finished children."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_preset(image_paths, preset, engine_options, result_queue):
+    # Runs in a fresh process so peak RSS belongs to this preset only
+    output_folder = tempfile.mkdtemp(prefix="resize_bench_")
+    try:
+        tasks = plan_tasks(image_paths, output_folder, preset)
+        engine = ResizeEngine(**engine_options)
+        summary = engine.run(tasks)
+        source_bytes = sum(os.path.getsize(path) for path in image_paths)
+        elapsed = summary["elapsed"]
+        result_queue.put({
+            "images": summary["resized"],
+            "failed": summary["failed"],
+            "seconds": round(elapsed, 3),
+            "images_per_sec": round(summary["resized"] / elapsed, 3) if elapsed else None,
+            "mb_per_sec": round(source_bytes / (1 << 20) / elapsed, 3) if elapsed else None,
+            "peak_rss_mb": None if peak_rss_bytes() is None else round(peak_rss_bytes() / (1 << 20), 1),
+            "stage_seconds": summary["stage_seconds"],
+            "reducing_gap": summary["reducing_gap"],
+        })
+    except Exception as e:
+        # Report instead of leaving the parent waiting for a result
+        result_queue.put({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+
+def _wait_for_result(process, result_queue):
+    while True:
+        try:
+            return result_queue.get(timeout=RESULT_POLL_SECONDS)
+        except queue.Empty:
+            if not process.is_alive():
+                # Died without reporting (killed, out of memory, crashed interpreter)
+                try:
+                    return result_queue.get(timeout=RESULT_POLL_SECONDS)
+                except queue.Empty:
+                    return {"error": f"benchmark process exited with code {process.exitcode}"}
+
+
+def benchmark(image_paths, presets=None, **engine_options):
+    """
+    Time every preset on the image_paths corpus. Returns {preset: metrics};
+    a preset that failed gets {"error": message} instead.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for preset in presets or PRESET_SCALE_FACTORS:
+        result_queue = context.Queue()
+        process = context.Process(target=_run_preset, args=(image_paths, preset, engine_options, result_queue))
+        process.start()
+        results[preset] = _wait_for_result(process, result_queue)
+        process.join()
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return a list of (preset, baseline images/sec, current images/sec) regressions."""
+    regressions = []
+    for preset, metrics in results.items():
+        reference = baseline.get("results", {}).get(preset)
+        if not reference or not reference.get("images_per_sec") or metrics.get("images_per_sec") is None:
+            continue
+        if metrics["images_per_sec"] < reference["images_per_sec"] * (1 - tolerance):
+            regressions.append((preset, reference["images_per_sec"], metrics["images_per_sec"]))
+    return regressions
+
+
+def print_table(results, baseline=None):
+    header = f"{'Preset':<16}{'img/s':>9}{'MB/s':>9}{'RSS MB':>9}{'decode':>9}{'resize':>9}{'encode':>9}{'vs base':>9}"
+    print(header)
+    print("-" * len(header))
+    for preset, metrics in results.items():
+        if "error" in metrics:
+            print(f"{preset:<16}FAILED: {metrics['error']}")
+            continue
+        stages = metrics["stage_seconds"]
+        change = ""
+        reference = (baseline or {}).get("results", {}).get(preset)
+        if reference and reference.get("images_per_sec") and metrics["images_per_sec"]:
+            change = f"{metrics['images_per_sec'] / reference['images_per_sec'] - 1:+.1%}"
+        rss = "-" if metrics["peak_rss_mb"] is None else f"{metrics['peak_rss_mb']:.0f}"
+        print(f"{preset:<16}{metrics['images_per_sec']:>9.2f}{metrics['mb_per_sec']:>9.2f}{rss:>9}"
+              f"{stages['decode']:>9.2f}{stages['resize']:>9.2f}{stages['encode']:>9.2f}{change:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Resize_Engine presets on a synthetic corpus.")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "resize_bench_corpus"),
+                        help="folder for the generated corpus (reused between runs)")
+    parser.add_argument("--count", type=int, default=None,
+                        help=f"number of corpus images (default: {DEFAULT_CORPUS_SIZE})")
+    parser.add_argument("--quick", action="store_true", help=f"use a {QUICK_CORPUS_SIZE}-image corpus")
+    parser.add_argument("--seed", type=int, default=0, help="corpus random seed")
+    parser.add_argument("--preset", action="append", default=None, help="benchmark only this preset (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--exact", action="store_true", help="benchmark the exact path instead of the fast path")
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="compare against this baseline JSON")
+    parser.add_argument("--save-baseline", default=None, help="save the results as a baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"allowed images/sec drop against the baseline (default: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(argv)
+
+    count = args.count or (QUICK_CORPUS_SIZE if args.quick else DEFAULT_CORPUS_SIZE)
+    presets = None
+    if args.preset:
+        presets = [find_preset(name) for name in args.preset]
+
+    try:
+        image_paths = generate_corpus(args.corpus, count, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Corpus: {len(image_paths)} images in {args.corpus}")
+    results = benchmark(image_paths, presets, workers=args.workers, fast=not args.exact)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    report = {"corpus": {"count": count, "seed": args.seed}, "workers": args.workers,
+              "exact": args.exact, "results": results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for preset, before, after in regressions:
+            print(f"REGRESSION {preset}: {before:.2f} -> {after:.2f} images/sec")
+        if regressions:
+            return 1
+    return 1 if any("error" in metrics for metrics in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1264 @@
+"""
+Parallel resize engine used by QUICK_RESIZE.py.
+
+The work is spread over a ProcessPoolExecutor. Results are yielded in the
+order they finish, and progress can be reported through a queue that a GUI
+polls (QUICK_RESIZE uses root.after for this).
+
+The module never imports tkinter, so it can be used from scripts or run
+headless from the command line:
+
+    python -m Resize_Engine <folder> --preset "2X Downscale" [--workers N] [--recursive]
+    python -m Resize_Engine <folder> --size 800x600
+    python -m Resize_Engine <folder> --preset "2X Downscale" --preset "4X Downscale" --size 256x256
+
+Progress and the final timing summary are printed as JSON lines.
+
+Downscales use a fast path by default: JPEGs are decoded at a reduced DCT
+scale (Image.draft) and the rest of the reduction is done with Image.reduce
+(through resize's reducing_gap) before the final LANCZOS pass. Before a run,
+a few images are resized both ways and the smallest reducing gap whose output
+stays at or above min_psnr against the exact output is used; if none does,
+the run falls back to the exact path. Pass fast=False (--exact) to always get
+the original full-resolution behaviour.
+
+Runs are incremental: the output folder keeps a manifest of what each output
+was made from (source size, mtime and content hash, the preset, the encoder
+settings, the resize path and the output hash), so a rerun only redoes new or
+changed sources and picks up where an interrupted run stopped. Outputs made on
+the fast path are redone when a run uses the exact path or another reducing
+gap. Pass incremental=False (--force) to redo everything.
+
+Several presets/sizes can be produced in one run. Each source is then decoded
+once and all of its outputs are made from that decode, largest first. On the
+fast path smaller outputs are derived from a larger intermediate when it is
+at least CASCADE_MIN_RATIO times the target size on both axes; calibration
+checks those cascaded outputs against min_psnr too. The exact path resizes
+every output from the source.
+
+Encoding is a separate stage: worker processes decode and resize, and the
+resized frames are encoded on a thread pool in this process (Pillow releases
+the GIL while encoding), so encoding overlaps with the next decodes. Encoder
+settings are configurable per format (see ENCODER_DEFAULTS), outputs can be
+converted to PNG, JPEG, WebP or AVIF, and the run summary reports the time
+spent decoding, resizing and encoding.
+
+Memory stays bounded for very large images: with a memory_budget the engine
+estimates each image's decoded and resized size from its header and only
+starts new images while the estimate of everything in flight fits the budget
+(an image bigger than the budget still runs, on its own). PNG outputs above
+tile_threshold pixels (L and RGB sources) are resized in horizontal strips
+and streamed to disk by the worker, so the full output frame is never held in
+memory. Strips match a full-frame resize to within one level. Other outputs
+above tile_threshold pixels are encoded by the worker too, so their frames
+are never copied back to the main process.
+
+ImageIndex reads every image's size, mode and format from its header only,
+for size histograms and for estimating a run's output bytes and time before
+it starts. A size with one side None (CLI: 800x or x600) keeps each image's
+own aspect ratio.
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import hashlib
+import tempfile
+import math
+import itertools
+import argparse
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from PIL import Image, ImageChops, ImageStat, features
+from Folder_Scanner import scan_files
+
+# Check Pillow version for Resampling compatibility
+try:
+    resampling_method = Image.Resampling.LANCZOS
+except AttributeError:
+    # For older Pillow versions
+    resampling_method = Image.LANCZOS
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Map presets to scale factors, in the order the GUI lists them
+PRESET_SCALE_FACTORS = {
+    "2X Downscale": 0.5,
+    "2X Upscale": 2,
+    "3X Downscale": 1/3,
+    "3X Upscale": 3,
+    "4X Downscale": 0.25,
+    "4X Upscale": 4,
+    "1.5X Downscale": 2/3,
+    "1.5X Upscale": 1.5,
+    "5X Downscale": 0.2,
+    "5X Upscale": 5,
+}
+
+# Encoder settings per output format; these match Pillow's own defaults
+ENCODER_DEFAULTS = {
+    "PNG": {"compress_level": 6, "optimize": False},
+    "JPEG": {"quality": 75, "subsampling": "4:2:0", "progressive": False, "optimize": False},
+    "WEBP": {"quality": 80, "method": 4, "lossless": False},
+    "AVIF": {"quality": 75, "speed": 6},
+}
+# File extension written for each output format
+OUTPUT_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp", "AVIF": ".avif"}
+
+# Outputs with more pixels than this are encoded by the worker, L/RGB PNGs in strips
+DEFAULT_TILE_THRESHOLD = 50_000_000
+# Approximate size of one strip of a tiled output
+TILE_STRIP_BYTES = 16 * 1024 * 1024
+# Memory budget QUICK_RESIZE runs with; the CLI only has one with --memory-budget
+DEFAULT_MEMORY_BUDGET = 2 * 1024 ** 3
+# PNG colour type for each mode the strip writer supports
+PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "LA": 4, "RGBA": 6}
+# Modes resized in strips. Pillow resizes alpha modes premultiplied, and
+# un-premultiplying a strip's one-level rounding differences under low alpha
+# turns them into colour errors of many levels, so LA/RGBA stay whole-frame.
+TILE_MODES = ("L", "RGB")
+
+# Reducing gaps tried by the fast path, fastest first. The source is decoded
+# and reduced to at least gap * target size before the final LANCZOS pass;
+# Pillow documents 3.0 as practically identical to a full resize.
+FAST_REDUCING_GAPS = (1.0, 1.5, 2.0, 3.0)
+# Gap used when the fast path runs without a PSNR check
+DEFAULT_REDUCING_GAP = 2.0
+# Minimum PSNR (dB) of the fast path against the exact output
+DEFAULT_MIN_PSNR = 40.0
+# Number of images checked against the exact path before a run
+FAST_PATH_SAMPLE = 3
+# Runs with fewer downscales than this use the exact path
+FAST_PATH_MIN_TASKS = 10
+
+# Tasks read ahead of the pool to calibrate the fast path
+CALIBRATION_LOOKAHEAD = 64
+# Jobs queued per worker process; keeps the pool busy without reading the whole task list
+JOBS_PER_WORKER = 4
+
+# Smaller outputs are resized from a larger output that is at least this many
+# times their size on both axes instead of from the full decode
+CASCADE_MIN_RATIO = 1.5
+
+# Manifest of finished outputs, stored in the output folder
+MANIFEST_NAME = ".resize_manifest.json"
+# Write the manifest after this many finished images so a crash loses little work
+MANIFEST_FLUSH_EVERY = 50
+
+# Rough figures for the pre-run estimate (ImageIndex.estimate): output bytes
+# per pixel by format (per band for PNG), and single-worker seconds per
+# megapixel for decoding and resizing (source pixels) and encoding (output pixels)
+ESTIMATE_BYTES_PER_PIXEL = {"PNG": 0.6, "JPEG": 0.3, "WEBP": 0.2, "AVIF": 0.12}
+ESTIMATE_DECODE_SECONDS = {"PNG": 0.04, "JPEG": 0.01}
+ESTIMATE_RESIZE_SECONDS = 0.03
+ESTIMATE_ENCODE_SECONDS = {"PNG": 0.35, "JPEG": 0.01, "WEBP": 0.16, "AVIF": 0.9}
+
+# Set in each worker process by _init_worker
+_cancel_event = None
+
+
+def _init_worker(cancel_event):
+    global _cancel_event
+    _cancel_event = cancel_event
+
+
+def target_size(source_size, scale_factor=None, size=None):
+    """
+    Output size for a source of source_size. A size with one side set to
+    None keeps each source's own aspect ratio for that side.
+    """
+    if size is not None:
+        width, height = size
+        if width is None:
+            width = max(1, int(height * source_size[0] / source_size[1]))
+        elif height is None:
+            height = max(1, int(width * source_size[1] / source_size[0]))
+        return (width, height)
+    return (int(source_size[0] * scale_factor), int(source_size[1] * scale_factor))
+
+
+def size_label(size):
+    """'800x600' for a fixed size, '800w' or '600h' when the other side follows each image."""
+    width, height = size
+    if height is None:
+        return f"{width}w"
+    if width is None:
+        return f"{height}h"
+    return f"{width}x{height}"
+
+
+def probe_image(image_path):
+    """
+    Read an image's size, mode and format from its header. Image.open does
+    not decode pixels, so this is cheap even for very large files.
+    """
+    with Image.open(image_path) as img:
+        width, height = img.size
+        return {"width": width, "height": height, "mode": img.mode, "format": img.format,
+                "ratio": width / height}
+
+
+def draft_for(img, sizes, reducing_gap=None):
+    """
+    On the fast path, set up a reduced-scale JPEG decode of an opened (not
+    yet loaded) image that still covers every one of sizes on each axis.
+    Only done when all of sizes are downscales.
+    """
+    downscale_only = all(w < img.width and h < img.height for w, h in sizes)
+    if reducing_gap is not None and downscale_only and img.format == "JPEG":
+        # draft() picks the smallest DCT scale that is still >= the requested size
+        img.draft(img.mode, (int(max(w for w, _ in sizes) * reducing_gap),
+                             int(max(h for _, h in sizes) * reducing_gap)))
+
+
+def cascade_base(img, intermediates, new_size, reducing_gap=None):
+    """
+    The image to resize new_size from: on the fast path, the smallest earlier
+    output that is still CASCADE_MIN_RATIO times new_size on both axes; the
+    source otherwise, and always on the exact path.
+    """
+    base = img
+    if reducing_gap is None:
+        return base
+    for candidate in intermediates:
+        if (candidate.width >= new_size[0] * CASCADE_MIN_RATIO
+                and candidate.height >= new_size[1] * CASCADE_MIN_RATIO):
+            base = candidate
+    return base
+
+
+def resize_from(base, new_size, reducing_gap=None):
+    """Resize base to new_size, with Image.reduce doing the bulk of a fast-path downscale."""
+    if reducing_gap is not None and new_size[0] < base.width and new_size[1] < base.height:
+        return base.resize(new_size, resampling_method, reducing_gap=reducing_gap)
+    return base.resize(new_size, resampling_method)
+
+
+def resize_set(image_path, sizes, reducing_gap=None):
+    """
+    Resize image_path to every one of sizes in memory, the way
+    resize_image_multi does: one decode, largest output first, cascading on
+    the fast path. Returns the images in the order of sizes.
+    """
+    with Image.open(image_path) as img:
+        draft_for(img, sizes, reducing_gap)
+        img.load()
+        intermediates = []
+        outputs = [None] * len(sizes)
+        for i in sorted(range(len(sizes)), key=lambda i: sizes[i][0] * sizes[i][1], reverse=True):
+            outputs[i] = resize_from(cascade_base(img, intermediates, sizes[i], reducing_gap), sizes[i], reducing_gap)
+            intermediates.append(outputs[i])
+    return outputs
+
+
+def psnr(first, second):
+    """Peak signal-to-noise ratio in dB between two images of the same size."""
+    if first.mode != second.mode:
+        second = second.convert(first.mode)
+    mse = sum(rms ** 2 for rms in ImageStat.Stat(ImageChops.difference(first, second)).rms)
+    mse /= len(first.getbands())
+    if mse == 0:
+        return math.inf
+    return 10 * math.log10(255 ** 2 / mse)
+
+
+def choose_reducing_gap(sample, min_psnr=DEFAULT_MIN_PSNR):
+    """
+    Pick the fastest reducing gap whose outputs stay at or above min_psnr
+    against the exact path. sample is a list of (image_path, targets), targets
+    being every (scale_factor, size) made from that source, so outputs the
+    fast path cascades from an intermediate are checked as well. Returns
+    (gap, worst_psnr), with gap None if no gap qualifies.
+    """
+    exact_outputs = []
+    for image_path, targets in sample:
+        with Image.open(image_path) as img:
+            sizes = [target_size(img.size, scale_factor, size) for scale_factor, size in targets]
+        exact_outputs.append((image_path, sizes, resize_set(image_path, sizes)))
+
+    worst = None
+    for gap in FAST_REDUCING_GAPS:
+        worst = math.inf
+        for image_path, sizes, exact in exact_outputs:
+            for reference, fast in zip(exact, resize_set(image_path, sizes, gap)):
+                worst = min(worst, psnr(reference, fast))
+            if worst < min_psnr:
+                break
+        if worst >= min_psnr:
+            return gap, worst
+    return None, worst
+
+
+def file_hash(path):
+    """SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def output_format_for(output_path):
+    """Pillow format name for an output path, from its extension."""
+    extension = os.path.splitext(output_path)[1].lower()
+    output_format = Image.registered_extensions().get(extension)
+    if output_format is None:
+        raise ValueError(f"Unsupported output format '{extension}'")
+    return output_format
+
+
+def check_output_format(output_format):
+    """Raise ValueError if Pillow cannot write output_format here."""
+    if output_format not in OUTPUT_EXTENSIONS:
+        raise ValueError(f"Unsupported output format '{output_format}'. Choose from: {', '.join(OUTPUT_EXTENSIONS)}")
+    if output_format in ("WEBP", "AVIF") and not features.check(output_format.lower()):
+        raise ValueError(f"This Pillow build cannot write {output_format} files.")
+
+
+def encoder_settings(output_format, encoder_options=None):
+    """Save keyword arguments for output_format: ENCODER_DEFAULTS plus overrides."""
+    settings = dict(ENCODER_DEFAULTS.get(output_format, {}))
+    settings.update((encoder_options or {}).get(output_format, {}))
+    return settings
+
+
+def encoder_key(encoder_options=None):
+    """Stable description of the encoder overrides, stored in the manifest."""
+    return json.dumps(encoder_options or {}, sort_keys=True)
+
+
+def encode_image(image, output_path, encoder_options=None):
+    """
+    Save image to output_path with the settings for its format, converting
+    the mode when the format needs it. Returns the seconds spent encoding.
+    """
+    start_time = time.perf_counter()
+    output_format = output_format_for(output_path)
+    if output_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+    elif output_format in ("WEBP", "AVIF") and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    image.save(output_path, format=output_format, **encoder_settings(output_format, encoder_options))
+    return time.perf_counter() - start_time
+
+
+def output_record(output_path):
+    """Stat and hash of a written output, for the manifest."""
+    output_stat = os.stat(output_path)
+    return {
+        "output_size": output_stat.st_size,
+        "output_mtime": output_stat.st_mtime_ns,
+        "output_hash": file_hash(output_path),
+    }
+
+
+class PngStripWriter:
+    """
+    Write an 8-bit PNG strip by strip, so the whole frame never has to be in
+    memory. Rows are stored unfiltered, which makes files somewhat larger than
+    the ones Pillow writes.
+    """
+
+    def __init__(self, path, size, mode, compress_level=6):
+        self.width, self.height = size
+        self.bands = len(mode)
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(compress_level)
+        self.file = open(path, "wb")
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, PNG_COLOR_TYPES[mode], 0, 0, 0))
+
+    def _chunk(self, tag, data):
+        self.file.write(struct.pack(">I", len(data)) + tag + data)
+        self.file.write(struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    def write(self, strip):
+        """Append the rows of strip, an image of the full output width."""
+        raw = strip.tobytes()
+        row_bytes = self.width * self.bands
+        # Filter type 0 (None) in front of every row
+        rows = b"".join(b"\x00" + raw[i:i + row_bytes] for i in range(0, len(raw), row_bytes))
+        compressed = self.compressor.compress(rows)
+        if compressed:
+            self._chunk(b"IDAT", compressed)
+        self.rows_written += strip.height
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            if self.rows_written == self.height:
+                self._chunk(b"IDAT", self.compressor.flush())
+                self._chunk(b"IEND", b"")
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def can_tile(img, new_size, output_path, tile_threshold):
+    """True if this output should be resized and written in strips."""
+    return (tile_threshold is not None and new_size[0] * new_size[1] > tile_threshold
+            and img.mode in TILE_MODES and output_format_for(output_path) == "PNG")
+
+
+def write_tiled(img, output_path, new_size, encoder_options=None):
+    """
+    Resize a loaded image to new_size in horizontal strips and stream them
+    into a PNG at output_path. Returns (resize_seconds, encode_seconds).
+    """
+    resize_seconds = encode_seconds = 0.0
+    strip_rows = max(1, TILE_STRIP_BYTES // (new_size[0] * len(img.getbands())))
+    compress_level = encoder_settings("PNG", encoder_options).get("compress_level", 6)
+    scale_y = img.height / new_size[1]
+    with PngStripWriter(output_path, new_size, img.mode, compress_level) as writer:
+        for top in range(0, new_size[1], strip_rows):
+            bottom = min(new_size[1], top + strip_rows)
+            start_time = time.perf_counter()
+            # The box keeps the filter's support across strip edges, so the
+            # strips match a full-frame resize to within one level (rounding)
+            strip = img.resize((new_size[0], bottom - top), resampling_method,
+                               box=(0, top * scale_y, img.width, bottom * scale_y))
+            resize_seconds += time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            writer.write(strip)
+            encode_seconds += time.perf_counter() - start_time
+    return resize_seconds, encode_seconds
+
+
+def resize_image_multi(image_path, targets, reducing_gap=None, hash_files=False, encode=True, encoder_options=None,
+                       tile_threshold=DEFAULT_TILE_THRESHOLD):
+    """
+    Decode image_path once and produce every (output_path, scale_factor, size)
+    in targets. Outputs are made largest first. With a reducing_gap (the fast
+    path) a smaller output is resized from the smallest earlier output that
+    is still CASCADE_MIN_RATIO times its size; otherwise every output comes
+    from the decoded source.
+
+    Returns a job dict with "decode_seconds" and one "outputs" entry per
+    target (in target order) holding "output", "size" and "resize_seconds".
+    With encode=True outputs are saved here and carry "encode_seconds";
+    otherwise each carries the resized "image" for the caller to encode.
+    Outputs above tile_threshold pixels are always saved here: L and RGB
+    PNGs in strips (see write_tiled), the rest whole, so large frames are
+    not sent back to the caller.
+    With hash_files=True the job also carries the source stat and hash.
+    Returns None if the run was cancelled before this image started.
+    """
+    if _cancel_event is not None and _cancel_event.is_set():
+        return None
+
+    source_stat = os.stat(image_path)
+    start_time = time.perf_counter()
+    with Image.open(image_path) as img:
+        sizes = [target_size(img.size, scale_factor, size) for _, scale_factor, size in targets]
+        draft_for(img, sizes, reducing_gap)
+        img.load()
+        job = {"source": image_path, "decode_seconds": time.perf_counter() - start_time}
+
+        order = sorted(range(len(targets)), key=lambda i: sizes[i][0] * sizes[i][1], reverse=True)
+        intermediates = []
+        outputs = [None] * len(targets)
+        for i in order:
+            output_path = targets[i][0]
+            new_size = sizes[i]
+            if can_tile(img, new_size, output_path, tile_threshold):
+                resize_seconds, encode_seconds = write_tiled(img, output_path, new_size, encoder_options)
+                outputs[i] = {"output": output_path, "size": new_size,
+                              "resize_seconds": resize_seconds, "encode_seconds": encode_seconds}
+                if hash_files:
+                    outputs[i].update(output_record(output_path))
+                continue
+
+            start_time = time.perf_counter()
+            resized_img = resize_from(cascade_base(img, intermediates, new_size, reducing_gap), new_size, reducing_gap)
+            if reducing_gap is not None:
+                # Kept for cascading; the exact path always resizes from the source
+                intermediates.append(resized_img)
+            outputs[i] = {"output": output_path, "size": new_size,
+                          "resize_seconds": time.perf_counter() - start_time}
+            if encode or (tile_threshold is not None and new_size[0] * new_size[1] > tile_threshold):
+                outputs[i]["encode_seconds"] = encode_image(resized_img, output_path, encoder_options)
+                if hash_files:
+                    outputs[i].update(output_record(output_path))
+            else:
+                outputs[i]["image"] = resized_img
+        job["outputs"] = outputs
+
+    if hash_files:
+        job.update({
+            "source_size": source_stat.st_size,
+            "source_mtime": source_stat.st_mtime_ns,
+            "source_hash": file_hash(image_path),
+        })
+    return job
+
+
+def resize_image(image_path, output_path, scale_factor=None, size=None, reducing_gap=None, encoder_options=None):
+    """
+    Resize a single image and save it to output_path.
+    Either scale_factor or an explicit (width, height) size must be given.
+    Returns None if the run was cancelled before this image started.
+    """
+    job = resize_image_multi(image_path, [(output_path, scale_factor, size)], reducing_gap,
+                             encoder_options=encoder_options)
+    if job is None:
+        return None
+    return {"source": image_path, "output": output_path, "size": job["outputs"][0]["size"]}
+
+
+def preset_key(scale_factor=None, size=None):
+    """Stable description of a resize target, stored in the manifest."""
+    if size is not None:
+        return f"size={size_label(size)}"
+    return f"scale={scale_factor:.6g}"
+
+
+def resize_path_key(reducing_gap=None):
+    """Stable description of the resize path (exact, or fast with its gap), stored in the manifest."""
+    if reducing_gap is None:
+        return "exact"
+    return f"fast:reducing_gap={reducing_gap:.6g}"
+
+
+class ResizeManifest:
+    """
+    Record of finished outputs, kept as JSON in <output_folder>/.resize_manifest.json.
+
+    Entries are keyed by output path relative to the output folder. The file
+    is always replaced atomically, so an interrupted run leaves either the
+    previous manifest or the new one, never a partial file.
+    """
+
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.entries = {}
+        self._unsaved = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def _key(self, output_path):
+        return os.path.relpath(output_path, self.output_folder).replace(os.sep, "/")
+
+    def is_current(self, task, encoder="", path="exact"):
+        """
+        True if task's output exists and was made from the current source and
+        settings. An output made on the exact path is current for any path; a
+        fast-path output only for the same path (see resize_path_key).
+        """
+        image_path, output_path, scale_factor, size = task
+        entry = self.entries.get(self._key(output_path))
+        if entry is None or entry.get("preset") != preset_key(scale_factor, size):
+            return False
+        if entry.get("encoder", "") != encoder:
+            return False
+        if entry.get("path") not in ("exact", path):
+            return False
+
+        try:
+            source_stat = os.stat(image_path)
+            output_stat = os.stat(output_path)
+        except OSError:
+            return False
+        if (output_stat.st_size, output_stat.st_mtime_ns) != (entry["output_size"], entry["output_mtime"]):
+            return False
+        if source_stat.st_size != entry["source_size"]:
+            return False
+        if source_stat.st_mtime_ns != entry["source_mtime"]:
+            # Touched but possibly unchanged; the content hash decides
+            if file_hash(image_path) != entry["source_hash"]:
+                return False
+            entry["source_mtime"] = source_stat.st_mtime_ns
+            self._unsaved += 1
+        return True
+
+    def record(self, task, result, encoder="", path="exact"):
+        """Store the result of a finished task, made on the given resize path."""
+        self.entries[self._key(task[1])] = {
+            "source": os.path.abspath(task[0]),
+            "source_size": result["source_size"],
+            "source_mtime": result["source_mtime"],
+            "source_hash": result["source_hash"],
+            "preset": preset_key(task[2], task[3]),
+            "encoder": encoder,
+            "path": path,
+            "output_size": result["output_size"],
+            "output_mtime": result["output_mtime"],
+            "output_hash": result["output_hash"],
+        }
+        self._mark_changed()
+
+    def forget(self, task):
+        """Drop the entry for a task whose output is no longer valid."""
+        if self.entries.pop(self._key(task[1]), None) is not None:
+            self._mark_changed()
+
+    def _mark_changed(self):
+        self._unsaved += 1
+        if self._unsaved >= MANIFEST_FLUSH_EVERY:
+            self.save()
+
+    def save(self):
+        """Write the manifest atomically (temp file + os.replace)."""
+        if not self._unsaved and os.path.exists(self.path):
+            return
+        os.makedirs(self.output_folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=MANIFEST_NAME, suffix=".tmp", dir=self.output_folder)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": self.entries}, f, indent=1, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, 0o644)  # mkstemp files are private to the owner
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._unsaved = 0
+
+
+class ResizeEngine:
+    """
+    Runs resize tasks on a pool of worker processes.
+
+    A task is a tuple of (image_path, output_path, scale_factor, size).
+    Failures are collected in self.failures instead of stopping the batch.
+    With fast=True downscales use the draft/reduce fast path, calibrated so a
+    sample of the run stays at or above min_psnr against the exact output.
+    Tasks that share a source image are handed to one worker together so the
+    source is decoded once.
+    Resized frames come back to this process and are encoded on a pool of
+    encode_workers threads with encoder_options ({"PNG": {"compress_level": 1}, ...}).
+    With a memory_budget (bytes), new images only start while the estimated
+    decoded and resized size of everything in flight fits the budget. Outputs
+    above tile_threshold pixels are written by the worker (L and RGB PNGs in
+    strips) instead of being sent back.
+    With ResizeManifests (one per output folder), tasks whose output is up to
+    date are skipped and finished tasks are recorded as they complete.
+    """
+
+    def __init__(self, workers=None, fast=True, min_psnr=DEFAULT_MIN_PSNR, manifests=None,
+                 encode_workers=None, encoder_options=None, memory_budget=None,
+                 tile_threshold=DEFAULT_TILE_THRESHOLD):
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_budget = memory_budget
+        self.tile_threshold = tile_threshold
+        self.bytes_in_flight = 0
+        self.peak_bytes_in_flight = 0
+        self.encode_workers = encode_workers or self.workers
+        self.encoder_options = encoder_options or {}
+        self.encoder_key = encoder_key(encoder_options)
+        self.fast = fast
+        self.min_psnr = min_psnr
+        self.reducing_gap = DEFAULT_REDUCING_GAP if fast else None
+        self.fast_psnr = None
+        self.manifests = list(manifests or [])
+        self.skipped = 0
+        self.results = []
+        self.failures = []
+        self.stage_seconds = {"decode": 0.0, "resize": 0.0, "encode": 0.0}
+        self.summary = None
+        self._cancel_event = multiprocessing.Event()
+
+    def cancel(self):
+        """Stop handing out new images; workers finish the image they are on."""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def calibrate(self, tasks):
+        """Choose the reducing gap for this run from its first few downscale tasks."""
+        if not self.fast or self.min_psnr is None:
+            return
+        downscales = [task for task in tasks if task[3] is not None or task[2] < 1]
+        # Small runs are not worth checking; use the exact path
+        if len(downscales) < FAST_PATH_MIN_TASKS:
+            self.reducing_gap = None
+            return
+        sources = []
+        for task in downscales:
+            if task[0] not in sources:
+                sources.append(task[0])
+        sources = [path for path in sources[:FAST_PATH_SAMPLE * 2] if self._readable(path)][:FAST_PATH_SAMPLE]
+        # Every output of a sampled source, so cascaded outputs are checked too
+        sample = [(path, [(task[2], task[3]) for task in tasks if task[0] == path]) for path in sources]
+        if sample:
+            self.reducing_gap, self.fast_psnr = choose_reducing_gap(sample, self.min_psnr)
+
+    def _manifest_for(self, task):
+        output_path = os.path.abspath(task[1])
+        for manifest in self.manifests:
+            if output_path.startswith(os.path.abspath(manifest.output_folder) + os.sep):
+                return manifest
+        return None
+
+    @staticmethod
+    def _readable(image_path):
+        # Unreadable files are reported by the run itself, not by calibration
+        try:
+            with Image.open(image_path):
+                return True
+        except Exception:
+            return False
+
+    def _pending_tasks(self, tasks):
+        """Yield the tasks whose output is not up to date, counting the rest in self.skipped."""
+        path = resize_path_key(self.reducing_gap)
+        for task in tasks:
+            manifest = self._manifest_for(task)
+            if manifest is not None and manifest.is_current(task, self.encoder_key, path):
+                self.skipped += 1
+                continue
+            yield task
+
+    @staticmethod
+    def _iter_jobs(tasks):
+        # Consecutive tasks with the same source become one job, decoded once
+        for _, job_tasks in itertools.groupby(tasks, key=lambda task: task[0]):
+            yield list(job_tasks)
+
+    def estimate_bytes(self, job_tasks):
+        """
+        Estimate the memory one job needs: the decoded source plus every
+        resized output held until it is encoded (strips for tiled outputs).
+        Only the image header is read.
+        """
+        try:
+            with Image.open(job_tasks[0][0]) as img:
+                width, height = img.size
+                # Pillow keeps every multi-band pixel (RGB included) in 4 bytes
+                pixel_bytes = 4 if len(img.getbands()) > 1 or img.mode in ("I", "F") else 1
+                tileable = img.mode in TILE_MODES
+        except Exception:
+            return 0  # The worker will report the failure
+        needed = width * height * pixel_bytes
+        for _, output_path, scale_factor, size in job_tasks:
+            new_width, new_height = target_size((width, height), scale_factor, size)
+            output_bytes = new_width * new_height * pixel_bytes
+            if (tileable and self.tile_threshold is not None and new_width * new_height > self.tile_threshold
+                    and os.path.splitext(output_path)[1].lower() == ".png"):
+                output_bytes = min(output_bytes, 2 * TILE_STRIP_BYTES)
+            needed += output_bytes
+        return needed
+
+    def _release(self, budget):
+        # Called once per finished output; frees the job's bytes after its last one
+        budget["remaining"] -= 1
+        if budget["remaining"] <= 0:
+            self.bytes_in_flight -= budget["bytes"]
+
+    def _finish_output(self, job, task, output, hash_files):
+        self.stage_seconds["encode"] += output["encode_seconds"]
+        result = {"source": task[0], "output": output["output"], "size": output["size"]}
+        if hash_files:
+            result.update(output)
+            result.update((key, job[key]) for key in ("source_size", "source_mtime", "source_hash"))
+            manifest = self._manifest_for(task)
+            if manifest is not None:
+                manifest.record(task, result, self.encoder_key, resize_path_key(self.reducing_gap))
+        self.results.append(result)
+        return result
+
+    def _encode(self, job, output, hash_files):
+        # Runs on the encode thread pool
+        output["encode_seconds"] = encode_image(output.pop("image"), output["output"], self.encoder_options)
+        if hash_files:
+            output.update(output_record(output["output"]))
+        return output
+
+    def _fail(self, path, error, tasks, progress_queue):
+        self.failures.append((path, str(error)))
+        if progress_queue is not None:
+            progress_queue.put(("error", path, str(error)))
+        for task in tasks:
+            manifest = self._manifest_for(task)
+            if manifest is not None:
+                manifest.forget(task)
+
+    def iter_resize(self, tasks, progress_queue=None):
+        """
+        Resize every task and yield result dicts in completion order.
+
+        tasks may be any iterable, including a generator fed by a folder scan;
+        it is consumed lazily, keeping only a few jobs per worker in flight.
+        Tasks for the same source should be adjacent so they share a decode.
+
+        When progress_queue is given it receives ("progress", done, total, path)
+        and ("error", path, message) tuples while running, and a final
+        ("finished", summary) tuple. total is None until the tasks run out,
+        unless tasks has a length.
+        """
+        start_time = time.perf_counter()
+        total = len(tasks) if hasattr(tasks, "__len__") else None
+        tasks = iter(tasks)
+        # Calibrate before the manifest check, since the chosen path decides which
+        # outputs are current; sampling the leading tasks whether or not they are
+        # done keeps the choice the same from one run to the next
+        head = list(itertools.islice(tasks, CALIBRATION_LOOKAHEAD))
+        self.calibrate(head)
+        jobs = self._iter_jobs(self._pending_tasks(itertools.chain(head, tasks)))
+
+        hash_files = bool(self.manifests)
+        max_in_flight = self.workers * JOBS_PER_WORKER
+        resizing = {}   # process future -> (job tasks, budget)
+        encoding = {}   # thread future -> (job, task, budget)
+        next_job = None
+        next_bytes = 0
+        submitted = 0
+        finished = 0
+        exhausted = False
+
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(self._cancel_event,))
+        encoder = ThreadPoolExecutor(max_workers=self.encode_workers)
+        try:
+            while True:
+                # Frames waiting to be encoded count against the limit too, so a
+                # slow encoder holds back decoding instead of piling up frames
+                while (not exhausted and not self.cancelled
+                       and len(resizing) + len(encoding) < max_in_flight):
+                    if next_job is None:
+                        next_job = next(jobs, None)
+                        if next_job is None:
+                            exhausted = True
+                            total = submitted + self.skipped
+                            break
+                        next_bytes = self.estimate_bytes(next_job) if self.memory_budget else 0
+                    if (self.memory_budget and (resizing or encoding)
+                            and self.bytes_in_flight + next_bytes > self.memory_budget):
+                        break  # Wait for memory; an image over budget still runs on its own
+                    future = executor.submit(resize_image_multi, next_job[0][0], [task[1:] for task in next_job],
+                                             reducing_gap=self.reducing_gap, hash_files=hash_files, encode=False,
+                                             encoder_options=self.encoder_options,
+                                             tile_threshold=self.tile_threshold)
+                    resizing[future] = (next_job, {"bytes": next_bytes, "remaining": len(next_job)})
+                    self.bytes_in_flight += next_bytes
+                    self.peak_bytes_in_flight = max(self.peak_bytes_in_flight, self.bytes_in_flight)
+                    submitted += len(next_job)
+                    next_job = None
+                if not resizing and not encoding:
+                    break
+
+                completed, _ = wait(list(resizing) + list(encoding), return_when=FIRST_COMPLETED)
+                for future in completed:
+                    if future in resizing:
+                        job_tasks, budget = resizing.pop(future)
+                        image_path = job_tasks[0][0]
+                        if future.cancelled():
+                            self.bytes_in_flight -= budget["bytes"]
+                            continue
+                        try:
+                            job = future.result()
+                        except Exception as e:
+                            self.bytes_in_flight -= budget["bytes"]
+                            self._fail(image_path, e, job_tasks, progress_queue)
+                            finished += len(job_tasks)
+                            if progress_queue is not None:
+                                progress_queue.put(("progress", finished + self.skipped, total, image_path))
+                            continue
+                        if job is None:
+                            self.bytes_in_flight -= budget["bytes"]
+                            continue
+                        self.stage_seconds["decode"] += job["decode_seconds"]
+                        for task, output in zip(job_tasks, job["outputs"]):
+                            self.stage_seconds["resize"] += output["resize_seconds"]
+                            if "image" in output:
+                                encoding[encoder.submit(self._encode, job, output, hash_files)] = (job, task, budget)
+                                continue
+                            # Written by the worker already (tiled or large output)
+                            self._release(budget)
+                            finished += 1
+                            if progress_queue is not None:
+                                progress_queue.put(("progress", finished + self.skipped, total, task[0]))
+                            yield self._finish_output(job, task, output, hash_files)
+                        continue
+
+                    job, task, budget = encoding.pop(future)
+                    self._release(budget)
+                    finished += 1
+                    try:
+                        output = future.result()
+                    except Exception as e:
+                        self._fail(task[1], e, [task], progress_queue)
+                        output = None
+                    if progress_queue is not None:
+                        progress_queue.put(("progress", finished + self.skipped, total, task[0]))
+                    if output is not None:
+                        yield self._finish_output(job, task, output, hash_files)
+
+                if self.cancelled:
+                    # Drop everything that has not started yet
+                    for future in resizing:
+                        future.cancel()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            encoder.shutdown(wait=True)
+            for manifest in self.manifests:
+                manifest.save()
+
+        self.summary = {
+            "total": finished + self.skipped,
+            "resized": len(self.results),
+            "skipped": self.skipped,
+            "failed": len(self.failures),
+            "cancelled": self.cancelled,
+            "reducing_gap": self.reducing_gap,
+            "fast_psnr": None if self.fast_psnr in (None, math.inf) else round(self.fast_psnr, 2),
+            "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+            "stage_share": self.stage_share(),
+            "peak_bytes_in_flight": self.peak_bytes_in_flight if self.memory_budget else None,
+            "elapsed": time.perf_counter() - start_time,
+        }
+        if progress_queue is not None:
+            progress_queue.put(("finished", self.summary))
+
+    def stage_share(self):
+        """Fraction of the decode + resize + encode time spent in each stage."""
+        busy = sum(self.stage_seconds.values())
+        return {stage: round(seconds / busy, 3) if busy else 0.0 for stage, seconds in self.stage_seconds.items()}
+
+    def run(self, tasks, progress_queue=None):
+        """Resize every task and return the run summary."""
+        for _ in self.iter_resize(tasks, progress_queue):
+            pass
+        return self.summary
+
+
+def find_preset(name):
+    """Return the preset matching name, ignoring case and '_' versus ' '."""
+    wanted = name.replace('_', ' ').strip().lower()
+    for preset_name in PRESET_SCALE_FACTORS:
+        if preset_name.lower() == wanted:
+            return preset_name
+    raise ValueError(f"Unknown preset '{name}'. Choose from: {', '.join(PRESET_SCALE_FACTORS)}")
+
+
+def output_folder_name(preset=None, size=None):
+    """Name of the output folder for a preset or an explicit (width, height)."""
+    if size is not None:
+        return f"Resized_{size_label(size)}"
+    return f"Resized_{preset.replace(' ', '_')}"
+
+
+def list_images(folder, recursive=False):
+    """Lazily yield the image files in folder, optionally including subfolders."""
+    # Never pick up the output of an earlier run
+    return scan_files(folder, IMAGE_EXTENSIONS, recursive=recursive, exclude=["Resized_*"])
+
+
+class ImageIndex:
+    """
+    Header-only index of a set of images: size, mode, format and aspect ratio
+    per path (see probe_image). No pixels are decoded, so build() can run on
+    a background thread while a GUI reads entries, done and finished.
+    """
+
+    def __init__(self, image_paths):
+        self.image_paths = list(image_paths)
+        self.entries = {}
+        self.failures = []
+        self.done = 0
+        self.finished = False
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def build(self):
+        """Probe every image; stops early if stop() is called."""
+        for image_path in self.image_paths:
+            if self._stop_event.is_set():
+                break
+            try:
+                info = probe_image(image_path)
+            except Exception as e:
+                with self._lock:
+                    self.failures.append((image_path, str(e)))
+            else:
+                with self._lock:
+                    self.entries[image_path] = info
+            self.done += 1
+        self.finished = True
+
+    def stop(self):
+        self._stop_event.set()
+
+    def infos(self):
+        """Snapshot of the entries read so far."""
+        with self._lock:
+            return list(self.entries.values())
+
+    def histogram(self, limit=None):
+        """[((width, height), count), ...], most common sizes first."""
+        return Counter((info["width"], info["height"]) for info in self.infos()).most_common(limit)
+
+    def estimate(self, scale_factor=None, size=None, output_format=None, workers=1):
+        """
+        Rough (output bytes, seconds) for resizing the indexed images with a
+        scale factor or size (see target_size). Outputs keep the source
+        format unless output_format is given; the time assumes the work
+        spreads evenly over workers.
+        """
+        total_bytes = 0
+        total_seconds = 0.0
+        for info in self.infos():
+            width, height = target_size((info["width"], info["height"]), scale_factor, size)
+            output_pixels = width * height
+            fmt = output_format or (info["format"] if info["format"] in ESTIMATE_BYTES_PER_PIXEL else "PNG")
+            bytes_per_pixel = ESTIMATE_BYTES_PER_PIXEL[fmt]
+            if fmt == "PNG":
+                bytes_per_pixel *= Image.getmodebands(info["mode"]) if info["mode"] in PNG_COLOR_TYPES else 3
+            total_bytes += int(output_pixels * bytes_per_pixel)
+
+            source_megapixels = info["width"] * info["height"] / 1e6
+            total_seconds += source_megapixels * (ESTIMATE_DECODE_SECONDS.get(info["format"], ESTIMATE_DECODE_SECONDS["PNG"])
+                                                  + ESTIMATE_RESIZE_SECONDS)
+            total_seconds += output_pixels / 1e6 * ESTIMATE_ENCODE_SECONDS[fmt]
+        return total_bytes, total_seconds / max(1, workers)
+
+
+def iter_tasks(image_paths, output_folders, targets, src_root=None, output_format=None):
+    """
+    Lazily build engine tasks: for each image, one task per (preset, size)
+    target in targets, written below the matching output folder. Files keep
+    their path relative to src_root, so recursive runs mirror the source tree.
+    With an output_format ("PNG", "JPEG", "WEBP", "AVIF") the extension is
+    changed to match; otherwise outputs keep the source format.
+    """
+    if output_format is not None:
+        check_output_format(output_format)
+    scale_factors = []
+    for preset, size in targets:
+        if size is None and preset is None:
+            raise ValueError("Either a preset or a size is required.")
+        scale_factors.append(None if size is not None else PRESET_SCALE_FACTORS[find_preset(preset)])
+
+    for image_path in image_paths:
+        if src_root is not None:
+            relative_path = os.path.relpath(image_path, src_root)
+        else:
+            relative_path = os.path.basename(image_path)
+        if output_format is not None:
+            relative_path = os.path.splitext(relative_path)[0] + OUTPUT_EXTENSIONS[output_format]
+        for output_folder, scale_factor, (_, size) in zip(output_folders, scale_factors, targets):
+            yield (image_path, os.path.join(output_folder, relative_path), scale_factor, size)
+
+
+def plan_tasks(image_paths, output_folder, preset=None, size=None, src_root=None, output_format=None):
+    """Build the engine tasks for image_paths and a single preset or size."""
+    return list(iter_tasks(image_paths, [output_folder], [(preset, size)], src_root, output_format))
+
+
+def normalize_target(target):
+    """
+    Turn a preset name or a (width, height) pair into (preset, size).
+    One side of the pair may be None to keep each image's aspect ratio.
+    """
+    if isinstance(target, str):
+        return find_preset(target), None
+    size = tuple(None if v is None else int(v) for v in target)
+    if len(size) != 2 or size == (None, None) or any(v is not None and v <= 0 for v in size):
+        raise ValueError("Width and Height must be positive integers.")
+    return None, size
+
+
+def resize_folder_multi(src, targets, workers=None, recursive=False, output_root=None,
+                        progress_queue=None, incremental=True, output_format=None, **engine_options):
+    """
+    Resize every image in src to several targets (preset names or
+    (width, height) pairs) in one run, decoding each source only once.
+
+    Each target gets its own output_root/Resized_<target> folder and
+    manifest; output_root defaults to src. Other keyword arguments
+    (fast, min_psnr, encode_workers, encoder_options) go to ResizeEngine.
+    Returns the finished ResizeEngine.
+    """
+    targets = [normalize_target(target) for target in targets]
+    if not targets:
+        raise ValueError("At least one preset or size is required.")
+    if output_root is None:
+        output_root = src
+    output_folders = [os.path.join(output_root, output_folder_name(preset, size)) for preset, size in targets]
+    return _resize_folders(src, targets, output_folders, recursive, progress_queue, incremental,
+                           output_format, workers=workers, **engine_options)
+
+
+def resize_folder(src, preset=None, size=None, workers=None, recursive=False,
+                  output_folder=None, progress_queue=None, incremental=True, output_format=None,
+                  **engine_options):
+    """
+    Resize every image in src with a preset name or an explicit (width, height).
+
+    Output goes to src/Resized_<preset> unless output_folder is given.
+    With incremental=True, outputs recorded as up to date in the folder's
+    manifest are skipped. output_format converts the outputs, and other
+    keyword arguments (fast, min_psnr, encode_workers, encoder_options) go
+    to ResizeEngine.
+    Returns the finished ResizeEngine; its summary, results and failures
+    describe the run.
+    """
+    target = normalize_target(size if size is not None else preset)
+    if output_folder is None:
+        output_folder = os.path.join(src, output_folder_name(*target))
+    return _resize_folders(src, [target], [output_folder], recursive, progress_queue, incremental,
+                           output_format, workers=workers, **engine_options)
+
+
+def _resize_folders(src, targets, output_folders, recursive, progress_queue, incremental,
+                    output_format, **engine_options):
+    for output_folder in output_folders:
+        os.makedirs(output_folder, exist_ok=True)
+    task_iter = iter_tasks(list_images(src, recursive), output_folders, targets,
+                           src_root=src, output_format=output_format)
+
+    def tasks():
+        # Stream tasks straight from the folder scan; subfolders are created as they show up
+        created = set(output_folders)
+        for task in task_iter:
+            output_dir = os.path.dirname(task[1])
+            if output_dir not in created:
+                os.makedirs(output_dir, exist_ok=True)
+                created.add(output_dir)
+            yield task
+
+    manifests = [ResizeManifest(output_folder) for output_folder in output_folders] if incremental else None
+    engine = ResizeEngine(manifests=manifests, **engine_options)
+    engine.run(tasks(), progress_queue)
+    return engine
+
+
+class _JsonLinesReporter:
+    """Queue stand-in that prints engine messages as JSON lines."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def put(self, message):
+        if message[0] == "progress":
+            record = {"event": "progress", "done": message[1], "total": message[2], "path": message[3]}
+        elif message[0] == "error":
+            record = {"event": "error", "path": message[1], "error": message[2]}
+        else:
+            record = dict({"event": "finished"}, **message[1])
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+
+def parse_size(text):
+    """Parse a WIDTHxHEIGHT string; WIDTHx or xHEIGHT keeps each image's aspect ratio."""
+    try:
+        width, height = (int(v) if v else None for v in text.lower().split("x"))
+        if width is None and height is None:
+            raise ValueError
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, WIDTHx or xHEIGHT, got '{text}'")
+    return width, height
+
+
+def parse_bytes(text):
+    """Parse a byte count such as 512M, 4G or 1000000."""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    text = text.strip().upper().rstrip("B")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a size such as 512M or 4G, got '{text}'")
+
+
+def encoder_options_from_args(args):
+    """Collect the encoder flags that were given into an encoder_options dict."""
+    flags = {
+        "PNG": {"compress_level": args.png_compress_level, "optimize": args.png_optimize or None},
+        "JPEG": {"quality": args.jpeg_quality, "subsampling": args.jpeg_subsampling,
+                 "progressive": args.progressive or None, "optimize": args.jpeg_optimize or None},
+        "WEBP": {"quality": args.webp_quality, "lossless": args.webp_lossless or None},
+        "AVIF": {"quality": args.avif_quality},
+    }
+    encoder_options = {}
+    for output_format, settings in flags.items():
+        settings = {key: value for key, value in settings.items() if value is not None}
+        if settings:
+            encoder_options[output_format] = settings
+    return encoder_options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Resize_Engine",
+                                     description="Batch resize a folder of images without the GUI.")
+    parser.add_argument("src", help="folder with the source images")
+    parser.add_argument("--preset", action="append", default=[],
+                        help=f"one of: {', '.join(PRESET_SCALE_FACTORS)}; repeat for several outputs")
+    parser.add_argument("--size", action="append", default=[], type=parse_size,
+                        help="explicit output size, e.g. 800x600, or 800x / x600 to keep each image's "
+                             "aspect ratio; repeat for several outputs")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--recursive", action="store_true", help="include images in subfolders")
+    parser.add_argument("--output", default=None,
+                        help="output folder (default: <src>/Resized_<preset>); with several "
+                             "presets/sizes, the folder that receives one Resized_* folder each")
+    parser.add_argument("--exact", action="store_true",
+                        help="disable the draft/reduce fast path and decode at full resolution")
+    parser.add_argument("--min-psnr", type=float, default=DEFAULT_MIN_PSNR,
+                        help=f"minimum PSNR of the fast path against the exact output (default: {DEFAULT_MIN_PSNR})")
+    parser.add_argument("--force", action="store_true",
+                        help="resize everything, ignoring outputs recorded as up to date")
+
+    parser.add_argument("--memory-budget", type=parse_bytes, default=None,
+                        help="cap the estimated memory of images in flight, e.g. 4G or 512M")
+    parser.add_argument("--tile-threshold", type=float, default=DEFAULT_TILE_THRESHOLD / 1e6,
+                        help="encode outputs above this many megapixels in the worker, L/RGB PNGs in strips "
+                             f"(default: {DEFAULT_TILE_THRESHOLD / 1e6:g}; 0 disables)")
+
+    encoding = parser.add_argument_group("encoding")
+    encoding.add_argument("--format", choices=[f.lower() for f in OUTPUT_EXTENSIONS], default=None,
+                          help="convert outputs to this format (default: keep the source format)")
+    encoding.add_argument("--encode-workers", type=int, default=None,
+                          help="encoder threads (default: same as --workers)")
+    encoding.add_argument("--png-compress-level", type=int, choices=range(10), metavar="0-9",
+                          help="PNG zlib level; 1 is much faster than the default 6")
+    encoding.add_argument("--png-optimize", action="store_true", help="extra PNG size optimisation (slow)")
+    encoding.add_argument("--jpeg-quality", type=int, help="JPEG quality 1-95")
+    encoding.add_argument("--jpeg-subsampling", choices=["4:4:4", "4:2:2", "4:2:0"], help="JPEG chroma subsampling")
+    encoding.add_argument("--progressive", action="store_true", help="write progressive JPEGs")
+    encoding.add_argument("--jpeg-optimize", action="store_true", help="optimise JPEG Huffman tables")
+    encoding.add_argument("--webp-quality", type=int, help="WebP quality 0-100")
+    encoding.add_argument("--webp-lossless", action="store_true", help="write lossless WebP")
+    encoding.add_argument("--avif-quality", type=int, help="AVIF quality 0-100")
+    args = parser.parse_args(argv)
+    targets = args.preset + args.size
+    if not targets:
+        parser.error("at least one --preset or --size is required")
+
+    options = dict(workers=args.workers, recursive=args.recursive, progress_queue=_JsonLinesReporter(sys.stdout),
+                   fast=not args.exact, min_psnr=args.min_psnr, incremental=not args.force,
+                   output_format=args.format.upper() if args.format else None,
+                   encode_workers=args.encode_workers, encoder_options=encoder_options_from_args(args),
+                   memory_budget=args.memory_budget,
+                   tile_threshold=int(args.tile_threshold * 1e6) if args.tile_threshold > 0 else None)
+    try:
+        if len(targets) == 1:
+            preset, size = normalize_target(targets[0])
+            engine = resize_folder(args.src, preset=preset, size=size, output_folder=args.output, **options)
+        else:
+            engine = resize_folder_multi(args.src, targets, output_root=args.output, **options)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    return 1 if engine.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
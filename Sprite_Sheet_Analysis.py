@@ -0,0 +1,499 @@
+"""
+Sprite sheet analysis for Sprite_Sheet_Extractor3.py.
+
+detect_grid() finds the tile grid of a sheet. Each axis is reduced to a 1-D
+profile (mean alpha; for opaque sheets, the share of pixels that differ from
+a solid background colour, or edge energy when there is none), and
+every tile size that divides the image dimension is scored by harmonic
+voting over the profile's autocorrelation: a true period p correlates at
+p, 2p, 3p..., while half a period or an unrelated size does not. The
+smallest size that scores nearly as well as the best wins, so harmonics of
+the real tile size are not picked. Each axis gets a confidence in [0, 1].
+
+Only a sample of the rows (or columns) goes into each profile, so very wide
+atlases cost about as much as small ones.
+
+find_sprites() handles irregularly packed atlases: it labels connected
+sprite pixels (alpha, or not the background colour) with scipy.ndimage when
+installed, otherwise with a vectorised run-length labeling, optionally
+merging islands within a gap, and atlas_descriptor() describes the result in
+TexturePacker's JSON (Hash) layout.
+
+Run the module to score the detector on a labelled synthetic corpus:
+
+    python Sprite_Sheet_Analysis.py [--count 300] [--seed 0]
+"""
+import sys
+import time
+import argparse
+import numpy as np
+
+try:
+    from scipy import ndimage
+except ImportError:
+    # Optional; the run-length labeling below is used without it
+    ndimage = None
+
+# Rows/columns sampled across the other axis when building a profile
+PROFILE_SAMPLES = 256
+# Pixels with alpha below this count as transparent
+ALPHA_THRESHOLD = 16
+# Alpha is used when the transparent share of the sheet lies in this range
+USEFUL_ALPHA_RANGE = (0.005, 0.995)
+# Without alpha, a colour covering this share of the sheet is taken as the
+# background, and pixels further than BACKGROUND_TOLERANCE from it as sprite
+USEFUL_BACKGROUND_RANGE = (0.05, 0.995)
+BACKGROUND_TOLERANCE = 24
+# Smallest tile size and largest tile count considered per axis
+MIN_TILE_SIZE = 4
+MAX_TILES = 256
+# A smaller period is preferred when it scores at least this share of the best
+HARMONIC_TOLERANCE = 0.7
+# Below this harmonic score the axis is treated as a single tile
+MIN_PERIOD_SCORE = 0.2
+
+
+def _sample(array):
+    # Strided subsample of at most PROFILE_SAMPLES x PROFILE_SAMPLES pixels
+    return array[::max(1, array.shape[0] // PROFILE_SAMPLES), ::max(1, array.shape[1] // PROFILE_SAMPLES)]
+
+
+def background_colour(colour):
+    """Most common colour of an (H, W, C) array and the share of pixels it covers."""
+    sample = _sample(colour).reshape(-1, colour.shape[2]).astype(np.uint32)
+    keys = np.zeros(len(sample), dtype=np.uint32)
+    for channel in range(sample.shape[1]):
+        keys = (keys << 8) | sample[:, channel]
+    values, counts = np.unique(keys, return_counts=True)
+    key = values[np.argmax(counts)]
+    background = [(key >> (8 * shift)) & 0xFF for shift in reversed(range(sample.shape[1]))]
+    return np.array(background, dtype=np.int16), counts.max() / len(sample)
+
+
+def signal_kind(image_array):
+    """
+    Choose what the profiles measure: returns (kind, background colour).
+    "alpha" when the sheet has a mix of transparent and opaque pixels;
+    "background" (a sprite mask against the dominant colour) for opaque
+    sheets on a solid background; otherwise "edges", gradient energy.
+    """
+    channels = image_array.shape[2] if image_array.ndim == 3 else 1
+    if channels in (2, 4):
+        alpha = _sample(image_array[..., -1])
+        transparent = np.count_nonzero(alpha < ALPHA_THRESHOLD) / alpha.size
+        if USEFUL_ALPHA_RANGE[0] <= transparent <= USEFUL_ALPHA_RANGE[1]:
+            return "alpha", None
+    background, share = background_colour(_colour(image_array))
+    if USEFUL_BACKGROUND_RANGE[0] <= share <= USEFUL_BACKGROUND_RANGE[1]:
+        return "background", background
+    return "edges", None
+
+
+def _colour(pixels):
+    # Colour channels as (..., C), dropping any alpha
+    if pixels.ndim == 2:
+        return pixels[..., np.newaxis]
+    return pixels[..., :-1] if pixels.shape[2] in (2, 4) else pixels
+
+
+def axis_profile(image_array, axis, kind, background=None):
+    """
+    1-D profile along an image axis (0 for columns / tile width, 1 for rows /
+    tile height), averaged over at most PROFILE_SAMPLES lines of the other
+    axis. Only the sampled lines are converted, so the cost grows with the
+    measured dimension, not with the sheet area.
+    """
+    if axis == 0:
+        lines = image_array[::max(1, image_array.shape[0] // PROFILE_SAMPLES)]
+    else:
+        lines = image_array[:, ::max(1, image_array.shape[1] // PROFILE_SAMPLES)].swapaxes(0, 1)
+    # lines is now (sampled lines, measured axis[, channels])
+    if kind == "alpha":
+        return lines[..., -1].astype(np.float32).mean(axis=0)
+    colour = _colour(lines)
+    if kind == "background":
+        distance = np.abs(colour.astype(np.int16) - background).max(axis=2)
+        return (distance > BACKGROUND_TOLERANCE).mean(axis=0).astype(np.float32)
+    luminance = colour.astype(np.float32).mean(axis=2)
+    energy = np.abs(np.diff(luminance, axis=1)).mean(axis=0)
+    # Edge between pixel i-1 and i is stored at i, so tile borders land on multiples of the period
+    return np.concatenate(([energy.mean() if energy.size else 0.0], energy))
+
+
+def autocorrelation(profile):
+    """Unbiased, normalised autocorrelation of profile (lag 0 is 1)."""
+    length = len(profile)
+    centred = profile - profile.mean()
+    size = 1 << (2 * length - 1).bit_length()
+    spectrum = np.fft.rfft(centred, size)
+    correlation = np.fft.irfft(spectrum * np.conj(spectrum), size)[:length]
+    correlation /= np.arange(length, 0, -1)
+    if correlation[0] <= 0:
+        return np.zeros(length)
+    return correlation / correlation[0]
+
+
+def candidate_sizes(length, min_tile=MIN_TILE_SIZE, max_tiles=MAX_TILES):
+    """Tile sizes that divide length into at least two and at most max_tiles tiles."""
+    return [length // count for count in range(2, min(max_tiles, length // max(1, min_tile)) + 1)
+            if length % count == 0]
+
+
+def harmonic_score(correlation, period):
+    """Mean autocorrelation at the multiples of period that leave a full period of overlap."""
+    lags = np.arange(period, len(correlation) - period + 1, period)
+    if lags.size == 0:
+        return None
+    return float(correlation[lags].mean())
+
+
+def detect_axis(profile, min_tile=MIN_TILE_SIZE, max_tiles=MAX_TILES):
+    """
+    Detect the tile size along one profile. Returns a dict with "tile_size",
+    "tiles", "confidence" and the scored "candidates" [(size, score), ...].
+    """
+    length = len(profile)
+    correlation = autocorrelation(np.asarray(profile, dtype=np.float64))
+    candidates = []
+    for size in candidate_sizes(length, min_tile, max_tiles):
+        score = harmonic_score(correlation, size)
+        if score is not None:
+            candidates.append((size, score))
+    result = {"tile_size": length, "tiles": 1, "confidence": 0.0, "candidates": candidates}
+    if not candidates:
+        return result
+
+    best_size, best_score = max(candidates, key=lambda item: item[1])
+    if best_score < MIN_PERIOD_SCORE:
+        # Nothing repeats: one tile, more certain the weaker the best period is
+        result["confidence"] = round(1 - max(0.0, best_score) / MIN_PERIOD_SCORE, 3)
+        return result
+
+    # The best size may be a harmonic; take the smallest divisor of it that scores nearly as well
+    for size, score in sorted(candidates):
+        if best_size % size == 0 and score >= HARMONIC_TOLERANCE * best_score:
+            best_size, best_score = size, score
+            break
+
+    unrelated = [score for size, score in candidates if size % best_size and best_size % size]
+    runner_up = max(unrelated, default=0.0)
+    margin = 1 - max(0.0, runner_up) / best_score
+    result.update(tile_size=best_size, tiles=length // best_size,
+                  confidence=round(min(1.0, best_score) * min(1.0, max(0.0, margin)), 3))
+    return result
+
+
+def detect_grid(image_array, min_tile=MIN_TILE_SIZE, max_tiles=MAX_TILES):
+    """
+    Detect the tile grid of a sheet given as an (H, W) or (H, W, C) array.
+    Returns {"x": axis result, "y": axis result, "signal": see signal_kind,
+    "confidence": lower of the two axes} with axis results as in detect_axis.
+    """
+    kind, background = signal_kind(image_array)
+    x_result = detect_axis(axis_profile(image_array, 0, kind, background), min_tile, max_tiles)
+    y_result = detect_axis(axis_profile(image_array, 1, kind, background), min_tile, max_tiles)
+    return {"x": x_result, "y": y_result, "signal": kind,
+            "confidence": min(x_result["confidence"], y_result["confidence"])}
+
+
+def sprite_mask(image_array):
+    """
+    Boolean mask of sprite pixels: alpha at or above ALPHA_THRESHOLD, or for
+    opaque sheets, pixels that differ from the background colour. Raises
+    ValueError when neither separates the sprites.
+    """
+    if image_array.ndim == 3 and image_array.shape[2] in (2, 4):
+        mask = image_array[..., -1] >= ALPHA_THRESHOLD
+        if not mask.all():
+            return mask
+    background, share = background_colour(_colour(image_array))
+    if share >= USEFUL_BACKGROUND_RANGE[0]:
+        distance = np.abs(_colour(image_array).astype(np.int16) - background).max(axis=2)
+        return distance > BACKGROUND_TOLERANCE
+    raise ValueError("The sheet has no transparency or solid background to separate sprites.")
+
+
+def _grow(mask, reach, axis):
+    # Dilate along one axis by reach (before, after) pixels with shift-ORs of doubling length
+    for direction, radius in zip((-1, 1), reach):
+        covered = 0
+        while covered < radius:
+            shift = min(covered + 1, radius - covered)
+            # NumPy buffers the overlapping operands, so each step ORs in the previous state
+            if axis == 1 and direction == 1:
+                mask[:, shift:] |= mask[:, :-shift]
+            elif axis == 1:
+                mask[:, :-shift] |= mask[:, shift:]
+            elif direction == 1:
+                mask[shift:] |= mask[:-shift]
+            else:
+                mask[:-shift] |= mask[shift:]
+            covered += shift
+    return mask
+
+
+def dilate(mask, before, after=None):
+    """
+    Dilation of a boolean mask by a square window reaching before pixels up
+    and left and after pixels down and right (after defaults to before), with
+    separable shift-ORs.
+    """
+    reach = (before, before if after is None else after)
+    if max(reach) <= 0:
+        return mask
+    return _grow(_grow(mask.copy(), reach, 1), reach, 0)
+
+
+def mask_runs(mask):
+    """
+    Horizontal runs of True pixels: (rows, starts, ends) arrays in row-major
+    order, with ends exclusive.
+    """
+    height, width = mask.shape
+    # change[:, i] marks a start or end between pixels i-1 and i; they alternate along each row
+    change = np.empty((height, width + 1), dtype=bool)
+    change[:, 0] = mask[:, 0]
+    change[:, -1] = mask[:, -1]
+    np.not_equal(mask[:, 1:], mask[:, :-1], out=change[:, 1:-1])
+    rows, columns = np.divmod(np.flatnonzero(change), width + 1)
+    return rows[0::2], columns[0::2], columns[1::2]
+
+
+def label_runs(rows, starts, ends, width):
+    """
+    Label runs by 8-connectivity: runs on neighbouring rows that touch or
+    overlap diagonally share a label. Overlaps are found with searchsorted
+    over row-major keys, and labels are merged by repeated minimum
+    propagation with pointer jumping. Returns one label per run (the
+    smallest run index of its component).
+    """
+    count = len(rows)
+    labels = np.arange(count)
+    if count == 0:
+        return labels
+    stride = width + 2
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    # For each run, the runs on the row above with end >= start and start <= end
+    above = (rows - 1) * stride
+    low = np.searchsorted(end_keys, above + starts)
+    high = np.searchsorted(start_keys, above + ends, side="right")
+    pairs = np.maximum(high - low, 0)
+    below_runs = np.repeat(np.arange(count), pairs)
+    offsets = np.arange(pairs.sum()) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+    above_runs = np.repeat(low, pairs) + offsets
+
+    while True:
+        merged = np.minimum(labels[below_runs], labels[above_runs])
+        previous = labels.copy()
+        np.minimum.at(labels, below_runs, merged)
+        np.minimum.at(labels, above_runs, merged)
+        # Pointer jumping: follow labels to their roots
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def find_sprites(image_array, gap=0, min_area=1):
+    """
+    Bounding boxes (left, top, right, bottom) of the sprites in an irregular
+    atlas, in reading order. Islands at most gap pixels apart are merged
+    into one sprite; boxes still fit the sprite pixels tightly. Components with
+    fewer than min_area pixels are dropped.
+    Uses scipy.ndimage when available, otherwise run-length labeling.
+    """
+    mask = sprite_mask(image_array)
+    # A window of gap + 1 pixels per side makes islands touch exactly when at
+    # most gap blank pixels separate them (in x or y, whichever is larger)
+    grouping = dilate(mask, gap // 2, gap - gap // 2)
+
+    if ndimage is not None:
+        component_labels, count = ndimage.label(grouping, structure=np.ones((3, 3), dtype=bool))
+        # Tight boxes and areas over the original sprite pixels only
+        pixel_labels = np.where(mask, component_labels, 0)
+        boxes = []
+        areas = np.bincount(pixel_labels.ravel(), minlength=count + 1)
+        for index, region in enumerate(ndimage.find_objects(pixel_labels, count), start=1):
+            if region is not None and areas[index] >= min_area:
+                boxes.append((region[1].start, region[0].start, region[1].stop, region[0].stop))
+    else:
+        width = mask.shape[1]
+        group_rows, group_starts, group_ends = mask_runs(grouping)
+        group_labels = label_runs(group_rows, group_starts, group_ends, width)
+        # Every sprite run lies inside one run of the dilated mask
+        rows, starts, ends = mask_runs(mask)
+        stride = width + 2
+        containing = np.searchsorted(group_rows * stride + group_starts, rows * stride + starts, side="right") - 1
+        run_labels = group_labels[containing]
+
+        boxes = []
+        if len(run_labels):
+            order = np.argsort(run_labels, kind="stable")
+            run_labels, rows, starts, ends = run_labels[order], rows[order], starts[order], ends[order]
+            firsts = np.flatnonzero(np.r_[True, run_labels[1:] != run_labels[:-1]])
+            for left, top, right, bottom, area in zip(np.minimum.reduceat(starts, firsts),
+                                                      np.minimum.reduceat(rows, firsts),
+                                                      np.maximum.reduceat(ends, firsts),
+                                                      np.maximum.reduceat(rows, firsts) + 1,
+                                                      np.add.reduceat(ends - starts, firsts)):
+                if area >= min_area:
+                    boxes.append((int(left), int(top), int(right), int(bottom)))
+
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+
+def atlas_descriptor(boxes, frame_names, image_name, image_size):
+    """
+    TexturePacker "JSON (Hash)" style descriptor of the sprites at boxes
+    (left, top, right, bottom) in the sheet image_name of image_size.
+    """
+    frames = {}
+    for (left, top, right, bottom), name in zip(boxes, frame_names):
+        width, height = right - left, bottom - top
+        frames[name] = {
+            "frame": {"x": left, "y": top, "w": width, "h": height},
+            "rotated": False,
+            "trimmed": False,
+            "spriteSourceSize": {"x": 0, "y": 0, "w": width, "h": height},
+            "sourceSize": {"w": width, "h": height},
+        }
+    return {
+        "frames": frames,
+        "meta": {
+            "app": "Sprite_Sheet_Extractor3",
+            "version": "1.0",
+            "image": image_name,
+            "format": "RGBA8888",
+            "size": {"w": image_size[0], "h": image_size[1]},
+            "scale": "1",
+        },
+    }
+
+
+def _sprite(rng, tile_width, tile_height):
+    # Random blob made of a few ellipses, as an (alpha mask, colour) pair
+    yy, xx = np.mgrid[0:tile_height, 0:tile_width]
+    mask = np.zeros((tile_height, tile_width), dtype=bool)
+    for _ in range(rng.integers(1, 4)):
+        cx, cy = rng.uniform(0.3, 0.7) * tile_width, rng.uniform(0.3, 0.7) * tile_height
+        rx, ry = rng.uniform(0.15, 0.45) * tile_width, rng.uniform(0.15, 0.45) * tile_height
+        mask |= ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1
+    return mask, rng.integers(0, 256, 3)
+
+
+def synthetic_sheet(rng, x_tiles, y_tiles, tile_width, tile_height, gutter=True, background="transparent",
+                    empty=0.0):
+    """
+    Render an RGBA sheet of x_tiles by y_tiles frames of one jittered sprite.
+    gutter keeps an empty margin inside every tile; without it sprites may
+    touch the tile edges. background is "transparent", "solid" (one opaque
+    colour) or "textured" (opaque smooth noise). empty is the share of
+    frames left blank (sparse sheets).
+    """
+    height, width = y_tiles * tile_height, x_tiles * tile_width
+    sheet = np.zeros((height, width, 4), dtype=np.uint8)
+    if background == "solid":
+        sheet[..., :3] = rng.integers(0, 256, 3)
+        sheet[..., 3] = 255
+    elif background == "textured":
+        # Gradient plus per-pixel noise: no dominant colour, and nothing that repeats with the grid
+        gradient = np.linspace(0, 80, width)[np.newaxis, :, np.newaxis] + np.linspace(0, 80, height)[:, np.newaxis, np.newaxis]
+        noise = rng.integers(-30, 31, (height, width, 3))
+        sheet[..., :3] = np.clip(rng.integers(40, 120, 3) + gradient + noise, 0, 255)
+        sheet[..., 3] = 255
+    margin = max(1, min(tile_width, tile_height) // 8) if gutter else 0
+    inner_width, inner_height = tile_width - 2 * margin, tile_height - 2 * margin
+    mask, colour = _sprite(rng, inner_width, inner_height)
+    for y in range(y_tiles):
+        for x in range(x_tiles):
+            if rng.random() < empty and (x, y) != (0, 0):
+                continue
+            # Animation-like variation: shift the sprite a little every frame
+            frame = np.roll(mask, (rng.integers(-1, 2), rng.integers(-1, 2)), axis=(0, 1))
+            top, left = y * tile_height + margin, x * tile_width + margin
+            region = sheet[top:top + inner_height, left:left + inner_width]
+            region[frame, :3] = np.clip(colour + rng.integers(-20, 21, 3), 0, 255)
+            region[frame, 3] = 255
+    return sheet
+
+
+def synthetic_corpus(count, seed=0):
+    """
+    Yield (sheet, label) pairs of labelled synthetic sheets; label holds the
+    true "x_tiles", "y_tiles" and the synthetic_sheet settings.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = (8, 12, 16, 24, 32, 48, 64, 96, 128)
+    for _ in range(count):
+        label = {
+            "x_tiles": int(rng.integers(2, 17)),
+            "y_tiles": int(rng.integers(1, 9)),
+            "tile_width": int(rng.choice(sizes)),
+            "tile_height": int(rng.choice(sizes)),
+            "gutter": bool(rng.random() < 0.6),
+            "background": str(rng.choice(("transparent", "transparent", "solid", "textured"))),
+            "empty": float(rng.choice((0.0, 0.0, 0.2, 0.4))),
+        }
+        sheet = synthetic_sheet(rng, label["x_tiles"], label["y_tiles"], label["tile_width"], label["tile_height"],
+                                label["gutter"], label["background"], label["empty"])
+        yield sheet, label
+
+
+def evaluate(count=300, seed=0, verbose=False):
+    """
+    Run detect_grid over synthetic_corpus(count, seed). Returns a summary
+    with overall and per-category accuracy (a sheet counts as correct when
+    both tile counts match) and the mean confidence of right and wrong answers.
+    """
+    results = []
+    start_time = time.perf_counter()
+    for sheet, label in synthetic_corpus(count, seed):
+        grid = detect_grid(sheet)
+        correct = grid["x"]["tiles"] == label["x_tiles"] and grid["y"]["tiles"] == label["y_tiles"]
+        results.append((label, grid, correct))
+        if verbose and not correct:
+            print(f"MISS {label} -> {grid['x']['tiles']}x{grid['y']['tiles']} "
+                  f"({grid['signal']}, confidence {grid['confidence']})")
+    elapsed = time.perf_counter() - start_time
+
+    def accuracy(selected):
+        return round(sum(correct for _, _, correct in selected) / len(selected), 3) if selected else None
+
+    def mean_confidence(selected):
+        return round(float(np.mean([grid["confidence"] for _, grid, _ in selected])), 3) if selected else None
+
+    return {
+        "sheets": count,
+        "accuracy": accuracy(results),
+        "by_category": {
+            "gutter": accuracy([r for r in results if r[0]["gutter"]]),
+            "no_gutter": accuracy([r for r in results if not r[0]["gutter"]]),
+            "transparent": accuracy([r for r in results if r[0]["background"] == "transparent"]),
+            "solid": accuracy([r for r in results if r[0]["background"] == "solid"]),
+            "textured": accuracy([r for r in results if r[0]["background"] == "textured"]),
+            "sparse": accuracy([r for r in results if r[0]["empty"]]),
+        },
+        "confidence_correct": mean_confidence([r for r in results if r[2]]),
+        "confidence_wrong": mean_confidence([r for r in results if not r[2]]),
+        "seconds_per_sheet": round(elapsed / count, 4) if count else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score the sprite grid detector on synthetic sheets.")
+    parser.add_argument("--count", type=int, default=300, help="number of synthetic sheets")
+    parser.add_argument("--seed", type=int, default=0, help="corpus random seed")
+    parser.add_argument("--verbose", action="store_true", help="print every missed sheet")
+    args = parser.parse_args(argv)
+    summary = evaluate(args.count, args.seed, args.verbose)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,158 +1,500 @@
+"""
+Sprite Sheet Extractor: slice sprite sheets into one PNG per frame.
+
+Without arguments the Tk window opens. Given sheets, directories or glob
+patterns it runs headless, auto-detecting each grid and processing the
+sheets in parallel, then prints a summary per sheet:
+
+    python Sprite_Sheet_Extractor3.py sheets/ "more/*.png" [--jobs N] [--report report.json]
+    python Sprite_Sheet_Extractor3.py atlas.png --atlas --gap 2
+
+The functions below the GUI-free part (decode_sheet, save_tiles,
+extract_atlas, process_sheet, ...) can also be imported.
+"""
 import os
 import sys
+import json
+import glob
+import time
+import hashlib
+import argparse
 import numpy as np
-from tkinter import Tk, filedialog, Label, Button, Entry, IntVar, StringVar, messagebox
-from tkinter.ttk import Progressbar
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from PIL import Image
+from Folder_Scanner import scan_files
+from Sprite_Sheet_Analysis import detect_axis, detect_grid, signal_kind, axis_profile, find_sprites, atlas_descriptor
 
-def select_file():
-    file_path = filedialog.askopenfilename(
-        filetypes=[("Image files", "*.png *.jpg *.bmp *.gif")])
-    if file_path:
-        img = Image.open(file_path)
-        img_width, img_height = img.size
-        filepath_var.set(file_path)
-        dimensions_var.set(f"Dimensions: {img_width}x{img_height}")
-        img.close()
-        print(f"Selected file: {file_path} with dimensions {img_width}x{img_height}")
+try:
+    from tkinter import Tk, filedialog, Label, Button, Entry, Checkbutton, IntVar, StringVar, BooleanVar, messagebox
+    from tkinter.ttk import Progressbar
+except ImportError:
+    # Python builds without Tk can still use the CLI and the functions
+    Tk = None
+
+# Modes whose NumPy layout matches Pillow's raw bytes; anything else is sliced as RGBA
+SLICE_MODES = ("L", "LA", "RGB", "RGBA", "P")
+# Seconds between progress bar refreshes while slicing
+PROGRESS_INTERVAL = 0.05
+# Files picked up from directories given to the CLI
+SHEET_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
 
 def detect_tile_size(image_array, axis):
-    # Collapse the image array along the specified axis by taking the mean
-    projection = np.mean(image_array, axis=axis)
-    
-    # Perform Fourier Transform
-    f_transform = np.fft.rfft(projection)
-    
-    # Get the magnitudes of the frequencies
-    magnitudes = np.abs(f_transform)
-    
-    # Identify the peak (ignoring the zero frequency component)
-    peak_index = np.argmax(magnitudes[1:]) + 1
-    
-    # Convert the peak frequency into a wavelength
-    tile_size = len(projection) / peak_index
-    return tile_size
-
-def auto_detect_tiles():
-    file_path = filepath_var.get()
-    if not file_path:
-        messagebox.showerror("Error", "No file selected!")
-        return
+    # Tile size along one axis (0: width, 1: height); see Sprite_Sheet_Analysis.detect_axis
+    kind, background = signal_kind(image_array)
+    return detect_axis(axis_profile(image_array, axis, kind, background))["tile_size"]
 
-    try:
-        img = Image.open(file_path).convert('RGBA')
-        img_width, img_height = img.size
+def detect_sheet_grid(file_path):
+    """ Auto-detect the grid of a sheet file; see Sprite_Sheet_Analysis.detect_grid """
+    with Image.open(file_path) as img:
+        return detect_grid(np.asarray(img.convert("RGBA")))
 
-        # Convert the image to a NumPy array and extract the alpha channel
-        image_array = np.array(img)[:, :, 3]  # Use alpha channel for transparency
+def decode_sheet(file_path):
+    """ Decode a sprite sheet once; returns the loaded image and its pixels as a NumPy array """
+    img = Image.open(file_path)
+    img.load()
+    if img.mode not in SLICE_MODES:
+        img = img.convert("RGBA")
+    return img, np.asarray(img)
 
-        # Detect tile sizes horizontally and vertically
-        x_tile_size = detect_tile_size(image_array, axis=0)  # Collapse rows
-        y_tile_size = detect_tile_size(image_array, axis=1)  # Collapse columns
+def tile_views(image_array, x_tiles, y_tiles):
+    """
+    Split image_array into a (y_tiles, x_tiles, tile_height, tile_width, ...)
+    array of tiles. Only strides change, so no pixels are copied; leftover
+    rows and columns at the right and bottom edges are dropped, as before.
+    """
+    tile_height = image_array.shape[0] // y_tiles
+    tile_width = image_array.shape[1] // x_tiles
+    grid = image_array[:tile_height * y_tiles, :tile_width * x_tiles]
+    grid = grid.reshape((y_tiles, tile_height, x_tiles, tile_width) + image_array.shape[2:])
+    return grid.swapaxes(1, 2)
 
-        x_tiles = round(img_width / x_tile_size)
-        y_tiles = round(img_height / y_tile_size)
-        
-        x_tiles_var.set(x_tiles)
-        y_tiles_var.set(y_tiles)
+def tile_image(tile, sheet):
+    """ Pillow image for one tile view, keeping the sheet's mode, palette and transparency """
+    sprite = Image.frombytes(sheet.mode, (tile.shape[1], tile.shape[0]), tile.tobytes())
+    if sheet.mode == "P":
+        sprite.putpalette(sheet.getpalette())
+        if "transparency" in sheet.info:
+            sprite.info["transparency"] = sheet.info["transparency"]
+    return sprite
 
-        total_images_var.set(f"Total Images: {x_tiles * y_tiles}")
-        dimensions_var.set(f"Detected Tiles: {x_tiles} x {y_tiles}")
-        img.close()
-    except Exception as e:
-        messagebox.showerror("Error", f"An error occurred during auto-detection: {e}")
+def save_tile(tile, sheet, path):
+    tile_image(tile, sheet).save(path)
+
+def save_images(jobs, sheet, workers=None, progress=None):
+    """
+    Write (pixel view, path) jobs as PNGs. Encoding runs on a thread pool
+    (Pillow releases the GIL while compressing). progress is called with
+    (done, total) at most every PROGRESS_INTERVAL seconds and once at the end.
+    """
+    total = len(jobs)
+    done = 0
+    last_update = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [executor.submit(save_tile, pixels, sheet, path) for pixels, path in jobs]
+        for future in as_completed(futures):
+            future.result()
+            done += 1
+            if progress is not None and time.perf_counter() - last_update >= PROGRESS_INTERVAL:
+                progress(done, total)
+                last_update = time.perf_counter()
+    if progress is not None:
+        progress(done, total)
+
+def opaque_mask(pixels, sheet):
+    """ Boolean mask of the non-transparent pixels, or None if the sheet has no transparency """
+    if sheet.mode in ("LA", "RGBA"):
+        return pixels[..., -1] > 0
+    if sheet.mode == "P" and isinstance(sheet.info.get("transparency"), int):
+        return pixels != sheet.info["transparency"]
+    return None
+
+def plan_tiles(tiles, sheet, name_part, drop_empty=False, dedupe=False, trim=False):
+    """
+    Decide what to write for the tiles of a (y_tiles, x_tiles, ...) view.
+    drop_empty skips fully transparent tiles, dedupe writes tiles with
+    identical pixels once, and trim crops each written tile to its
+    non-transparent content.
+
+    Returns (jobs, mapping): jobs as (pixel view, file name), and mapping
+    from "x_y" to {"file", "x", "y", "w", "h"}, the stored rectangle within
+    the tile, or None for a dropped empty tile.
+    """
+    y_tiles, x_tiles, tile_height, tile_width = tiles.shape[:4]
+    count = y_tiles * x_tiles
+    positions = [(x, y) for y in range(y_tiles) for x in range(x_tiles)]
+    flat = None
+    if drop_empty or dedupe or trim:
+        # One contiguous copy of the grid, so each tile's bytes can be hashed in place;
+        # without these options the jobs stay zero-copy views of the sheet
+        flat = np.ascontiguousarray(tiles).reshape((count, tile_height, tile_width) + tiles.shape[4:])
 
-def process_sprites():
-    file_path = filepath_var.get()
-    if not file_path:
-        messagebox.showerror("Error", "No file selected!")
-        return
+    opaque = opaque_mask(flat, sheet) if drop_empty or trim else None
+    if opaque is not None:
+        rows = opaque.any(axis=2)
+        columns = opaque.any(axis=1)
+        empty = ~rows.any(axis=1)
+        tops = rows.argmax(axis=1)
+        bottoms = tile_height - rows[:, ::-1].argmax(axis=1)
+        lefts = columns.argmax(axis=1)
+        rights = tile_width - columns[:, ::-1].argmax(axis=1)
+    else:
+        empty = np.zeros(count, dtype=bool)
 
-    x_tiles = x_tiles_var.get()
-    y_tiles = y_tiles_var.get()
-    
-    if x_tiles <= 0 or y_tiles <= 0:
-        messagebox.showerror("Error", "Number of tiles must be greater than zero!")
-        return
+    jobs = []
+    mapping = {}
+    stored = {}
+    for index, (x, y) in enumerate(positions):
+        if drop_empty and empty[index]:
+            mapping[f"{x}_{y}"] = None
+            continue
+        key = hashlib.blake2b(flat[index], digest_size=16).digest() if dedupe else index
+        if key not in stored:
+            if trim and opaque is not None and not empty[index]:
+                box = (int(lefts[index]), int(tops[index]), int(rights[index]), int(bottoms[index]))
+            else:
+                box = (0, 0, tile_width, tile_height)
+            file_name = f"{name_part}_{x}_{y}.png"
+            stored[key] = {"file": file_name, "x": box[0], "y": box[1], "w": box[2] - box[0], "h": box[3] - box[1]}
+            jobs.append((tiles[y, x][box[1]:box[3], box[0]:box[2]], file_name))
+        mapping[f"{x}_{y}"] = stored[key]
+    return jobs, mapping
 
+def save_tiles(sheet, image_array, x_tiles, y_tiles, dest_folder, name_part, workers=None, progress=None,
+               drop_empty=False, dedupe=False, trim=False, image_name=None):
+    """
+    Write the tiles of a uniform grid as {name_part}_{x}_{y}.png (see
+    save_images). With drop_empty, dedupe or trim (see plan_tiles) a
+    {name_part}_mapping.json maps every grid position to its stored file
+    and offsets. Returns the mapping.
+    """
+    tiles = tile_views(image_array, x_tiles, y_tiles)
+    jobs, mapping = plan_tiles(tiles, sheet, name_part, drop_empty, dedupe, trim)
+    save_images([(pixels, os.path.join(dest_folder, file_name)) for pixels, file_name in jobs], sheet, workers, progress)
+    if drop_empty or dedupe or trim:
+        descriptor = {
+            "image": image_name or name_part,
+            "grid": {"x": x_tiles, "y": y_tiles},
+            "tile_size": {"w": tiles.shape[3], "h": tiles.shape[2]},
+            "tiles": mapping,
+        }
+        with open(os.path.join(dest_folder, f"{name_part}_mapping.json"), "w", encoding="utf-8") as f:
+            json.dump(descriptor, f, indent=2)
+    return mapping
+
+def extract_atlas(sheet, image_array, dest_folder, name_part, image_name, gap=0, min_area=1, workers=None, progress=None):
+    """
+    Crop every sprite of an irregularly packed atlas, found by connected
+    components (see Sprite_Sheet_Analysis.find_sprites), as {name_part}_{i}.png
+    in reading order, and write a TexturePacker-style {name_part}.json that
+    maps each file to its rectangle in image_name. Returns the boxes.
+    """
+    boxes = find_sprites(image_array, gap, min_area)
+    names = [f"{name_part}_{index}.png" for index in range(len(boxes))]
+    jobs = [(image_array[top:bottom, left:right], os.path.join(dest_folder, name))
+            for (left, top, right, bottom), name in zip(boxes, names)]
+    save_images(jobs, sheet, workers, progress)
+    descriptor = atlas_descriptor(boxes, names, image_name, sheet.size)
+    with open(os.path.join(dest_folder, f"{name_part}.json"), "w", encoding="utf-8") as f:
+        json.dump(descriptor, f, indent=2)
+    return boxes
+
+
+def grid_folder_name(name_part, x_tiles, y_tiles):
+    return f"{name_part}_XTiles{x_tiles}YTiles{y_tiles}_TotalImages{x_tiles*y_tiles}"
+
+def process_sheet(file_path, x_tiles=None, y_tiles=None, output_root=None, atlas=False, gap=2,
+                  drop_empty=False, dedupe=False, trim=False, min_confidence=0.0, workers=None, progress=None):
+    """
+    Slice one sheet. The grid is auto-detected unless x_tiles and y_tiles
+    are given; with atlas=True sprites are found by connected components
+    instead (see extract_atlas). Output goes to a folder next to the sheet,
+    or inside output_root. Auto-detected grids below min_confidence are
+    not sliced.
+
+    Returns a report: "sheet", "mode", "grid", "confidence", "signal",
+    "frames", "written", "output", "seconds", "empty" for grids and, for
+    skipped sheets, "skipped".
+    """
+    start_time = time.perf_counter()
+    img, image_array = decode_sheet(file_path)
+    base_name = os.path.basename(file_path)
+    name_part = os.path.splitext(base_name)[0]
+    report = {"sheet": file_path, "mode": "atlas" if atlas else "grid", "grid": None, "confidence": None,
+              "signal": None, "frames": 0, "written": 0, "output": None}
     try:
-        img = Image.open(file_path)
-        img_width, img_height = img.size
-
-        print(f"Sliced Image with dimensions {img_width}x{img_height}")
-        print(f"Tiles: {x_tiles}x{y_tiles}")
-
-        # Calculate tile dimensions
-        tile_width = img_width // x_tiles
-        tile_height = img_height // y_tiles
-
-        base_name = os.path.basename(file_path)
-        dir_name = os.path.dirname(file_path)
-        name_part = os.path.splitext(base_name)[0]
-        dest_folder = os.path.join(dir_name, f"{name_part}_XTiles{x_tiles}YTiles{y_tiles}_TotalImages{x_tiles*y_tiles}")
-
-        if not os.path.exists(dest_folder):
-            os.mkdir(dest_folder)
-
-        total_images = x_tiles * y_tiles
-
-        for y in range(y_tiles):
-            for x in range(x_tiles):
-                left = x * tile_width
-                upper = y * tile_height
-                right = left + tile_width
-                lower = upper + tile_height
-                
-                sprite = img.crop((left, upper, right, lower))
-                sprite_filename = f"{name_part}_{x}_{y}.png"
-                sprite.save(os.path.join(dest_folder, sprite_filename))
-                
-                progress_bar["value"] = ((y * x_tiles) + x + 1) / total_images * 100
-                root.update_idletasks()
-
-        messagebox.showinfo("Success", f"Sprites have been successfully extracted and saved in {dest_folder}.")
-        
-        if sys.platform.startswith('darwin'):
-            os.system(f'open "{dest_folder}"')
-        elif os.name == 'nt':
-            os.startfile(dest_folder)
-        elif os.name == 'posix':
-            os.system(f'xdg-open "{dest_folder}"')
-        
+        if atlas:
+            dest_folder = os.path.join(output_root or os.path.dirname(file_path), f"{name_part}_Atlas")
+            os.makedirs(dest_folder, exist_ok=True)
+            boxes = extract_atlas(img, image_array, dest_folder, name_part, base_name, gap=gap,
+                                  workers=workers, progress=progress)
+            report.update(frames=len(boxes), written=len(boxes), output=dest_folder)
+        else:
+            if x_tiles is None or y_tiles is None:
+                rgba = image_array if img.mode == "RGBA" else np.asarray(img.convert("RGBA"))
+                grid = detect_grid(rgba)
+                x_tiles, y_tiles = grid["x"]["tiles"], grid["y"]["tiles"]
+                report.update(confidence=grid["confidence"], signal=grid["signal"])
+                if grid["confidence"] < min_confidence:
+                    report.update(grid=[x_tiles, y_tiles], skipped="low confidence",
+                                  seconds=round(time.perf_counter() - start_time, 3))
+                    return report
+            if x_tiles <= 0 or y_tiles <= 0:
+                raise ValueError("Number of tiles must be greater than zero!")
+            if img.width // x_tiles <= 0 or img.height // y_tiles <= 0:
+                raise ValueError("More tiles than pixels in the image!")
+
+            dest_folder = os.path.join(output_root or os.path.dirname(file_path),
+                                       grid_folder_name(name_part, x_tiles, y_tiles))
+            os.makedirs(dest_folder, exist_ok=True)
+            mapping = save_tiles(img, image_array, x_tiles, y_tiles, dest_folder, name_part, workers=workers,
+                                 progress=progress, drop_empty=drop_empty, dedupe=dedupe, trim=trim,
+                                 image_name=base_name)
+            written = len({entry["file"] for entry in mapping.values() if entry is not None})
+            empty = sum(1 for entry in mapping.values() if entry is None)
+            report.update(grid=[x_tiles, y_tiles], frames=x_tiles * y_tiles, written=written, empty=empty,
+                          output=dest_folder)
+    finally:
         img.close()
+    report["seconds"] = round(time.perf_counter() - start_time, 3)
+    return report
+
+def _process_sheet_job(file_path, options):
+    # Runs in a worker process; failures become part of the report
+    try:
+        return process_sheet(file_path, **options)
     except Exception as e:
-        messagebox.showerror("Error", f"An error occurred: {e}")
+        return {"sheet": file_path, "error": str(e)}
+
+def iter_sheet_paths(inputs, recursive=False):
+    """ Sheet files named by inputs: files, directories (scanned for SHEET_EXTENSIONS) or glob patterns """
+    seen = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            # Skip the output folders of earlier runs
+            paths = sorted(scan_files(item, SHEET_EXTENSIONS, recursive=recursive, exclude=["*_XTiles*", "*_Atlas"]))
+        elif os.path.isfile(item):
+            paths = [item]
+        else:
+            paths = sorted(path for path in glob.glob(item, recursive=True)
+                           if os.path.isfile(path) and path.lower().endswith(SHEET_EXTENSIONS))
+        for path in paths:
+            if path not in seen:
+                seen.add(path)
+                yield path
+
+def process_sheets(paths, jobs=None, **options):
+    """
+    Process several sheets on a pool of jobs processes (see process_sheet
+    for options). Yields each sheet's report as it finishes.
+    """
+    paths = list(paths)
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(paths) or 1))
+    # Split the machine between sheet processes and their PNG writer threads
+    options.setdefault("workers", max(1, (os.cpu_count() or 1) // jobs))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_process_sheet_job, path, options) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+def print_summary(reports):
+    print(f"{'Sheet':<40}{'Grid':>9}{'Conf.':>7}{'Frames':>8}{'Written':>9}{'Seconds':>9}")
+    for report in reports:
+        name = os.path.basename(report["sheet"])[:39]
+        if "error" in report:
+            print(f"{name:<40}  ERROR: {report['error']}")
+            continue
+        grid = f"{report['grid'][0]}x{report['grid'][1]}" if report["grid"] else "atlas"
+        confidence = "-" if report["confidence"] is None else f"{report['confidence']:.0%}"
+        note = f"  skipped: {report['skipped']}" if report.get("skipped") else ""
+        print(f"{name:<40}{grid:>9}{confidence:>7}{report['frames']:>8}{report['written']:>9}{report['seconds']:>9.2f}{note}")
+    done = [report for report in reports if "error" not in report]
+    print(f"{len(reports)} sheets, {len(reports) - len(done)} failed, "
+          f"{sum(report['written'] for report in done)} images written, "
+          f"{sum(report['seconds'] for report in done):.2f} s of sheet time")
+
+def parse_tiles(text):
+    try:
+        x_tiles, y_tiles = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected COLUMNSxROWS, got '{text}'")
+    return x_tiles, y_tiles
+
+def open_folder(dest_folder):
+    if sys.platform.startswith('darwin'):
+        os.system(f'open "{dest_folder}"')
+    elif os.name == 'nt':
+        os.startfile(dest_folder)
+    elif os.name == 'posix':
+        os.system(f'xdg-open "{dest_folder}"')
+
+class SpriteSheetExtractorApp:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Sprite Sheet Extractor")
+
+        self.filepath_var = StringVar()
+        self.dimensions_var = StringVar()
+        self.total_images_var = StringVar()
+        self.x_tiles_var = IntVar()
+        self.y_tiles_var = IntVar()
+        self.gap_var = IntVar(value=2)
+        self.drop_empty_var = BooleanVar(value=False)
+        self.dedupe_var = BooleanVar(value=False)
+        self.trim_var = BooleanVar(value=False)
+
+        Label(root, text="Selected File:").grid(row=0, column=0)
+        Label(root, textvariable=self.filepath_var).grid(row=0, column=1)
+
+        Button(root, text="Select File", command=self.select_file).grid(row=1, column=0, columnspan=2)
+
+        Label(root, textvariable=self.dimensions_var).grid(row=2, column=0, columnspan=2)
+
+        Button(root, text="Auto-Detect Tiles", command=self.auto_detect_tiles).grid(row=3, column=0, columnspan=2)
+
+        Label(root, text="X Tiles:").grid(row=4, column=0)
+        Entry(root, textvariable=self.x_tiles_var).grid(row=4, column=1)
+
+        Label(root, text="Y Tiles:").grid(row=5, column=0)
+        Entry(root, textvariable=self.y_tiles_var).grid(row=5, column=1)
+
+        Label(root, textvariable=self.total_images_var).grid(row=6, column=0, columnspan=2)
+
+        self.progress_bar = Progressbar(root, orient="horizontal", mode="determinate")
+        self.progress_bar.grid(row=7, column=0, columnspan=2, sticky='ew')
+
+        Checkbutton(root, text="Skip empty frames", variable=self.drop_empty_var).grid(row=8, column=0)
+        Checkbutton(root, text="Write duplicates once", variable=self.dedupe_var).grid(row=8, column=1)
+        Checkbutton(root, text="Trim to content (offsets in mapping)", variable=self.trim_var).grid(row=9, column=0, columnspan=2)
+
+        Button(root, text="Process", command=self.process_sprites).grid(row=10, column=0, columnspan=2)
+
+        # Irregular atlases: sprites found by connected components instead of a grid
+        Label(root, text="Merge Gap (px):").grid(row=11, column=0)
+        Entry(root, textvariable=self.gap_var).grid(row=11, column=1)
+
+        Button(root, text="Extract Atlas", command=self.process_atlas).grid(row=12, column=0, columnspan=2)
+
+    def select_file(self):
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Image files", "*.png *.jpg *.bmp *.gif")])
+        if file_path:
+            img = Image.open(file_path)
+            img_width, img_height = img.size
+            self.filepath_var.set(file_path)
+            self.dimensions_var.set(f"Dimensions: {img_width}x{img_height}")
+            img.close()
+            print(f"Selected file: {file_path} with dimensions {img_width}x{img_height}")
+
+    def auto_detect_tiles(self):
+        file_path = self.filepath_var.get()
+        if not file_path:
+            messagebox.showerror("Error", "No file selected!")
+            return
+
+        try:
+            # Score tile sizes on alpha, or on the background / edges of opaque sheets
+            grid = detect_sheet_grid(file_path)
+            x_tiles = grid["x"]["tiles"]
+            y_tiles = grid["y"]["tiles"]
+
+            self.x_tiles_var.set(x_tiles)
+            self.y_tiles_var.set(y_tiles)
+
+            self.total_images_var.set(f"Total Images: {x_tiles * y_tiles}")
+            self.dimensions_var.set(f"Detected Tiles: {x_tiles} x {y_tiles} (confidence {grid['confidence']:.0%}, from {grid['signal']})")
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred during auto-detection: {e}")
+
+    def update_progress(self, done, total):
+        self.progress_bar["value"] = done / total * 100
+        self.root.update_idletasks()
+
+    def process_sprites(self):
+        file_path = self.filepath_var.get()
+        if not file_path:
+            messagebox.showerror("Error", "No file selected!")
+            return
 
-root = Tk()
-root.title("Sprite Sheet Extractor")
+        x_tiles = self.x_tiles_var.get()
+        y_tiles = self.y_tiles_var.get()
 
-filepath_var = StringVar()
-dimensions_var = StringVar()
-total_images_var = StringVar()
-x_tiles_var = IntVar()
-y_tiles_var = IntVar()
+        if x_tiles <= 0 or y_tiles <= 0:
+            messagebox.showerror("Error", "Number of tiles must be greater than zero!")
+            return
 
-Label(root, text="Selected File:").grid(row=0, column=0)
-Label(root, textvariable=filepath_var).grid(row=0, column=1)
+        try:
+            print(f"Tiles: {x_tiles}x{y_tiles}")
+            report = process_sheet(file_path, x_tiles, y_tiles, drop_empty=self.drop_empty_var.get(),
+                                   dedupe=self.dedupe_var.get(), trim=self.trim_var.get(),
+                                   progress=self.update_progress)
 
-Button(root, text="Select File", command=select_file).grid(row=1, column=0, columnspan=2)
+            duplicates = report["frames"] - report["empty"] - report["written"]
+            skipped = f"\n{report['empty']} empty and {duplicates} duplicate frames were not written." if report["empty"] or duplicates else ""
+            messagebox.showinfo("Success", f"Sprites have been successfully extracted and saved in {report['output']}.{skipped}")
+            open_folder(report["output"])
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred: {e}")
 
-Label(root, textvariable=dimensions_var).grid(row=2, column=0, columnspan=2)
+    def process_atlas(self):
+        file_path = self.filepath_var.get()
+        if not file_path:
+            messagebox.showerror("Error", "No file selected!")
+            return
 
-Button(root, text="Auto-Detect Tiles", command=auto_detect_tiles).grid(row=3, column=0, columnspan=2)
+        try:
+            report = process_sheet(file_path, atlas=True, gap=self.gap_var.get(), progress=self.update_progress)
+            self.total_images_var.set(f"Total Images: {report['frames']}")
 
-Label(root, text="X Tiles:").grid(row=4, column=0)
-Entry(root, textvariable=x_tiles_var).grid(row=4, column=1)
+            messagebox.showinfo("Success", f"{report['frames']} sprites have been extracted and saved in {report['output']}.")
+            open_folder(report["output"])
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred: {e}")
 
-Label(root, text="Y Tiles:").grid(row=5, column=0)
-Entry(root, textvariable=y_tiles_var).grid(row=5, column=1)
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        if Tk is None:
+            print("Tk is not available; pass sprite sheets on the command line (see --help).")
+            return 1
+        root = Tk()
+        SpriteSheetExtractorApp(root)
+        print("Starting the application...")
+        root.mainloop()
+        return 0
 
-Label(root, textvariable=total_images_var).grid(row=6, column=0, columnspan=2)
+    parser = argparse.ArgumentParser(description="Slice sprite sheets without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="sheet files, directories or glob patterns")
+    parser.add_argument("--tiles", type=parse_tiles, default=None,
+                        help="fixed grid for every sheet, e.g. 8x4 (default: auto-detect per sheet)")
+    parser.add_argument("--atlas", action="store_true", help="find sprites by connected components instead of a grid")
+    parser.add_argument("--gap", type=int, default=2, help="atlas mode: merge islands this many pixels apart")
+    parser.add_argument("--skip-empty", action="store_true", help="do not write fully transparent frames")
+    parser.add_argument("--dedupe", action="store_true", help="write identical frames once")
+    parser.add_argument("--trim", action="store_true", help="trim frames to their content")
+    parser.add_argument("--min-confidence", type=float, default=0.0,
+                        help="skip sheets whose auto-detected grid is less certain than this (0-1)")
+    parser.add_argument("--recursive", action="store_true", help="include sheets in subfolders of directories")
+    parser.add_argument("--output", default=None, help="folder for the output folders (default: next to each sheet)")
+    parser.add_argument("--jobs", type=int, default=None, help="sheets processed in parallel (default: CPU count)")
+    parser.add_argument("--report", default=None, help="also write the per-sheet reports to this JSON file")
+    args = parser.parse_args(argv)
 
-progress_bar = Progressbar(root, orient="horizontal", mode="determinate")
-progress_bar.grid(row=7, column=0, columnspan=2, sticky='ew')
+    paths = list(iter_sheet_paths(args.inputs, args.recursive))
+    if not paths:
+        parser.error("no sprite sheets found")
+    options = dict(atlas=args.atlas, gap=args.gap, drop_empty=args.skip_empty, dedupe=args.dedupe,
+                   trim=args.trim, min_confidence=args.min_confidence, output_root=args.output)
+    if args.tiles:
+        options["x_tiles"], options["y_tiles"] = args.tiles
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
 
-Button(root, text="Process", command=process_sprites).grid(row=8, column=0, columnspan=2)
+    reports = sorted(process_sheets(paths, args.jobs, **options), key=lambda report: report["sheet"])
+    print_summary(reports)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+    return 1 if any("error" in report for report in reports) else 0
 
-print("Starting the application...")
-root.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,145 +1,486 @@
 import os
-import subprocess
+import re
+import json
+import locale
+import hashlib
+import tempfile
+import time
+import queue
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter.ttk import Progressbar
-
-# Path to ExifTool; replace it with your actual ExifTool path
-EXIFTOOL_PATH = r"C:\exiftool\exiftool.exe"
-SUPPORTED_FORMATS = (".jpg", ".png", ".tiff", ".psd")  # Add more formats if needed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from Folder_Scanner import scan_files
+from ExifTool_Session import DEFAULT_EXIFTOOL_PATH
+from Metadata_Backends import BACKENDS, create_backend, default_backend_name, tags_match
+
+# Path to ExifTool; set the EXIFTOOL_PATH environment variable to override it
+EXIFTOOL_PATH = DEFAULT_EXIFTOOL_PATH
+# Image formats matched to .txt files, in order of preference when several share a name
+SUPPORTED_FORMATS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".psd", ".webp", ".heic", ".dng")
+# "Key: value" lines that start a field in a .txt file; every other line, even
+# one like "Note: ..." or a URL, continues the previous field's value
+SIDECAR_KEY = re.compile(r"^\s*(title|description|keywords)\s*:(.*)$", re.IGNORECASE)
+# Number of files written at once (and ExifTool processes kept open)
+EXIFTOOL_SESSIONS = min(4, os.cpu_count() or 1)
+# Writes queued per worker thread; more are only submitted as these finish,
+# so a large folder never queues thousands of writes that cancel cannot stop
+WRITES_PER_WORKER = 2
+# Lines kept in the log box; older lines are dropped
+MAX_LOG_LINES = 1000
+# How often the GUI drains the result queue, and how many results it takes per drain
+POLL_INTERVAL_MS = 100
+RESULTS_PER_POLL = 500
+LOG_COLORS = {"red": "red", "green": "green", "black": "black"}
+# Skip-unchanged mode: images whose tags are read back per batch, and the
+# cache of files known to be up to date (kept in the processed folder)
+READ_CHUNK = 100
+CACHE_NAME = ".metadata_cache.json"
+CACHE_FLUSH_EVERY = 50
+
+
+def configure_log_tags(log_box):
+    """
+    Register the color tags used by the log box. Called once when the box is created.
+    """
+    for tag, color in LOG_COLORS.items():
+        log_box.tag_config(tag, foreground=color)
 
 
 def log_message(message, log_box, color="black"):
     """
     Append messages to the log box with color-coding for status (errors and successes).
     """
+    append_log(log_box, [(message, color)])
+
+
+def append_log(log_box, lines, max_lines=MAX_LOG_LINES):
+    """
+    Append a batch of (message, color) lines to the log box in one go. The
+    box works as a ring buffer: only the newest max_lines lines are kept.
+    """
+    if not lines:
+        return
+    lines = lines[-max_lines:]
     log_box.config(state=tk.NORMAL)
-    log_box.insert(tk.END, message + "\n", color)
-    log_box.tag_config("red", foreground="red")      # Errors
-    log_box.tag_config("green", foreground="green")  # Successes
-    log_box.tag_config("black", foreground="black")  # Neutral messages
+    for message, color in lines:
+        log_box.insert(tk.END, message + "\n", color)
+    # The Text widget always ends with an empty line after the last newline
+    excess = int(log_box.index("end-1c").split(".")[0]) - 1 - max_lines
+    if excess > 0:
+        log_box.delete("1.0", f"{excess + 1}.0")
     log_box.see(tk.END)  # Auto-scroll
     log_box.config(state=tk.DISABLED)
 
 
-def process_metadata(txt_file, image_file, log_box, metadata):
+def read_text(txt_file):
+    # UTF-8 (with or without a BOM) first, then the system's default encoding
+    with open(txt_file, "rb") as f:
+        data = f.read()
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode(locale.getpreferredencoding(False), errors="replace")
+
+
+def parse_sidecar(txt_file):
     """
-    Process metadata from input .txt file and user-provided fields.
-    Applies the data to the image file using ExifTool.
+    Read a .txt file in one pass. Returns {"title", "description", "keywords"}.
+
+    Lines look like "Title: ...", "Description: ..." and "Keywords: a, b, c";
+    keys are case-insensitive. Any other line continues the value above it,
+    so descriptions can span several lines, including lines that contain a
+    colon ("Note: ...", URLs); text before the first key is ignored.
+    Repeated keys add to the value: descriptions are joined with line
+    breaks, keywords are collected from every line (without duplicates) and
+    the first title wins.
     """
-    try:
-        log_message(f"Processing '{os.path.basename(image_file)}' with metadata from '{os.path.basename(txt_file)}'", log_box)
-
-        # Read the metadata from the TXT file
-        with open(txt_file, "r") as f:
-            lines = f.readlines()
-
-        # Extract metadata fields
-        title = next((line.split(":", 1)[1].strip() for line in lines if line.lower().startswith("title:")), "")
-        description = next((line.split(":", 1)[1].strip() for line in lines if line.lower().startswith("description:")), "")
-        keywords = next((line.split(":", 1)[1].strip().split(",") for line in lines if line.lower().startswith("keywords:")), [])
-
-        # Prepare ExifTool commands
-        commands = [EXIFTOOL_PATH]
-
-        # Title and Title Prefix
-        if metadata["title_prefix"] or title:
-            full_title = f"{metadata['title_prefix']} {title}".strip()
-            commands.extend([
-                f"-XMP-dc:Title={full_title}",  # Title in XMP namespace
-                f"-photoshop:Headline={full_title}"  # Headline for Photoshop metadata
-            ])
-
-        # Description
-        if description:
-            commands.append(f"-XMP-dc:Description={description}")
-
-        # Keywords
-        for keyword in keywords + metadata["additional_keywords"].split(","):
-            if keyword.strip():
-                commands.append(f"-XMP-dc:Subject={keyword.strip()}")
-
-        # Author Name
-        if metadata["author_name"]:
-            commands.append(f"-XMP-dc:Creator={metadata['author_name']}")
-
-        # Author Title
-        if metadata["author_title"]:
-            commands.append(f"-XMP-photoshop:AuthorsPosition={metadata['author_title']}")
-
-        # Copyright Information
-        if metadata["copyright_status"]:
-            if metadata["copyright_info"]:
-                commands.extend([
-                    f"-IPTC:CopyrightNotice={metadata['copyright_info']}",
-                    f"-XMP-dc:Rights={metadata['copyright_info']}"
-                ])
-            else:
-                commands.append(f"-IPTC:CopyrightNotice=Copyrighted")
+    fields = {"title": [], "description": [], "keywords": []}
+    current = None
+    for line in read_text(txt_file).splitlines():
+        match = SIDECAR_KEY.match(line)
+        if match:
+            current = fields[match.group(1).lower()]
+            current.append([match.group(2).strip()])
+        elif current is not None:
+            current[-1].append(line.strip())
+
+    def block(lines):
+        # Drop the blank lines around a value, keep the ones inside it
+        while lines and not lines[-1]:
+            lines.pop()
+        while lines and not lines[0]:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    keywords = []
+    for lines in fields["keywords"]:
+        for keyword in ",".join(lines).split(","):
+            keyword = keyword.strip()
+            if keyword and keyword not in keywords:
+                keywords.append(keyword)
+    return {
+        "title": " ".join(line for line in fields["title"][0] if line) if fields["title"] else "",
+        "description": "\n".join(text for text in (block(lines) for lines in fields["description"]) if text),
+        "keywords": keywords,
+    }
 
-        # Copyright URL
-        if metadata["copyright_url"]:
-            commands.append(f"-XMP-xmpRights:WebStatement={metadata['copyright_url']}")
 
-        # Rating
-        if metadata["rating"]:
-            commands.append(f"-XMP-xmp:Rating={metadata['rating']}")  # Rating (1–5)
+def build_tags(txt_file, metadata):
+    """
+    Read the title, description and keywords from the .txt file and combine
+    them with the user-provided fields into a tag dictionary for the
+    metadata backends (Metadata_Backends.TAG_KEYS).
+    """
+    # Read the metadata from the TXT file
+    sidecar = parse_sidecar(txt_file)
+    title = sidecar["title"]
+    description = sidecar["description"]
+    keywords = sidecar["keywords"]
+
+    tags = {}
+
+    # Title and Title Prefix
+    if metadata["title_prefix"] or title:
+        tags["title"] = f"{metadata['title_prefix']} {title}".strip()
+
+    # Description
+    if description:
+        tags["description"] = description
+
+    # Keywords
+    keywords = keywords + [keyword.strip() for keyword in metadata["additional_keywords"].split(",") if keyword.strip()]
+    if keywords:
+        tags["keywords"] = keywords
+
+    # Author Name
+    if metadata["author_name"]:
+        tags["creator"] = metadata["author_name"]
+
+    # Author Title
+    if metadata["author_title"]:
+        tags["authors_position"] = metadata["author_title"]
+
+    # Copyright Information
+    if metadata["copyright_status"]:
+        if metadata["copyright_info"]:
+            tags["copyright_notice"] = metadata["copyright_info"]
+            tags["rights"] = metadata["copyright_info"]
+        else:
+            tags["copyright_notice"] = "Copyrighted"
 
-        # Overwrite the file
-        commands.extend(["-overwrite_original", image_file])
+    # Copyright URL
+    if metadata["copyright_url"]:
+        tags["web_statement"] = metadata["copyright_url"]
 
-        # Run ExifTool command
-        result = subprocess.run(commands, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    # Rating
+    if metadata["rating"]:
+        tags["rating"] = metadata["rating"]  # Rating (1–5)
+    return tags
 
-        # Handle ExifTool output
-        if result.returncode == 0:
-            log_message(f"✔️ Metadata successfully applied to '{os.path.basename(image_file)}'", log_box, "green")
-            return True
+
+def index_folder(folder, recursive=False):
+    """
+    Scan the folder (and with recursive, its subfolders) once and pair every
+    .txt file with the image of the same name next to it (extensions are
+    matched without regard to case). Returns (pairs, orphan_sidecars, orphan_images), where
+    pairs is [(txt_path, image_file)], orphan_sidecars are .txt files without
+    an image and orphan_images are images without a .txt file.
+    """
+    priority = {ext: rank for rank, ext in enumerate(SUPPORTED_FORMATS)}
+    sidecars = {}
+    images = {}
+    for path in scan_files(folder, (".txt",) + SUPPORTED_FORMATS, recursive=recursive):
+        stem, ext = os.path.splitext(path)
+        # normcase keeps the old behavior of matching names case-insensitively on Windows
+        key = os.path.normcase(stem)
+        if ext.lower() == ".txt":
+            sidecars[key] = path
         else:
-            log_message(f"Error: {result.stderr}", log_box, "red")
-            return False
-    except Exception as e:
-        log_message(f"Error processing '{image_file}': {e}", log_box, "red")
-        return False
+            images.setdefault(key, []).append(path)
+
+    pairs, orphan_sidecars, matched = [], [], set()
+    for key, txt_path in sidecars.items():
+        candidates = images.get(key)
+        if candidates:
+            image_file = min(candidates, key=lambda path: priority[os.path.splitext(path)[1].lower()])
+            pairs.append((txt_path, image_file))
+            matched.add(image_file)
+        else:
+            orphan_sidecars.append(txt_path)
+    orphan_images = [path for paths in images.values() for path in paths if path not in matched]
+    return pairs, orphan_sidecars, orphan_images
 
 
-def process_folder(folder, metadata, progress_var, progress_bar, log_box):
+def tags_hash(tags):
+    """Hash of a tag dictionary, i.e. of the .txt file's fields combined with the form fields."""
+    return hashlib.sha256(json.dumps(tags, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class MetadataCache:
     """
-    Process all .txt and corresponding image files in the folder.
+    Images known to hold their tags already, kept as JSON in
+    <folder>/.metadata_cache.json. Entries are keyed by image path relative
+    to the folder and store the image's size and mtime, the hash of the tags
+    written (tags_hash) and the metadata writer. An image is current while
+    all of them still match, so reruns can skip it without reading its tags.
     """
-    txt_files = [f for f in os.listdir(folder) if f.endswith(".txt")]
-    if not txt_files:
-        log_message("No .txt files found in the selected folder.", log_box, "red")
-        return
 
-    progress_bar["maximum"] = len(txt_files)
-    processed, errors = 0, 0
-
-    for idx, txt_file in enumerate(txt_files):
-        txt_path = os.path.join(folder, txt_file)
-        base_name = os.path.splitext(txt_file)[0]
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, CACHE_NAME)
+        self.entries = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def _key(self, image_file):
+        return os.path.relpath(image_file, self.folder).replace(os.sep, "/")
+
+    def is_current(self, image_file, digest, backend_name):
+        entry = self.entries.get(self._key(image_file))
+        if entry is None or entry.get("tags_hash") != digest or entry.get("backend") != backend_name:
+            return False
+        try:
+            stat = os.stat(image_file)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == (entry["size"], entry["mtime"])
 
-        # Find the matching image file
-        image_file = next(
-            (os.path.join(folder, f"{base_name}{ext}") for ext in SUPPORTED_FORMATS if os.path.exists(os.path.join(folder, f"{base_name}{ext}"))),
-            None
-        )
+    def record(self, image_file, digest, backend_name):
+        """Store the image's current size and mtime with the tags it holds."""
+        try:
+            stat = os.stat(image_file)
+        except OSError:
+            return
+        with self._lock:
+            self.entries[self._key(image_file)] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "tags_hash": digest,
+                "backend": backend_name,
+            }
+            self._unsaved += 1
+            if self._unsaved >= CACHE_FLUSH_EVERY:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        # Written atomically (temp file + os.replace)
+        if not self._unsaved:
+            return
+        fd, temp_path = tempfile.mkstemp(prefix=CACHE_NAME, suffix=".tmp", dir=self.folder)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"entries": self.entries}, f)
+            os.replace(temp_path, self.path)
+            self._unsaved = 0
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+class MetadataJob:
+    """
+    Applies the metadata to every .txt / image pair in a folder on a pool of
+    worker threads. Call run() on a background thread; it puts these messages
+    on the results queue for the GUI to drain:
+
+        ("total", count)
+        ("result", success, message)   one per .txt file
+        ("note", message)              one per image without a .txt file
+        ("finished", summary)          always last
+
+    The summary holds processed, errors, skipped, total, orphan_images,
+    cancelled, elapsed and files_per_sec.
+
+    Only the folder itself is indexed unless recursive is set; subfolders
+    often hold derived images (QUICK_RESIZE or hand-crop output) that would
+    each be reported as having no .txt file.
+
+    With skip_unchanged the current tags are read back READ_CHUNK images at
+    a time and only images whose tags differ are written. Images recorded
+    in the folder's MetadataCache with an unchanged size, mtime and tag set
+    are skipped without being read.
+    """
 
-        if image_file:
-            success = process_metadata(txt_path, image_file, log_box, metadata)
+    def __init__(self, folder, metadata, backend_name=None, workers=EXIFTOOL_SESSIONS, skip_unchanged=False,
+                 recursive=False):
+        self.folder = folder
+        self.metadata = metadata
+        self.backend_name = backend_name or default_backend_name(EXIFTOOL_PATH)
+        self.workers = max(1, workers)
+        self.skip_unchanged = skip_unchanged
+        self.recursive = recursive
+        self.cache = None
+        self.results = queue.Queue()
+        self.total = 0
+        self.done = 0
+        self.processed = 0
+        self.errors = 0
+        self.skipped = 0
+        self.orphan_images = 0
+        self.started = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stop after the files currently being written; queued files are skipped."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def files_per_sec(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0
+        return self.done / elapsed if elapsed else 0.0
+
+    def _record(self, success, message):
+        with self._lock:
+            self.done += 1
             if success:
-                processed += 1
+                self.processed += 1
             else:
-                errors += 1
-        else:
-            log_message(f"No matching image found for '{txt_file}'. Skipping.", log_box, "red")
-            errors += 1
+                self.errors += 1
+        self.results.put(("result", success, message))
 
-        # Update progress bar
-        progress_var.set(idx + 1)
-        progress_bar.update_idletasks()
+    def _skip(self):
+        with self._lock:
+            self.done += 1
+            self.skipped += 1
 
-    messagebox.showinfo("Processing Complete", f"Processed {processed} files successfully with {errors} errors.")
+    def _write(self, backend, image_file, tags):
+        if self.cancelled:
+            return
+        success, message = backend.write(image_file, tags)
+        if success and self.cache is not None:
+            self.cache.record(image_file, tags_hash(tags), backend.name)
+        self._record(success, message)
+
+    def _changed(self, backend, chunk):
+        """
+        Build the tags for a chunk of (txt_path, image_file) pairs and yield
+        (image_file, tags) for the images that need writing.
+        """
+        wanted = []
+        for txt_path, image_file in chunk:
+            try:
+                tags = build_tags(txt_path, self.metadata)
+            except (OSError, UnicodeDecodeError) as e:
+                self._record(False, f"Error processing '{image_file}': {e}")
+                continue
+            if self.cache is not None and self.cache.is_current(image_file, tags_hash(tags), backend.name):
+                self._skip()
+            else:
+                wanted.append((image_file, tags))
+        if not self.skip_unchanged:
+            yield from wanted
+            return
+
+        # One batched read for the images the cache could not vouch for
+        current = backend.read([image_file for image_file, _ in wanted]) if wanted else {}
+        for image_file, tags in wanted:
+            if tags_match(tags, current.get(image_file)):
+                self.cache.record(image_file, tags_hash(tags), backend.name)
+                self._skip()
+            else:
+                yield image_file, tags
+
+    def run(self):
+        self.started = time.perf_counter()
+        try:
+            pairs, orphan_sidecars, orphan_images = index_folder(self.folder, self.recursive)
+            self.total = len(pairs) + len(orphan_sidecars)
+            self.orphan_images = len(orphan_images)
+            self.results.put(("total", self.total))
+            for txt_path in orphan_sidecars:
+                self._record(False, f"No matching image found for '{os.path.relpath(txt_path, self.folder)}'. Skipping.")
+            for image_file in orphan_images:
+                self.results.put(("note", f"No .txt file for '{os.path.relpath(image_file, self.folder)}'."))
+            if self.skip_unchanged:
+                self.cache = MetadataCache(self.folder)
+            backend = create_backend(self.backend_name, self.workers, EXIFTOOL_PATH)
+            try:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    writing = set()
+                    for start in range(0, len(pairs), READ_CHUNK):
+                        if self.cancelled:
+                            break
+                        for image_file, tags in self._changed(backend, pairs[start:start + READ_CHUNK]):
+                            while len(writing) >= self.workers * WRITES_PER_WORKER:
+                                _, writing = wait(writing, return_when=FIRST_COMPLETED)
+                            if self.cancelled:
+                                break
+                            writing.add(executor.submit(self._write, backend, image_file, tags))
+                    if self.cancelled:
+                        for future in writing:
+                            future.cancel()
+            finally:
+                backend.close()
+                if self.cache is not None:
+                    self.cache.save()
+        except Exception as e:
+            self.results.put(("result", False, f"Error: {e}"))
+        elapsed = time.perf_counter() - self.started
+        self.results.put(("finished", {
+            "processed": self.processed,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "total": self.total,
+            "orphan_images": self.orphan_images,
+            "cancelled": self.cancelled,
+            "elapsed": elapsed,
+            "files_per_sec": self.done / elapsed if elapsed else 0.0,
+        }))
+
+
+def poll_job(root, job, progress_var, progress_bar, log_box, status_var, on_finish):
+    """
+    Drain up to RESULTS_PER_POLL queued results into the log box and progress
+    bar, then check again after POLL_INTERVAL_MS until the job has finished.
+    """
+    lines = []
+    summary = None
+    for _ in range(RESULTS_PER_POLL):
+        try:
+            message = job.results.get_nowait()
+        except queue.Empty:
+            break
+        if message[0] == "total":
+            progress_bar["maximum"] = max(1, message[1])
+        elif message[0] == "result":
+            lines.append((message[2], "green" if message[1] else "red"))
+        elif message[0] == "note":
+            lines.append((message[1], "black"))
+        elif message[0] == "finished":
+            summary = message[1]
+            break
+
+    append_log(log_box, lines)
+    progress_var.set(job.done)
+    status_var.set(f"{job.done}/{job.total} files, {job.files_per_sec():.1f} files/s")
+    if summary is None:
+        root.after(POLL_INTERVAL_MS, poll_job, root, job, progress_var, progress_bar, log_box, status_var, on_finish)
+    else:
+        on_finish(summary)
+
+
+def summary_text(summary):
+    rate = f"in {summary['elapsed']:.1f}s ({summary['files_per_sec']:.1f} files/s)"
+    if summary["cancelled"]:
+        return f"Cancelled after {summary['processed'] + summary['errors'] + summary['skipped']} of {summary['total']} files {rate}."
+    skipped = f"\n{summary['skipped']} unchanged files were skipped." if summary["skipped"] else ""
+    orphans = f"\n{summary['orphan_images']} images have no .txt file." if summary["orphan_images"] else ""
+    return f"Processed {summary['processed']} files successfully with {summary['errors']} errors {rate}.{skipped}{orphans}"
 
 
 def main():
@@ -181,22 +522,58 @@ def main():
     # Copyright checkbox
     tk.Checkbutton(root, text="Copyrighted", variable=metadata["copyright_status"]).grid(row=5, column=2, padx=10, pady=5)
 
+    # Metadata writer
+    tk.Label(root, text="Metadata Writer:").grid(row=8, column=0, padx=10, pady=5, sticky="w")
+    backend_var = tk.StringVar(value=default_backend_name(EXIFTOOL_PATH))
+    tk.OptionMenu(root, backend_var, *BACKENDS).grid(row=8, column=1, padx=10, pady=5, sticky="w")
+    skip_unchanged_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(root, text="Skip unchanged files", variable=skip_unchanged_var).grid(row=8, column=2, padx=10, pady=5)
+    recursive_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(root, text="Include subfolders", variable=recursive_var).grid(row=9, column=2, padx=10, pady=5)
+
     # Progress bar and log box
     progress_var = tk.IntVar()
     progress_bar = Progressbar(root, orient="horizontal", length=750, mode="determinate", variable=progress_var)
     progress_bar.grid(row=10, column=0, columnspan=2, padx=10, pady=10)
+    status_var = tk.StringVar()
+    tk.Label(root, textvariable=status_var).grid(row=10, column=2, padx=10, pady=10, sticky="w")
     log_box = tk.Text(root, height=15, state="disabled")
     log_box.grid(row=11, column=0, columnspan=2, padx=10, pady=10)
+    configure_log_tags(log_box)
 
     # Buttons
+    running = {"job": None}
+
+    def finish_process(summary):
+        running["job"] = None
+        run_button.config(state=tk.NORMAL)
+        cancel_button.config(state=tk.DISABLED)
+        log_message(summary_text(summary), log_box)
+        messagebox.showinfo("Processing Cancelled" if summary["cancelled"] else "Processing Complete", summary_text(summary))
+
     def run_process():
         folder = folder_path.get()
         if not folder:
             messagebox.showerror("Error", "Please select a folder to process.")
             return
-        process_folder(folder, {key: var.get() for key, var in metadata.items()}, progress_var, progress_bar, log_box)
-
-    tk.Button(root, text="Run", command=run_process).grid(row=12, column=1, padx=10, pady=10, sticky="w")
+        # Writes run on worker threads; results come back through the job's queue
+        job = MetadataJob(folder, {key: var.get() for key, var in metadata.items()}, backend_var.get(),
+                          skip_unchanged=skip_unchanged_var.get(), recursive=recursive_var.get())
+        running["job"] = job
+        progress_var.set(0)
+        run_button.config(state=tk.DISABLED)
+        cancel_button.config(state=tk.NORMAL)
+        threading.Thread(target=job.run, daemon=True).start()
+        root.after(POLL_INTERVAL_MS, poll_job, root, job, progress_var, progress_bar, log_box, status_var, finish_process)
+
+    def cancel_process():
+        if running["job"] is not None:
+            running["job"].cancel()
+
+    run_button = tk.Button(root, text="Run", command=run_process)
+    run_button.grid(row=12, column=1, padx=10, pady=10, sticky="w")
+    cancel_button = tk.Button(root, text="Cancel", command=cancel_process, state=tk.DISABLED)
+    cancel_button.grid(row=12, column=1, padx=10, pady=10)
     tk.Button(root, text="Exit", command=root.quit).grid(row=12, column=2, padx=10, pady=10, sticky="w")
 
     root.mainloop()
@@ -0,0 +1,115 @@
+"""
+Stand-in for the exiftool binary, for testing ExifTool_Session.py (and
+trying Txt_to_Metadata.py) without ExifTool installed.
+
+It speaks the same -stay_open argfile protocol: arguments arrive one per
+line on stdin (#[CSTR] lines are unescaped), -echo4 TEXT is printed to
+stderr and {readyN} to stdout when -executeN finishes a command, and
+"-stay_open False" ends the process. Command-line arguments are ignored.
+
+Writes ("-Tag=value" ... file) are recorded in <file>.tags as JSON and
+-json reads report them back. A few options exist only here, to drive
+the tests:
+
+    -fake_echo          print the command's arguments as a JSON list
+    -fake_stderr=N      write at least N bytes of warnings to stderr first
+    -fake_exit          exit at once, like a crashed exiftool
+
+exiftool is launched directly, so the tests run this script through a
+small launcher (a shell script, or a .bat file on Windows).
+"""
+import os
+import re
+import sys
+import json
+
+# The C escapes ExifTool_Session.argfile_line produces
+CSTR_ESCAPES = {"n": "\n", "r": "\r", "t": "\t"}
+
+
+def decode_line(line):
+    if line.startswith("#[CSTR]"):
+        return re.sub(r"\\(.)", lambda match: CSTR_ESCAPES.get(match.group(1), match.group(1)), line[7:])
+    return line
+
+
+def read_tags(path):
+    try:
+        with open(path + ".tags", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_tags(args):
+    files = [arg for arg in args if not arg.startswith("-")]
+    if not files or not os.path.exists(files[-1]):
+        sys.stderr.write(f"Error: File not found - {files[-1] if files else ''}\n")
+        return "    0 image files updated\n    1 files weren't updated due to errors\n"
+    tags = read_tags(files[-1])
+    assigned = set()
+    for arg in args:
+        if arg.startswith("-") and "=" in arg:
+            name, value = arg[1:].split("=", 1)
+            name = name.split(":")[-1].rstrip("+")
+            # Like exiftool, repeated assignments in one command build a list
+            if name in assigned or arg.split("=", 1)[0].endswith("+"):
+                current = tags.get(name, [])
+                tags[name] = (current if isinstance(current, list) else [current]) + [value]
+            else:
+                tags[name] = value
+            assigned.add(name)
+    with open(files[-1] + ".tags", "w", encoding="utf-8") as f:
+        json.dump(tags, f)
+    return "    1 image files updated\n"
+
+
+def read_json(args):
+    records = []
+    for path in (arg for arg in args if not arg.startswith("-")):
+        records.append(dict(read_tags(path), SourceFile=path))
+    return json.dumps(records) + "\n"
+
+
+def run_command(args):
+    for arg in args:
+        if arg.startswith("-fake_stderr="):
+            size = int(arg.split("=", 1)[1])
+            line = "Warning: [minor] Fake warning for a large batch\n"
+            sys.stderr.write(line * (size // len(line) + 1))
+            sys.stderr.flush()
+    if "-fake_exit" in args:
+        os._exit(1)
+    if "-fake_echo" in args:
+        return json.dumps([arg for arg in args if arg != "-fake_echo"]) + "\n"
+    if "-json" in args:
+        return read_json(args)
+    return write_tags(args)
+
+
+def main():
+    args = []
+    echo4 = None
+    lines = (line.decode("utf-8").rstrip("\r\n") for line in sys.stdin.buffer)
+    for line in lines:
+        line = decode_line(line)
+        if line == "-stay_open":
+            if next(lines, "False").strip() == "False":
+                break
+        elif line == "-echo4":
+            echo4 = decode_line(next(lines, ""))
+        elif line.startswith("-execute"):
+            sys.stdout.write(run_command(args) + "{ready%s}\n" % line[len("-execute"):])
+            sys.stdout.flush()
+            if echo4 is not None:
+                sys.stderr.write(echo4 + "\n")
+            sys.stderr.flush()
+            args = []
+            echo4 = None
+        elif line:
+            args.append(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
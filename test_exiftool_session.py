@@ -0,0 +1,126 @@
+"""
+Tests for the -stay_open protocol in ExifTool_Session.py, against the
+fake_exiftool.py stand-in (no ExifTool needed).
+
+Run with: python -m pytest test_exiftool_session.py
+"""
+import os
+import sys
+import json
+import threading
+
+import pytest
+
+from ExifTool_Session import ExifToolSession, ExifToolPool, ExifToolError, argfile_line, write_succeeded
+
+FAKE_EXIFTOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_exiftool.py")
+
+
+@pytest.fixture
+def exiftool(tmp_path):
+    """Path of a launcher that runs fake_exiftool.py like an exiftool binary."""
+    if os.name == "nt":
+        launcher = tmp_path / "exiftool.bat"
+        launcher.write_text(f'@"{sys.executable}" "{FAKE_EXIFTOOL}" %*\n')
+    else:
+        launcher = tmp_path / "exiftool"
+        launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_EXIFTOOL}" "$@"\n')
+        launcher.chmod(0o755)
+    return str(launcher)
+
+
+def test_argfile_line_escapes_only_when_needed():
+    assert argfile_line("-Title=Plain value") == "-Title=Plain value"
+    assert argfile_line("-Title=two\nlines") == "#[CSTR]-Title=two\\nlines"
+    assert argfile_line("-Title=\ttab") == "#[CSTR]-Title=\\ttab"
+    assert argfile_line(' -Title="q" \\ ') == '#[CSTR] -Title=\\"q\\" \\\\ '
+
+
+def test_escaped_arguments_round_trip(exiftool):
+    values = ["-Description=line one\nline two\r\nline three", "-Title=\ttabbed", '-Caption= "quoted" \\ back ',
+              "-Keywords=café", "-Creator=plain"]
+    with ExifToolSession(exiftool) as session:
+        stdout, stderr = session.execute("-fake_echo", *values)
+    assert json.loads(stdout) == values
+    assert stderr == ""
+
+
+def test_ready_markers_split_commands(exiftool, tmp_path):
+    image = tmp_path / "photo.jpg"
+    image.write_bytes(b"")
+    with ExifToolSession(exiftool) as session:
+        for index in range(5):
+            stdout, stderr = session.execute("-fake_echo", f"-Title={index}")
+            assert json.loads(stdout) == [f"-Title={index}"]
+            assert "{ready" not in stdout and "{ready" not in stderr
+        # Each command gets only its own stderr, up to its -echo4 marker
+        stdout, stderr = session.execute("-Title=x", str(tmp_path / "missing.jpg"))
+        assert "File not found" in stderr and not write_succeeded(stdout, stderr)
+        stdout, stderr = session.execute("-Title=x", str(image))
+        assert stderr == "" and write_succeeded(stdout, stderr)
+
+
+def test_large_stderr_does_not_deadlock(exiftool):
+    size = 1 << 20   # Far more than a pipe buffer
+    result = {}
+    with ExifToolSession(exiftool) as session:
+        worker = threading.Thread(target=lambda: result.update(output=session.execute(f"-fake_stderr={size}",
+                                                                                       "-fake_echo")), daemon=True)
+        worker.start()
+        worker.join(timeout=30)
+        if worker.is_alive():
+            # Unblock execute() so the session can close, then fail
+            session.process.kill()
+            worker.join()
+            pytest.fail("execute() blocked on a full stderr pipe")
+        stdout, stderr = result["output"]
+        assert json.loads(stdout) == [f"-fake_stderr={size}"]
+        assert len(stderr) >= size - 100
+        # The session stays usable afterwards
+        assert json.loads(session.execute("-fake_echo", "-Title=after")[0]) == ["-Title=after"]
+
+
+def test_restarts_after_dead_session(exiftool):
+    with ExifToolSession(exiftool) as session:
+        session.execute("-fake_echo")
+        first_pid = session.process.pid
+        with pytest.raises(ExifToolError):
+            session.execute("-fake_exit")
+        assert not session.running
+        stdout, _ = session.execute("-fake_echo", "-Title=again")
+        assert json.loads(stdout) == ["-Title=again"]
+        assert session.process.pid != first_pid
+
+
+def test_missing_binary_raises(tmp_path):
+    session = ExifToolSession(str(tmp_path / "no_such_exiftool"))
+    with pytest.raises(ExifToolError, match="Could not start ExifTool"):
+        session.execute("-ver")
+
+
+def test_close_stops_process(exiftool):
+    session = ExifToolSession(exiftool)
+    session.execute("-fake_echo")
+    process = session.process
+    session.close()
+    assert session.process is None
+    assert process.poll() is not None
+
+
+def test_pool_runs_commands_from_threads(exiftool, tmp_path):
+    images = []
+    for index in range(8):
+        image = tmp_path / f"image_{index}.jpg"
+        image.write_bytes(b"")
+        images.append(image)
+    outputs = []
+    with ExifToolPool(3, exiftool) as pool:
+        threads = [threading.Thread(target=lambda image=image: outputs.append(
+            pool.execute(f"-XMP-dc:Title={image.stem}", str(image)))) for image in images]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        records = json.loads(pool.execute("-json", *(str(image) for image in images))[0])
+    assert len(outputs) == len(images) and all(write_succeeded(*output) for output in outputs)
+    assert [record["Title"] for record in records] == [image.stem for image in images]
@@ -0,0 +1,110 @@
+"""
+Tests for the crop maths and the synthetic detector in Hand_Crop_Engine.py.
+
+Run with: python -m pytest test_hand_crop.py
+Needs numpy and OpenCV (the engine imports cv2); MediaPipe is not needed.
+"""
+import random
+
+import pytest
+
+pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from Hand_Crop_Engine import crop_box, crop_image, SyntheticDetector
+
+
+def reference_crop_box(x_coords, y_coords, width, height, margin, crop_size):
+    # The original scalar crop maths, kept as the reference for crop_box
+    x_min = max(min(x_coords) - margin, 0)
+    x_max = min(max(x_coords) + margin, width)
+    y_min = max(min(y_coords) - margin, 0)
+    y_max = min(max(y_coords) + margin, height)
+    center_x = (x_min + x_max) // 2
+    center_y = (y_min + y_max) // 2
+    half_crop_size = crop_size // 2
+    if (x_max - x_min) > crop_size:
+        half_crop_size = (x_max - x_min) // 2
+    if (y_max - y_min) > crop_size:
+        half_crop_size = max(half_crop_size, (y_max - y_min) // 2)
+    crop_x_min = max(center_x - half_crop_size, 0)
+    crop_x_max = min(center_x + half_crop_size, width)
+    crop_y_min = max(center_y - half_crop_size, 0)
+    crop_y_max = min(center_y + half_crop_size, height)
+    if crop_x_max - crop_x_min < crop_size:
+        if crop_x_min == 0:
+            crop_x_max = min(crop_x_min + crop_size, width)
+        else:
+            crop_x_min = max(crop_x_max - crop_size, 0)
+    if crop_y_max - crop_y_min < crop_size:
+        if crop_y_min == 0:
+            crop_y_max = min(crop_y_min + crop_size, height)
+        else:
+            crop_y_min = max(crop_y_max - crop_size, 0)
+    return crop_x_min, crop_y_min, crop_x_max, crop_y_max
+
+
+def random_case(rng):
+    width, height = rng.randint(1, 6000), rng.randint(1, 6000)
+    points = rng.randint(1, 42)
+    # Landmarks may fall slightly outside the frame, as MediaPipe's can
+    x_coords = [rng.randint(-width // 10 - 5, width + width // 10 + 5) for _ in range(points)]
+    y_coords = [rng.randint(-height // 10 - 5, height + height // 10 + 5) for _ in range(points)]
+    return x_coords, y_coords, width, height, rng.randint(0, 400), rng.choice([64, 255, 512, 1024, 2048])
+
+
+def test_crop_box_matches_reference():
+    rng = random.Random(0)
+    for _ in range(20000):
+        case = random_case(rng)
+        assert crop_box(*case) == reference_crop_box(*case), case
+
+
+def test_crop_box_accepts_numpy_coordinates():
+    x_coords = np.array([100, 220, 180])
+    y_coords = np.array([300, 260, 410])
+    assert crop_box(x_coords, y_coords, 2000, 1500, 50, 512) == reference_crop_box(
+        [100, 220, 180], [300, 260, 410], 2000, 1500, 50, 512)
+
+
+def test_landmarks_outside_frame_stay_inside_image():
+    box = crop_box([-300, -10], [-50, 40], 3000, 2000, margin=100, crop_size=1024)
+    assert box == (0, 0, 1024, 1024)
+    box = crop_box([3100, 3400], [1990, 2300], 3000, 2000, margin=100, crop_size=1024)
+    assert box == (1976, 976, 3000, 2000)
+
+
+def test_box_larger_than_crop_size_widens_square():
+    # Hands spread 1600 px apart: the crop grows to cover them instead of cutting them off
+    x_min, y_min, x_max, y_max = crop_box([1000, 2600], [900, 1100], 4000, 3000, margin=0, crop_size=1024)
+    assert (x_min, x_max) == (1000, 2600)
+    assert x_max - x_min == y_max - y_min == 1600
+
+
+def test_image_smaller_than_crop_size_uses_whole_image():
+    box = crop_box([100, 200], [50, 150], 400, 300, margin=20, crop_size=1024)
+    assert box == (0, 0, 400, 300)
+    image = np.zeros((300, 400, 3), dtype=np.uint8)
+    assert crop_image(image, box, 1024).shape == (1024, 1024, 3)
+
+
+def test_crop_image_keeps_full_size_crop():
+    image = np.arange(2000 * 3000 * 3, dtype=np.uint32).astype(np.uint8).reshape(2000, 3000, 3)
+    box = crop_box([1400, 1600], [900, 1100], 3000, 2000, margin=50, crop_size=1024)
+    x_min, y_min, x_max, y_max = box
+    cropped = crop_image(image, box, 1024)
+    assert cropped.shape == (1024, 1024, 3)
+    assert np.array_equal(cropped, image[y_min:y_max, x_min:x_max])
+
+
+def test_synthetic_detector_is_deterministic():
+    rng = np.random.default_rng(1)
+    image = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    first = SyntheticDetector().detect(image)
+    second = SyntheticDetector().detect(image.copy())
+    if first is None:
+        assert second is None
+    else:
+        assert first.shape[1:] == (21, 2)
+        assert np.array_equal(first, second)
+        assert ((first >= 0) & (first <= 1)).all()
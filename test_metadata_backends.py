@@ -0,0 +1,182 @@
+"""
+Round-trip tests for the built-in XMP writer in Metadata_Backends.py.
+
+Run with: python -m pytest test_metadata_backends.py
+Needs Pillow to make the test images; ExifTool is not needed.
+"""
+import io
+import struct
+import zlib
+import threading
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import Metadata_Backends
+from Metadata_Backends import (XmpBackend, build_xmp_packet, xmp_tags, _splice_jpeg, _splice_png, _read_jpeg_xmp,
+                               _read_png_xmp, _png_chunk, PNG_SIGNATURE, PNG_XMP_KEYWORD, JPEG_XMP_SIGNATURE)
+
+TAGS = {"title": "New title", "keywords": ["alpha", "beta"], "rating": "4"}
+
+# A packet from another tool: a tag XmpBackend writes, one it does not, and a
+# property in a namespace it does not know
+EXISTING_XMP = b"""<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/" xmlns:foo="http://example.com/foo/1.0/"
+    xmp:CreatorTool="Other Tool" foo:Flag="on">
+   <dc:title><rdf:Alt><rdf:li xml:lang="x-default">Old title</rdf:li></rdf:Alt></dc:title>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>"""
+
+
+def image_bytes(fmt, **params):
+    buffer = io.BytesIO()
+    Image.new("RGB", (48, 32), (200, 40, 90)).save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def jpeg_with_xmp(packet):
+    data = image_bytes("JPEG")
+    segment = JPEG_XMP_SIGNATURE + packet
+    # Right after SOI, the way many writers place it
+    return data[:2] + b"\xff\xe1" + struct.pack(">H", len(segment) + 2) + segment + data[2:]
+
+
+def png_chunks(data):
+    """(type, data) of every chunk, checking each CRC."""
+    chunks = []
+    offset = len(PNG_SIGNATURE)
+    while offset < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[offset:offset + 8])
+        body = data[offset + 8:offset + 8 + length]
+        crc = struct.unpack(">I", data[offset + 8 + length:offset + 12 + length])[0]
+        assert crc == zlib.crc32(chunk_type + body), chunk_type
+        chunks.append((chunk_type, body))
+        offset += 12 + length
+    return chunks
+
+
+def png_with_xmp(packet, after_idat=False, compressed=False):
+    data = image_bytes("PNG")
+    text = zlib.compress(packet) if compressed else packet
+    chunk = _png_chunk(b"iTXt", PNG_XMP_KEYWORD + b"\x00" + (b"\x01" if compressed else b"\x00") + b"\x00\x00\x00" + text)
+    # Insert before the first IDAT, or just before IEND
+    at = data.rindex(b"IEND") - 4 if after_idat else data.index(b"IDAT") - 4
+    return data[:at] + chunk + data[at:]
+
+
+def splice(splicer, data, tags=TAGS):
+    dst = io.BytesIO()
+    splicer(io.BytesIO(data), dst, tags)
+    return dst.getvalue()
+
+
+def assert_same_pixels(before, after):
+    with Image.open(io.BytesIO(before)) as original, Image.open(io.BytesIO(after)) as written:
+        assert original.size == written.size
+        assert original.tobytes() == written.tobytes()
+
+
+def assert_merged(packet):
+    tags = xmp_tags(packet)
+    assert tags["title"] == "New title"
+    assert tags["keywords"] == ["alpha", "beta"]
+    assert b"Old title" not in packet
+    # Properties the tags do not set are kept
+    assert b"Other Tool" in packet
+    assert b'"http://example.com/foo/1.0/"' in packet and b'Flag="on"' in packet
+
+
+def test_jpeg_without_packet():
+    data = image_bytes("JPEG", exif=Image.Exif())
+    written = splice(_splice_jpeg, data)
+    assert xmp_tags(_read_jpeg_xmp(io.BytesIO(written))) == {"title": "New title", "keywords": ["alpha", "beta"],
+                                                             "rating": "4"}
+    assert_same_pixels(data, written)
+    with Image.open(io.BytesIO(written)) as img:
+        assert "exif" in img.info
+
+
+def test_jpeg_existing_app1_is_merged_and_replaced():
+    data = jpeg_with_xmp(EXISTING_XMP)
+    written = splice(_splice_jpeg, data)
+    assert written.count(JPEG_XMP_SIGNATURE) == 1
+    assert_merged(_read_jpeg_xmp(io.BytesIO(written)))
+    assert_same_pixels(data, written)
+
+
+def test_jpeg_rewrite_is_stable():
+    once = splice(_splice_jpeg, jpeg_with_xmp(EXISTING_XMP))
+    twice = splice(_splice_jpeg, once)
+    assert _read_jpeg_xmp(io.BytesIO(once)) == _read_jpeg_xmp(io.BytesIO(twice))
+
+
+def test_png_without_packet():
+    data = image_bytes("PNG")
+    written = splice(_splice_png, data)
+    types = [chunk_type for chunk_type, _ in png_chunks(written)]
+    assert types.index(b"iTXt") < types.index(b"IDAT")
+    assert xmp_tags(_read_png_xmp(io.BytesIO(written)))["title"] == "New title"
+    assert_same_pixels(data, written)
+
+
+@pytest.mark.parametrize("after_idat", [False, True])
+@pytest.mark.parametrize("compressed", [False, True])
+def test_png_existing_packet_is_merged(after_idat, compressed):
+    data = png_with_xmp(EXISTING_XMP, after_idat, compressed)
+    written = splice(_splice_png, data)
+    chunks = png_chunks(written)
+    xmp_chunks = [index for index, (chunk_type, body) in enumerate(chunks)
+                  if chunk_type == b"iTXt" and body.startswith(PNG_XMP_KEYWORD)]
+    # One packet, before the image data
+    assert len(xmp_chunks) == 1
+    assert xmp_chunks[0] < [chunk_type for chunk_type, _ in chunks].index(b"IDAT")
+    assert chunks[-1][0] == b"IEND"
+    assert_merged(_read_png_xmp(io.BytesIO(written)))
+    assert_same_pixels(data, written)
+
+
+def test_png_keeps_other_text_chunks():
+    data = png_with_xmp(EXISTING_XMP, after_idat=True)
+    other = _png_chunk(b"iTXt", b"Comment\x00\x00\x00\x00\x00hello")
+    at = data.rindex(b"IEND") - 4
+    written = splice(_splice_png, data[:at] + other + data[at:])
+    assert (b"iTXt", b"Comment\x00\x00\x00\x00\x00hello") in png_chunks(written)
+
+
+def test_backend_write_and_read(tmp_path):
+    paths = []
+    for name, data in (("a.jpg", jpeg_with_xmp(EXISTING_XMP)), ("b.png", png_with_xmp(EXISTING_XMP, True))):
+        path = tmp_path / name
+        path.write_bytes(data)
+        paths.append(str(path))
+    backend = XmpBackend()
+    for path in paths:
+        assert backend.write(path, TAGS)[0]
+    current = backend.read(paths)
+    for path in paths:
+        assert current[path]["title"] == "New title"
+        assert current[path]["keywords"] == ["alpha", "beta"]
+
+
+def test_merging_leaves_namespace_registry_alone(monkeypatch):
+    def register_namespace(prefix, uri):
+        raise AssertionError("the namespace registry is global; it is only set up at import")
+    monkeypatch.setattr(Metadata_Backends.ET, "register_namespace", register_namespace)
+    errors = []
+
+    def build():
+        try:
+            for _ in range(20):
+                assert_merged(build_xmp_packet(TAGS, EXISTING_XMP))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=build) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
@@ -0,0 +1,68 @@
+"""
+Tests for find_sprites() in Sprite_Sheet_Analysis.py.
+
+Run with: python -m pytest test_sprite_sheet_analysis.py
+Needs numpy; the scipy.ndimage path is tested too when scipy is installed.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import Sprite_Sheet_Analysis
+from Sprite_Sheet_Analysis import find_sprites, dilate
+
+# Unit steps from the first island to the second: right, down, down-right, down-left
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (-1, 1)]
+
+
+@pytest.fixture(params=["run-length", "ndimage"])
+def labeling(request, monkeypatch):
+    if request.param == "ndimage":
+        pytest.importorskip("scipy")
+    else:
+        monkeypatch.setattr(Sprite_Sheet_Analysis, "ndimage", None)
+    return request.param
+
+
+def two_islands(blank, direction, size=3):
+    # Two size x size opaque squares with blank transparent pixels between them
+    step_x, step_y = direction
+    sheet = np.zeros((40, 40, 4), dtype=np.uint8)
+    left, top = 18, 4
+    sheet[top:top + size, left:left + size] = 255
+    left += step_x * (size + blank)
+    top += step_y * (size + blank)
+    sheet[top:top + size, left:left + size] = 255
+    return sheet
+
+
+@pytest.mark.parametrize("gap", [0, 1, 2, 3, 4])
+@pytest.mark.parametrize("direction", DIRECTIONS)
+def test_islands_merge_exactly_up_to_gap(labeling, gap, direction):
+    if gap > 0:
+        assert len(find_sprites(two_islands(gap, direction), gap=gap)) == 1
+    assert len(find_sprites(two_islands(gap + 1, direction), gap=gap)) == 2
+
+
+def test_merged_boxes_stay_tight(labeling):
+    sheet = two_islands(3, (1, 0))
+    assert find_sprites(sheet, gap=3) == [(18, 4, 27, 7)]
+    assert find_sprites(sheet, gap=2) == [(18, 4, 21, 7), (24, 4, 27, 7)]
+
+
+def test_min_area_drops_small_components(labeling):
+    sheet = two_islands(5, (0, 1))
+    sheet[30, 30] = 255
+    assert len(find_sprites(sheet)) == 3
+    assert len(find_sprites(sheet, min_area=2)) == 2
+
+
+def test_dilate_reaches_before_and_after():
+    mask = np.zeros((9, 9), dtype=bool)
+    mask[4, 4] = True
+    grown = dilate(mask, 1, 2)
+    rows, columns = np.nonzero(grown)
+    assert (rows.min(), rows.max(), columns.min(), columns.max()) == (3, 6, 3, 6)
+    assert grown.sum() == 16
+    assert not mask[3, 3]   # The input is not modified
+    assert np.array_equal(dilate(mask, 2), dilate(mask, 2, 2))